@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Microbenchmark for building the Elasticsearch document for a processed crash.
+
+Compares the old path (deep-copy the crash and interpret FIELDS for every crash)
+with the precompiled document plan that ESCrashStorage uses now. The processed
+crash fixture has a value for every indexable field and a json_dump with a lot of
+threads and frames like a real crash.
+
+Usage::
+
+    python bin/bench_build_document.py [--iterations=N] [--threads=N] [--frames=N]
+
+"""
+
+import copy
+import timeit
+
+import click
+import glom
+
+from socorro.external.es.crashstorage import (
+    build_document_plan,
+    execute_document_plan,
+    fix_datetime,
+    fix_integer,
+    fix_keyword,
+    fix_long,
+    fix_string,
+    MAX_KEYWORD_FIELD_VALUE_SIZE,
+    MAX_STRING_FIELD_VALUE_SIZE,
+)
+from socorro.external.es.super_search_fields import (
+    FIELDS,
+    get_destination_keys,
+    get_source_key,
+    is_indexable,
+)
+
+
+SAMPLE_VALUES = {
+    "boolean": True,
+    "date": "2022-06-01T12:00:00.000000+00:00",
+    "double": 1.5,
+    "integer": 100,
+    "long": 100000,
+    "short": 10,
+    "string": "some value",
+}
+
+
+def old_build_document(src, crash_document, fields, all_keys):
+    """build_document before the document plan
+
+    This is the old code kept here to compare against.
+
+    """
+    for field in fields.values():
+        if not is_indexable(field):
+            continue
+
+        src_key = get_source_key(field)
+        value = glom.glom(src, src_key, default=None)
+        if value is None:
+            continue
+
+        storage_type = field.get("type", field["storage_mapping"].get("type"))
+
+        if (
+            storage_type == "multi_field"
+            and glom.glom(field, "storage_mapping.fields.full.type", default="")
+            == "string"
+        ):
+            storage_type = "string"
+
+        if storage_type == "string":
+            analyzer = field.get("analyzer", field["storage_mapping"].get("analyzer"))
+            if analyzer == "keyword":
+                value = fix_keyword(value, max_size=MAX_KEYWORD_FIELD_VALUE_SIZE)
+            else:
+                value = fix_string(value, max_size=MAX_STRING_FIELD_VALUE_SIZE)
+
+        elif storage_type == "integer":
+            value = fix_integer(value)
+            if value is None:
+                continue
+
+        elif storage_type == "long":
+            value = fix_long(value)
+            if value is None:
+                continue
+
+        elif storage_type == "date":
+            value = fix_datetime(value)
+            if value is None:
+                continue
+
+        for dest_key in get_destination_keys(field):
+            if dest_key in all_keys:
+                glom.assign(crash_document, dest_key, value, missing=dict)
+
+
+def old_path(raw_crash, processed_crash, all_keys):
+    src = {
+        "raw_crash": copy.deepcopy(raw_crash),
+        "processed_crash": copy.deepcopy(processed_crash),
+    }
+    crash_document = {"crash_id": "id", "raw_crash": {}, "processed_crash": {}}
+    old_build_document(src, crash_document, fields=FIELDS, all_keys=all_keys)
+    return crash_document
+
+
+def new_path(raw_crash, processed_crash, plan):
+    src = {"raw_crash": raw_crash, "processed_crash": processed_crash}
+    crash_document = {"crash_id": "id", "raw_crash": {}, "processed_crash": {}}
+    execute_document_plan(plan, src, crash_document)
+    return crash_document
+
+
+def build_crash(num_threads, num_frames):
+    """Build a raw crash and processed crash with a value for every field"""
+    src = {"raw_crash": {}, "processed_crash": {}}
+    for field in FIELDS.values():
+        if not is_indexable(field):
+            continue
+        storage_type = field.get("type", field["storage_mapping"].get("type"))
+        value = SAMPLE_VALUES.get(storage_type, SAMPLE_VALUES["string"])
+        glom.assign(src, get_source_key(field), value, missing=dict)
+
+    frame = {
+        "file": "hg:hg.mozilla.org/mozilla-central:xpcom/base/nsCOMPtr.h:abcdef",
+        "function": "nsCOMPtr<nsISupports>::assign_with_AddRef(nsISupports*)",
+        "function_offset": "0x14",
+        "line": 1234,
+        "module": "xul.dll",
+        "module_offset": "0x1a2b3c",
+        "offset": "0x7ff81a2b3c",
+        "trust": "cfi",
+    }
+    json_dump = src["processed_crash"].setdefault("json_dump", {})
+    json_dump["threads"] = [
+        {
+            "frame_count": num_frames,
+            "frames": [dict(frame, frame=i) for i in range(num_frames)],
+        }
+        for _ in range(num_threads)
+    ]
+    return src["raw_crash"], src["processed_crash"]
+
+
+@click.command()
+@click.option(
+    "--iterations", default=200, type=int, help="number of times to build a document"
+)
+@click.option("--threads", default=50, type=int, help="threads in the json_dump")
+@click.option("--frames", default=40, type=int, help="frames per thread")
+def cmd_bench_build_document(iterations, threads, frames):
+    raw_crash, processed_crash = build_crash(threads, frames)
+    all_keys = set()
+    for field in FIELDS.values():
+        if is_indexable(field):
+            all_keys.update(get_destination_keys(field))
+
+    plan = build_document_plan(FIELDS, all_keys)
+    if old_path(raw_crash, processed_crash, all_keys) != new_path(
+        raw_crash, processed_crash, plan
+    ):
+        raise click.ClickException("old and new paths build different documents")
+
+    click.echo(
+        f"fields: {len(FIELDS)}  plan steps: {len(plan)}  "
+        f"json_dump: {threads} threads x {frames} frames"
+    )
+    old_time = timeit.timeit(
+        lambda: old_path(raw_crash, processed_crash, all_keys), number=iterations
+    )
+    plan_time = timeit.timeit(
+        lambda: build_document_plan(FIELDS, all_keys), number=iterations
+    )
+    new_time = timeit.timeit(
+        lambda: new_path(raw_crash, processed_crash, plan), number=iterations
+    )
+
+    click.echo(f"old path:        {old_time / iterations * 1_000_000:>10.1f} us/crash")
+    click.echo(f"build plan:      {plan_time / iterations * 1_000_000:>10.1f} us/plan")
+    click.echo(f"execute plan:    {new_time / iterations * 1_000_000:>10.1f} us/crash")
+    click.echo(f"speedup:         {old_time / new_time:>10.1f}x")
+
+
+if __name__ == "__main__":
+    cmd_bench_build_document()
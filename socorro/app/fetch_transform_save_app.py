@@ -26,12 +26,17 @@ and production of the processed crash data.  The save phase is the union of
 sending new crash records to Postgres; sending the processed crash to HBase;
 the the submission of the crash_id to Elastic Search."""
 
+import asyncio
 from functools import partial
 import signal
 
 from configman import Namespace
 from configman.converters import class_converter
 
+from socorro.lib.async_task_manager import AsyncTaskManager
+from socorro.lib.autoscaling_task_manager import AutoscalingThreadedTaskManager
+from socorro.lib.process_pool_task_manager import ProcessPoolTaskManager
+from socorro.lib.staged_task_manager import StagedTaskManager
 from socorro.lib.task_manager import respond_to_SIGTERM
 from socorro.app.socorro_app import App
 
@@ -43,6 +48,9 @@ class FetchTransformSaveApp(App):
     app_version = "0.1"
     app_description = __doc__
 
+    # True in task manager worker processes; see _setup_worker_process
+    is_worker_process = False
+
     required_config = Namespace()
     # The queue class has an iterator for work items to be processed.
     required_config.namespace("queue")
@@ -74,7 +82,16 @@ class FetchTransformSaveApp(App):
     required_config.producer_consumer = Namespace()
     required_config.producer_consumer.add_option(
         "producer_consumer_class",
-        doc="the class implements a threaded producer consumer queue",
+        doc=(
+            "the class implements a threaded producer consumer queue; use "
+            "socorro.lib.process_pool_task_manager.ProcessPoolTaskManager to run "
+            "tasks in worker processes or "
+            "socorro.lib.async_task_manager.AsyncTaskManager to run tasks as "
+            "coroutines or socorro.lib.staged_task_manager.StagedTaskManager to "
+            "run tasks as a series of stages or "
+            "socorro.lib.autoscaling_task_manager.AutoscalingThreadedTaskManager "
+            "to scale the number of threads with the load"
+        ),
         default="socorro.lib.threaded_task_manager.ThreadedTaskManager",
         from_string_converter=class_converter,
     )
@@ -113,6 +130,41 @@ class FetchTransformSaveApp(App):
                 # so that we can continue.
                 self.logger.exception(f"Error calling finishing_func() on {task}")
 
+    async def transform_async(self, task, finished_func=(lambda: None)):
+        """Async variant of transform used with the AsyncTaskManager."""
+        try:
+            await self._transform_async(task)
+        finally:
+            # finished_func does network I/O (removing the job from the queue), so
+            # it runs in the default executor
+            try:
+                await asyncio.to_thread(finished_func)
+            except Exception:
+                self.logger.exception(f"Error calling finishing_func() on {task}")
+
+    async def _transform_async(self, task):
+        """Default async transform function
+
+        This runs the blocking transform in the event loop's default executor.
+        Subclasses can override this with a transform that awaits the async
+        crashstorage API.
+
+        """
+        await asyncio.to_thread(self._transform, task)
+
+    def get_queue_backlog(self):
+        """Returns the number of items waiting in the queue or None if unknown."""
+        return self.queue.get_backlog()
+
+    def get_stages(self):
+        """Returns the list of (name, function) stages for the StagedTaskManager.
+
+        The StagedTaskManager calls ``finished_func`` after the last stage, so the
+        default is a single stage that runs the transform.
+
+        """
+        return [("transform", self._transform)]
+
     def _transform(self, task):
         """Default transform function
 
@@ -152,6 +204,10 @@ class FetchTransformSaveApp(App):
             self.config.queue,
             namespace=self.app_instance_name,
         )
+        self._setup_storage()
+
+    def _setup_storage(self):
+        """Instantiate source and destination classes."""
         self.source = self.config.source.crashstorage_class(
             self.config.source,
             namespace=self.app_name,
@@ -161,6 +217,18 @@ class FetchTransformSaveApp(App):
             namespace=self.app_name,
         )
 
+    def _setup_worker_process(self):
+        """Set up a task manager worker process.
+
+        Task managers that run tasks in worker processes fork them from the main
+        process. Storage clients hold connection pools that can't be shared across
+        processes, so each worker process builds its own. The queue stays in the
+        main process.
+
+        """
+        self.is_worker_process = True
+        self._setup_storage()
+
     def _setup_task_manager(self):
         """instantiate the threaded task manager to run the producer/consumer
         queue that is the heart of the processor."""
@@ -171,11 +239,27 @@ class FetchTransformSaveApp(App):
         # more information
         respond_to_SIGTERM_with_logging = partial(respond_to_SIGTERM, target=self)
         signal.signal(signal.SIGTERM, respond_to_SIGTERM_with_logging)
-        self.task_manager = self.config.producer_consumer.producer_consumer_class(
+        task_manager_class = self.config.producer_consumer.producer_consumer_class
+        task_func = self.transform
+        kwargs = {}
+        if issubclass(task_manager_class, ProcessPoolTaskManager):
+            kwargs["worker_init_func"] = self._setup_worker_process
+        elif issubclass(task_manager_class, AsyncTaskManager):
+            task_func = self.transform_async
+        elif issubclass(task_manager_class, StagedTaskManager):
+            kwargs["stages"] = self.get_stages()
+        elif issubclass(task_manager_class, AutoscalingThreadedTaskManager):
+            kwargs["backlog_func"] = self.get_queue_backlog
+        self.task_manager = task_manager_class(
             self.config.producer_consumer,
             job_source_iterator=self.source_iterator,
-            task_func=self.transform,
+            task_func=task_func,
+            **kwargs,
         )
+        if isinstance(self.task_manager, ProcessPoolTaskManager):
+            # Fork the worker processes now before setting up the source,
+            # destination, and anything else that might start threads
+            self.task_manager.start_workers()
 
     def close(self):
         if hasattr(self.queue, "close"):
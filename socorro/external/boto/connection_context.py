@@ -4,19 +4,30 @@
 
 import io
 import logging
+import os
 import random
+import shutil
+import tempfile
 import time
 
 import boto3
-from botocore.client import ClientError
+from boto3.s3.transfer import TransferConfig
+from botocore.client import ClientError, Config
 from configman import Namespace, RequiredConfig
+from configman.converters import list_converter
+import markus
 
+from socorro.external.boto.object_cache import DiskObjectCache
 from socorro.lib.util import retry
 
 
 logger = logging.getLogger(__name__)
 
 
+# Size of the chunks to read when streaming an object to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
 def wait_times_connect():
     """Return generator for wait times between failed connection attempts.
 
@@ -65,6 +76,19 @@ class S3Connection(RequiredConfig):
 
     When loading and saving crashes, this connection will retry several times.
 
+
+    **Connection pooling and threads**
+
+    The connection builds one S3 client and every thread using the connection
+    shares it and its pool of ``max_pool_connections`` HTTP connections. Boto3
+    clients are thread-safe. If more threads than that make requests at the same
+    time, they wait for a connection, so set it to at least the number of threads
+    that use the connection.
+
+    Objects smaller than ``multipart_threshold`` are saved with a single
+    ``PutObject`` request. Bigger objects are uploaded in ``multipart_chunksize``
+    parts with up to ``max_transfer_concurrency`` threads.
+
     """
 
     required_config = Namespace()
@@ -102,6 +126,45 @@ class S3Connection(RequiredConfig):
         default="",
         reference_value_from="resource.boto",
     )
+    required_config.add_option(
+        "max_pool_connections",
+        doc="the maximum number of HTTP connections to keep in the connection pool",
+        default=25,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "connect_timeout",
+        doc="time in seconds to wait to make a connection",
+        default=10.0,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "read_timeout",
+        doc="time in seconds to wait to read from a connection",
+        default=60.0,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "multipart_threshold",
+        doc=(
+            "objects this size in bytes or bigger are uploaded in parts; smaller "
+            "objects are saved with a single request"
+        ),
+        default=8 * 1024 * 1024,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "multipart_chunksize",
+        doc="the size in bytes of parts when uploading in parts",
+        default=8 * 1024 * 1024,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "max_transfer_concurrency",
+        doc="the maximum number of threads to upload parts of an object with",
+        default=4,
+        reference_value_from="resource.boto",
+    )
 
     KeyNotFound = KeyNotFound
 
@@ -109,6 +172,11 @@ class S3Connection(RequiredConfig):
         self.config = config
         self.bucket = self.config.bucket_name
         self.client = self.build_client()
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.config.multipart_threshold,
+            multipart_chunksize=self.config.multipart_chunksize,
+            max_concurrency=self.config.max_transfer_concurrency,
+        )
 
     @retry(
         retryable_exceptions=[
@@ -139,6 +207,11 @@ class S3Connection(RequiredConfig):
         kwargs = {
             "service_name": "s3",
             "region_name": self.config.region,
+            "config": Config(
+                max_pool_connections=self.config.max_pool_connections,
+                connect_timeout=self.config.connect_timeout,
+                read_timeout=self.config.read_timeout,
+            ),
         }
         if self.config.s3_endpoint_url:
             kwargs["endpoint_url"] = self.config.s3_endpoint_url
@@ -172,8 +245,17 @@ class S3Connection(RequiredConfig):
         if not isinstance(data, bytes):
             raise TypeError("data argument must be bytes")
 
+        if len(data) < self.config.multipart_threshold:
+            # Small objects like raw and processed crashes don't need the
+            # transfer manager and its threads
+            self.client.put_object(Body=data, Bucket=self.bucket, Key=path)
+            return
+
         self.client.upload_fileobj(
-            Fileobj=io.BytesIO(data), Bucket=self.bucket, Key=path
+            Fileobj=io.BytesIO(data),
+            Bucket=self.bucket,
+            Key=path,
+            Config=self.transfer_config,
         )
 
     @retry(
@@ -209,3 +291,155 @@ class S3Connection(RequiredConfig):
                 "%s (bucket=%r key=%r) not found, no value returned"
                 % (id, self.config.bucket_name, path)
             )
+
+    @retry(
+        retryable_exceptions=[
+            # FIXME(willkg): Seems like botocore always raises ClientError
+            # which is unhelpful for granularity purposes.
+            ClientError
+        ],
+        wait_time_generator=wait_times_access,
+        module_logger=logger,
+    )
+    def download_file(self, path, filepath):
+        """Download a file from S3 and write it to the local filesystem.
+
+        The object is streamed to disk in chunks, so it's never held in memory
+        all at once. If the download fails, the partial file is removed.
+
+        This will retry a handful of times in short succession so as to deal
+        with some amount of fishiness. After that, the caller should retry
+        after a longer period of time.
+
+        :arg str path: the path to load from
+        :arg str filepath: the local path to write the file to
+
+        :raises botocore.exceptions.ClientError: connection issues, permissions
+            issues, bucket is missing, etc.
+        :raises KeyNotFound: if the key is not found
+
+        """
+        try:
+            resp = self.client.get_object(Bucket=self.config.bucket_name, Key=path)
+        except self.client.exceptions.NoSuchKey:
+            raise KeyNotFound(
+                "(bucket=%r key=%r) not found, no file written"
+                % (self.config.bucket_name, path)
+            )
+
+        try:
+            with open(filepath, "wb") as fp:
+                shutil.copyfileobj(resp["Body"], fp, DOWNLOAD_CHUNK_SIZE)
+        except BaseException:
+            if os.path.exists(filepath):
+                os.unlink(filepath)
+            raise
+
+
+class CachingS3Connection(S3Connection):
+    """S3Connection with a disk read-through cache
+
+    Objects that are loaded, downloaded, or saved are kept in a
+    ``DiskObjectCache`` in ``cache_path`` and loads and downloads of them are
+    served from there until they're evicted. This saves fetching the same
+    objects from S3 over and over in the webapp and when reprocessing crashes.
+    Processes on a node can share the cache directory.
+
+    Raw crashes and dumps don't change once they're saved, but processed crashes
+    are saved again when a crash is reprocessed, possibly by another node. Cached
+    objects with keys that start with one of ``cache_mutable_prefixes`` are only
+    used for ``cache_mutable_ttl`` seconds after they were cached.
+
+    If the cache directory can't be read from or written to, that's logged and
+    the connection goes to S3.
+
+    Emits:
+
+    * ``socorro.s3_cache.get``: a load or download tagged with ``result:`` ``hit``
+      or ``miss``
+    * ``socorro.s3_cache.error``: an error reading from or writing to the cache
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "cache_path",
+        doc="the directory to cache S3 objects in",
+        default=os.path.join(tempfile.gettempdir(), "s3-cache"),
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "cache_max_size",
+        doc="the maximum size in bytes of the cached S3 objects",
+        default=1024 * 1024 * 1024,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "cache_mutable_prefixes",
+        doc=(
+            "comma-delimited list of key prefixes for objects that can change; "
+            "cached copies of them expire after cache_mutable_ttl seconds"
+        ),
+        default="v1/processed_crash/,v1/crash_report/",
+        from_string_converter=list_converter,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "cache_mutable_ttl",
+        doc="seconds cached copies of objects that can change are used for",
+        default=300.0,
+        reference_value_from="resource.boto",
+    )
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.metrics = markus.get_metrics("socorro.s3_cache")
+        self.cache = DiskObjectCache(
+            path=self.config.cache_path, max_size=self.config.cache_max_size
+        )
+
+    def _cache_key(self, path):
+        return "%s/%s" % (self.bucket, path)
+
+    def _max_age(self, path):
+        if path.startswith(tuple(self.config.cache_mutable_prefixes)):
+            return self.config.cache_mutable_ttl
+        return None
+
+    def _cache_call(self, fun, *args, **kwargs):
+        """Calls a cache method and returns None if the cache can't be used"""
+        try:
+            return fun(*args, **kwargs)
+        except OSError:
+            logger.exception("error using S3 object cache at %s", self.cache.path)
+            self.metrics.incr("error")
+            return None
+
+    def save_file(self, path, data):
+        super().save_file(path, data)
+        self._cache_call(self.cache.put, self._cache_key(path), data)
+
+    def load_file(self, path):
+        key = self._cache_key(path)
+        data = self._cache_call(self.cache.get, key, max_age=self._max_age(path))
+        if data is not None:
+            self.metrics.incr("get", tags=["result:hit"])
+            return data
+
+        self.metrics.incr("get", tags=["result:miss"])
+        data = super().load_file(path)
+        self._cache_call(self.cache.put, key, data)
+        return data
+
+    def download_file(self, path, filepath):
+        key = self._cache_key(path)
+        copied = self._cache_call(
+            self.cache.copy_to, key, filepath, max_age=self._max_age(path)
+        )
+        if copied:
+            self.metrics.incr("get", tags=["result:hit"])
+            return
+
+        self.metrics.incr("get", tags=["result:miss"])
+        super().download_file(path, filepath)
+        self._cache_call(self.cache.put_file, key, filepath)
@@ -2,9 +2,11 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
-import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+import gzip
 import json
 import logging
+import os
 
 from configman import Namespace
 from configman.converters import class_converter
@@ -13,9 +15,10 @@ from configman.dotdict import DotDict
 from socorro.external.crashstorage_base import (
     CrashStorageBase,
     CrashIDNotFound,
+    FileDumpsMapping,
     MemoryDumpsMapping,
 )
-from socorro.lib.libjson import schema_reduce
+from socorro.lib.libjson import deserialize_json, schema_reduce, serialize_json
 from socorro.lib.libooid import date_from_ooid
 from socorro.lib.util import dotdict_to_dict
 from socorro.schemas import TELEMETRY_SOCORRO_CRASH_SCHEMA
@@ -97,17 +100,15 @@ def build_keys(name_of_thing, crashid):
     ]
 
 
-class JSONISOEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime.date):
-            return obj.isoformat()
-        raise NotImplementedError(f"Don't know about {obj!r}")
+def dict_to_bytes(a_mapping):
+    """Serializes a mapping to JSON bytes; dates become ISO 8601 strings"""
+    if isinstance(a_mapping, DotDict):
+        a_mapping = dotdict_to_dict(a_mapping)
+    return serialize_json(a_mapping)
 
 
 def dict_to_str(a_mapping):
-    if isinstance(a_mapping, DotDict):
-        a_mapping = dotdict_to_dict(a_mapping)
-    return json.dumps(a_mapping, cls=JSONISOEncoder)
+    return dict_to_bytes(a_mapping).decode("utf-8")
 
 
 def list_to_str(a_list):
@@ -118,8 +119,47 @@ def str_to_list(a_string):
     return json.loads(a_string)
 
 
+# Every gzip stream starts with these bytes and JSON never does, so they mark
+# compressed crash data
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def compress_data(data):
+    """Compresses crash data with gzip"""
+    # mtime=0 so the same data always compresses to the same bytes
+    return gzip.compress(data, mtime=0)
+
+
+def decompress_data(data):
+    """Decompresses crash data if it's compressed
+
+    Crash data saved before compression was turned on isn't compressed, so
+    that's returned as is.
+
+    """
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    return data
+
+
+def remove_files(paths):
+    """Removes files ignoring ones that are already gone"""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
 class BotoS3CrashStorage(CrashStorageBase):
-    """Saves and loads crash data to S3"""
+    """Saves and loads crash data to S3
+
+    If ``compress_crash_data`` is True, raw crashes and processed crashes are
+    saved compressed with gzip under the same keys. Loading them works with
+    both compressed and uncompressed objects, so it can be turned on without
+    rewriting existing crash data. Dumps are never compressed.
+
+    """
 
     required_config = Namespace()
     required_config.add_option(
@@ -146,10 +186,37 @@ class BotoS3CrashStorage(CrashStorageBase):
         default="configman.dotdict.DotDict",
         from_string_converter=class_converter,
     )
+    required_config.add_option(
+        "max_concurrent_fetches",
+        doc=(
+            "the maximum number of S3 objects to fetch at the same time when "
+            "fetching dumps and crash bundles"
+        ),
+        default=10,
+        reference_value_from="resource.boto",
+    )
+    required_config.add_option(
+        "compress_crash_data",
+        doc=(
+            "whether to save raw crashes and processed crashes compressed with "
+            "gzip; compressed and uncompressed crash data can always be loaded"
+        ),
+        default=False,
+        reference_value_from="resource.boto",
+    )
 
     def __init__(self, config, namespace=""):
         super().__init__(config, namespace=namespace)
         self.conn = config.resource_class(config)
+        # Fetches go through self.conn, so they share its connection pool
+        self.fetch_executor = ThreadPoolExecutor(
+            max_workers=config.max_concurrent_fetches,
+            thread_name_prefix="s3fetch",
+        )
+
+    def close(self):
+        self.fetch_executor.shutdown(wait=True)
+        super().close()
 
     def save_raw_crash(self, raw_crash, dumps, crash_id):
         """Save raw crash data to S3 bucket.
@@ -163,7 +230,7 @@ class BotoS3CrashStorage(CrashStorageBase):
             dumps = MemoryDumpsMapping()
 
         path = build_keys("raw_crash", crash_id)[0]
-        raw_crash_data = dict_to_str(raw_crash).encode("utf-8")
+        raw_crash_data = self._encode_crash_data(raw_crash)
         self.conn.save_file(path, raw_crash_data)
 
         path = build_keys("dump_names", crash_id)[0]
@@ -183,10 +250,17 @@ class BotoS3CrashStorage(CrashStorageBase):
     def save_processed_crash(self, raw_crash, processed_crash):
         """Save the processed crash file."""
         crash_id = processed_crash["uuid"]
-        data = dict_to_str(processed_crash).encode("utf-8")
+        data = self._encode_crash_data(processed_crash)
         path = build_keys("processed_crash", crash_id)[0]
         self.conn.save_file(path, data)
 
+    def _encode_crash_data(self, crash_data):
+        """Serializes crash data and compresses it if configured to"""
+        data = dict_to_bytes(crash_data)
+        if self.config.compress_crash_data:
+            data = compress_data(data)
+        return data
+
     def get_raw_crash(self, crash_id):
         """Get the raw crash file for the given crash id.
 
@@ -197,8 +271,8 @@ class BotoS3CrashStorage(CrashStorageBase):
         """
         try:
             path = build_keys("raw_crash", crash_id)[0]
-            raw_crash_as_string = self.conn.load_file(path)
-            return json.loads(
+            raw_crash_as_string = decompress_data(self.conn.load_file(path))
+            return deserialize_json(
                 raw_crash_as_string, object_hook=self.config.json_object_hook
             )
         except self.conn.KeyNotFound as x:
@@ -247,19 +321,94 @@ class BotoS3CrashStorage(CrashStorageBase):
     def get_dumps_as_files(self, crash_id):
         """Get the dump files for given crash id and save them to tmp.
 
+        Dumps are streamed from S3 straight to files in
+        ``temporary_file_system_storage_path`` so they're never held in memory.
+
         :returns: dict of dumpname -> file path
 
         :raises CrashIDNotFound: if file does not exist
 
         """
-        in_memory_dumps = self.get_dumps(crash_id)
-        # convert our native memory dump mapping into a file dump mapping.
-        return in_memory_dumps.as_file_dumps_mapping(
-            crash_id,
-            self.config.temporary_file_system_storage_path,
-            self.config.dump_file_suffix,
+        temp_path = self.config.temporary_file_system_storage_path
+        dump_file_suffix = self.config.dump_file_suffix
+
+        try:
+            path = build_keys("dump_names", crash_id)[0]
+            dump_names = str_to_list(self.conn.load_file(path))
+        except self.conn.KeyNotFound as x:
+            raise CrashIDNotFound("%s not found: %s" % (crash_id, x))
+
+        dumps = FileDumpsMapping()
+        for dump_name in dump_names:
+            if dump_name in (None, "", "dump"):
+                dump_name = "upload_file_minidump"
+            # Dump files are named the same way as in
+            # MemoryDumpsMapping.as_file_dumps_mapping
+            dumps[dump_name] = os.path.join(
+                temp_path,
+                "%s.%s.TEMPORARY%s" % (crash_id, dump_name, dump_file_suffix),
+            )
+
+        # Download the dumps at the same time and wait for all of them so none
+        # are still being written when cleaning up after a failure
+        futures = []
+        for dump_name, dump_pathname in dumps.items():
+            key_name = "dump" if dump_name == "upload_file_minidump" else dump_name
+            path = build_keys(key_name, crash_id)[0]
+            futures.append(
+                self.fetch_executor.submit(self.conn.download_file, path, dump_pathname)
+            )
+        wait(futures)
+
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            # Remove whatever was downloaded since the caller doesn't get a
+            # mapping to clean up
+            remove_files(dumps.values())
+            for error in errors:
+                if isinstance(error, self.conn.KeyNotFound):
+                    raise CrashIDNotFound("%s not found: %s" % (crash_id, error))
+            raise errors[0]
+
+        return dumps
+
+    def _get_unredacted_processed_or_none(self, crash_id):
+        try:
+            return self.get_unredacted_processed(crash_id)
+        except CrashIDNotFound:
+            return None
+
+    def get_crash_bundle(self, crash_id):
+        """Get the raw crash, dumps, and processed crash for a crash id.
+
+        The raw crash, processed crash, and dump names are fetched at the same
+        time. The dumps are downloaded at the same time as soon as the dump names
+        are in.
+
+        :returns: (raw_crash, dumps, processed_crash) tuple where dumps is a dict
+            of dumpname -> file path and processed_crash is None if the crash
+            hasn't been processed
+
+        :raises CrashIDNotFound: if the raw crash or dumps don't exist
+
+        """
+        raw_crash_future = self.fetch_executor.submit(self.get_raw_crash, crash_id)
+        processed_crash_future = self.fetch_executor.submit(
+            self._get_unredacted_processed_or_none, crash_id
         )
 
+        # This runs in this thread so downloading dumps never waits on a fetch
+        # executor thread that's waiting on the fetch executor
+        dumps = self.get_dumps_as_files(crash_id)
+        try:
+            raw_crash = raw_crash_future.result()
+            processed_crash = processed_crash_future.result()
+        except Exception:
+            remove_files(dumps.values())
+            raise
+
+        return raw_crash, dumps, processed_crash
+
     def get_unredacted_processed(self, crash_id):
         """Get the processed crash.
 
@@ -270,8 +419,8 @@ class BotoS3CrashStorage(CrashStorageBase):
         """
         path = build_keys("processed_crash", crash_id)[0]
         try:
-            processed_crash_as_string = self.conn.load_file(path)
-            return json.loads(
+            processed_crash_as_string = decompress_data(self.conn.load_file(path))
+            return deserialize_json(
                 processed_crash_as_string, object_hook=self.config.json_object_hook
             )
         except self.conn.KeyNotFound as x:
@@ -284,6 +433,8 @@ class TelemetryBotoS3CrashStorage(BotoS3CrashStorage):
     The subset of the processed crash is based on the JSON Schema which is
     derived from "socorro/external/es/super_search_fields.py".
 
+    Crash reports are never compressed since Telemetry reads them.
+
     """
 
     # List of source -> target keys which have different names for historical reasons
@@ -317,7 +468,7 @@ class TelemetryBotoS3CrashStorage(BotoS3CrashStorage):
                 crash_report[target_key] = processed_crash[source_key]
 
         crash_id = crash_report["uuid"]
-        data = dict_to_str(crash_report).encode("utf-8")
+        data = dict_to_bytes(crash_report)
         path = build_keys("crash_report", crash_id)[0]
         self.conn.save_file(path, data)
 
@@ -332,7 +483,7 @@ class TelemetryBotoS3CrashStorage(BotoS3CrashStorage):
         path = build_keys("crash_report", crash_id)[0]
         try:
             crash_report_as_str = self.conn.load_file(path)
-            return json.loads(
+            return deserialize_json(
                 crash_report_as_str, object_hook=self.config.json_object_hook
             )
         except self.conn.KeyNotFound as x:
@@ -0,0 +1,242 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Disk cache of S3 objects.
+
+The webapp and the processor's reprocessing path fetch the same raw crashes,
+processed crashes, and minidumps from S3 over and over. ``DiskObjectCache``
+keeps copies of objects in a local directory so they can be read from disk
+instead.
+
+Every object is a file named with the sha256 of its key. A file's modification
+time is when it was cached and its access time is when it was last used. When
+the files add up to more than the maximum size, the least recently used ones
+are removed.
+
+The size of the cache is figured by scanning the directory, so several
+processes on a node can share it. Between scans, each process adds what it put
+in the cache to the size from the last scan. It scans again when that goes
+over the maximum size or when the last scan is older than ``scan_interval``
+seconds, so the cache can go over the maximum size by what the other processes
+put in it since then.
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+TMP_FILE_SUFFIX = ".tmp"
+
+
+class DiskObjectCache:
+    """Disk cache of objects with LRU eviction
+
+    :arg path: the directory to keep objects in
+    :arg max_size: the maximum size of the cache in bytes
+    :arg scan_interval: the most seconds between directory scans
+
+    """
+
+    def __init__(self, path, max_size, scan_interval=60.0):
+        self.path = path
+        self.max_size = max_size
+        self.scan_interval = scan_interval
+
+        self._lock = threading.Lock()
+        self._size = 0
+        self._last_scan = 0.0
+
+        os.makedirs(self.path, exist_ok=True)
+        self.evict()
+
+    def _filepath(self, key):
+        return os.path.join(self.path, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def _get_fresh_filepath(self, key, max_age):
+        """Returns the filepath for a key if it's cached and marks it used
+
+        :returns: filepath or None if it's not cached or is older than max_age
+
+        """
+        filepath = self._filepath(key)
+        try:
+            mtime = os.stat(filepath).st_mtime
+        except FileNotFoundError:
+            return None
+
+        if max_age is not None and time.time() - mtime > max_age:
+            return None
+
+        # Mark it as used now and keep when it was cached
+        try:
+            os.utime(filepath, (time.time(), mtime))
+        except FileNotFoundError:
+            # Another process evicted it
+            return None
+        return filepath
+
+    def get(self, key, max_age=None):
+        """Returns the cached object for a key or None
+
+        :arg key: the object key
+        :arg max_age: if not None, the oldest in seconds a cached object can be
+
+        :returns: bytes or None
+
+        :raises OSError: if the cache directory can't be read
+
+        """
+        filepath = self._get_fresh_filepath(key, max_age)
+        if filepath is None:
+            return None
+        try:
+            with open(filepath, "rb") as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return None
+
+    def copy_to(self, key, dest_filepath, max_age=None):
+        """Copies the cached object for a key to a file
+
+        :arg key: the object key
+        :arg dest_filepath: the path of the file to write
+        :arg max_age: if not None, the oldest in seconds a cached object can be
+
+        :returns: True if the object was cached and copied and False if not
+
+        :raises OSError: if the cache directory can't be read or the file can't
+            be written
+
+        """
+        filepath = self._get_fresh_filepath(key, max_age)
+        if filepath is None:
+            return False
+        try:
+            shutil.copyfile(filepath, dest_filepath)
+        except FileNotFoundError:
+            if os.path.exists(dest_filepath):
+                os.unlink(dest_filepath)
+            return False
+        return True
+
+    def _add(self, key, write):
+        """Writes an object to a temp file with write(fp) and moves it into place"""
+        fd, tmp_filepath = tempfile.mkstemp(dir=self.path, suffix=TMP_FILE_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                write(fp)
+                size = fp.tell()
+            os.replace(tmp_filepath, self._filepath(key))
+        except BaseException:
+            if os.path.exists(tmp_filepath):
+                os.unlink(tmp_filepath)
+            raise
+
+        with self._lock:
+            self._size += size
+            needs_scan = (
+                self._size > self.max_size
+                or time.monotonic() - self._last_scan > self.scan_interval
+            )
+        if needs_scan:
+            self.evict()
+
+    def put(self, key, data):
+        """Adds an object to the cache and evicts objects if it's too big
+
+        Objects bigger than the maximum size of the cache aren't added.
+
+        :arg key: the object key
+        :arg data: the object as bytes
+
+        :raises OSError: if the cache directory can't be written to
+
+        """
+        if len(data) > self.max_size:
+            self.remove(key)
+            return
+        self._add(key, lambda fp: fp.write(data))
+
+    def put_file(self, key, src_filepath):
+        """Adds an object from a file to the cache and evicts objects if it's too big
+
+        Objects bigger than the maximum size of the cache aren't added.
+
+        :arg key: the object key
+        :arg src_filepath: the path of the file with the object in it
+
+        :raises OSError: if the file can't be read or the cache directory can't
+            be written to
+
+        """
+        if os.path.getsize(src_filepath) > self.max_size:
+            self.remove(key)
+            return
+
+        def _copy(fp):
+            with open(src_filepath, "rb") as src_fp:
+                shutil.copyfileobj(src_fp, fp)
+
+        self._add(key, _copy)
+
+    def remove(self, key):
+        """Removes an object from the cache if it's there"""
+        try:
+            os.unlink(self._filepath(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Scans the cache directory and removes least recently used objects
+
+        Temp files left by processes that died while adding an object are
+        removed too.
+
+        """
+        now = time.time()
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.path):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            if entry.name.endswith(TMP_FILE_SUFFIX):
+                # Temp files are moved into place right after they're written
+                if now - stat.st_mtime > self.scan_interval:
+                    self._unlink(entry.path)
+                continue
+
+            entries.append((stat.st_atime, entry.path, stat.st_size))
+            total_size += stat.st_size
+
+        entries.sort()
+        for _, filepath, size in entries:
+            if total_size <= self.max_size:
+                break
+            self._unlink(filepath)
+            total_size -= size
+
+        with self._lock:
+            self._size = total_size
+            self._last_scan = time.monotonic()
+
+    def _unlink(self, filepath):
+        try:
+            os.unlink(filepath)
+        except FileNotFoundError:
+            pass
+
+    @property
+    def size(self):
+        """The size of the cache in bytes as of the last scan plus what's been added"""
+        return self._size
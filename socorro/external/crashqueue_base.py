@@ -34,6 +34,14 @@ class CrashQueueBase(RequiredConfig):
     def new_crashes(self):
         return self.__iter__()
 
+    def get_backlog(self):
+        """Return the approximate number of crash ids waiting to be processed.
+
+        :returns: int or None if the crash queue can't tell
+
+        """
+        return None
+
     def __call__(self):
         return self.__iter__()
 
@@ -4,11 +4,15 @@
 
 """Base classes for crashstorage system."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import datetime
 from collections.abc import MutableSequence, Sequence
 import logging
 import os
 import sys
+import threading
+import time
 
 from configman import Namespace, RequiredConfig
 from configman.converters import class_converter, str_to_list
@@ -242,6 +246,30 @@ class CrashStorageBase(RequiredConfig):
         """
         raise NotImplementedError("get_dumps is not implemented")
 
+    def get_crash_bundle(self, crash_id):
+        """Fetch everything needed to process a crash.
+
+        By default, this fetches the raw crash, dumps, and processed crash one
+        after another. Crash storage implementations that can fetch them at the
+        same time can override it.
+
+        :param crash_id: crash report id
+
+        :returns: (raw_crash, dumps, processed_crash) tuple where dumps is a dict
+            of dumpname -> file path and processed_crash is None if the crash
+            hasn't been processed
+
+        :raises CrashIDNotFound: if the raw crash or dumps don't exist
+
+        """
+        raw_crash = self.get_raw_crash(crash_id)
+        dumps = self.get_dumps_as_files(crash_id)
+        try:
+            processed_crash = self.get_unredacted_processed(crash_id)
+        except CrashIDNotFound:
+            processed_crash = None
+        return raw_crash, dumps, processed_crash
+
     def get_processed(self, crash_id):
         """Fetch processed crash.
 
@@ -272,6 +300,29 @@ class CrashStorageBase(RequiredConfig):
         """
         raise NotImplementedError("remove is not implemented")
 
+    # The async variants of the API let many crashes be in their I/O phases at the
+    # same time. By default, they run the blocking method in the event loop's
+    # default executor. Crash storage implementations with native async clients can
+    # override them.
+
+    async def save_processed_crash_async(self, raw_crash, processed_crash):
+        """Async variant of save_processed_crash."""
+        return await asyncio.to_thread(
+            self.save_processed_crash, raw_crash, processed_crash
+        )
+
+    async def get_raw_crash_async(self, crash_id):
+        """Async variant of get_raw_crash."""
+        return await asyncio.to_thread(self.get_raw_crash, crash_id)
+
+    async def get_dumps_as_files_async(self, crash_id):
+        """Async variant of get_dumps_as_files."""
+        return await asyncio.to_thread(self.get_dumps_as_files, crash_id)
+
+    async def get_unredacted_processed_async(self, crash_id):
+        """Async variant of get_unredacted_processed."""
+        return await asyncio.to_thread(self.get_unredacted_processed, crash_id)
+
 
 class PolyStorageError(Exception, MutableSequence):
     """Exception container holding a sequence of exceptions with tracebacks
@@ -343,6 +394,15 @@ class StorageNamespaceList(Sequence):
             self.required_config[storage_name].add_option(
                 "crashstorage_class", from_string_converter=class_converter
             )
+            self.required_config[storage_name].add_option(
+                "save_timeout",
+                doc=(
+                    "seconds to wait for this crashstorage to save a processed crash "
+                    "when saving concurrently; 0 uses the default save_timeout"
+                ),
+                default=0.0,
+                from_string_converter=float,
+            )
 
     def __len__(self):
         return len(self.storage_namespaces)
@@ -365,6 +425,21 @@ class StorageNamespaceList(Sequence):
         return cls(namespaces)
 
 
+class _ConcurrentSave:
+    """A save to one crashstorage when PolyCrashStorage saves concurrently"""
+
+    def __init__(self, a_store):
+        self.a_store = a_store
+        self.started = threading.Event()
+        self.start_time = None
+        self.future = None
+
+    def run(self, raw_crash, processed_crash):
+        self.start_time = time.monotonic()
+        self.started.set()
+        self.a_store.save_processed_crash(raw_crash, processed_crash)
+
+
 class PolyCrashStorage(CrashStorageBase):
     """Crashstorage pipeline for multiple crashstorage destinations
 
@@ -391,6 +466,18 @@ class PolyCrashStorage(CrashStorageBase):
     ``my.config`` option as being set to "Postgres", while the S3Storage instance will
     see ``my.config`` set to "S3".
 
+    By default, processed crashes are saved to one crashstorage after another. With
+    ``save_concurrently`` set, they're saved to all the crashstorage instances at the
+    same time, so saving takes as long as the slowest crashstorage rather than the
+    sum of all of them. Each crashstorage has its own pool of ``save_threads``
+    threads, so a slow one doesn't hold up saves to the others.
+
+    A save that doesn't start within the crashstorage's ``save_timeout`` or doesn't
+    finish within ``save_timeout`` of starting is counted as failed. It's not
+    stopped, but the save no longer waits for it. While a crashstorage has saves
+    like that still running, saves to it fail right away rather than pile up more
+    threads behind it.
+
     """
 
     required_config = Namespace()
@@ -401,6 +488,28 @@ class PolyCrashStorage(CrashStorageBase):
         from_string_converter=StorageNamespaceList.converter,
         likely_to_be_changed=True,
     )
+    required_config.add_option(
+        "save_concurrently",
+        doc="whether to save processed crashes to all crashstorages at the same time",
+        default=False,
+    )
+    required_config.add_option(
+        "save_threads",
+        doc=(
+            "the number of threads per crashstorage for saving processed crashes "
+            "concurrently"
+        ),
+        default=16,
+    )
+    required_config.add_option(
+        "save_timeout",
+        doc=(
+            "default seconds to wait for a crashstorage to save a processed crash "
+            "when saving concurrently; 0 waits forever"
+        ),
+        default=30.0,
+        from_string_converter=float,
+    )
 
     def __init__(self, config, namespace=""):
         """Instantiate all the subordinate crashstorage instances
@@ -426,6 +535,24 @@ class PolyCrashStorage(CrashStorageBase):
                 namespace=absolute_namespace,
             )
 
+        self.save_concurrently = config.save_concurrently
+        self.save_timeouts = {}
+        self.save_executors = {}
+        # storage namespace -> set of futures for saves that timed out and are
+        # still running
+        self.timed_out_saves = {}
+        self._timed_out_saves_lock = threading.Lock()
+        if self.save_concurrently:
+            for storage_namespace in self.storage_namespaces:
+                self.save_timeouts[storage_namespace] = (
+                    config[storage_namespace].save_timeout or config.save_timeout
+                )
+                self.save_executors[storage_namespace] = ThreadPoolExecutor(
+                    max_workers=config.save_threads,
+                    thread_name_prefix=f"PolySave-{storage_namespace}",
+                )
+                self.timed_out_saves[storage_namespace] = set()
+
     def close(self):
         """Close resources used by crashstorage instances.
 
@@ -434,6 +561,9 @@ class PolyCrashStorage(CrashStorageBase):
             systems.
 
         """
+        for save_executor in self.save_executors.values():
+            save_executor.shutdown(wait=True)
+
         storage_exception = PolyStorageError()
         for a_store in self.stores.values():
             try:
@@ -472,20 +602,93 @@ class PolyCrashStorage(CrashStorageBase):
         not mutate the raw and processed crash structures!
 
         """
+        if self.save_concurrently:
+            self._save_processed_crash_concurrently(raw_crash, processed_crash)
+            return
+
         storage_exception = PolyStorageError()
         for a_store in self.stores.values():
             try:
                 a_store.save_processed_crash(raw_crash, processed_crash)
             except Exception:
-                store_class = getattr(a_store, "wrapped_object", a_store.__class__)
-                crash_id = processed_crash.get("uuid", "NONE")
-                self.logger.error(
-                    "%r failed (crash id: %s)", store_class, crash_id, exc_info=True
+                self._log_save_error(a_store, processed_crash)
+                storage_exception.gather_current_exception()
+        if storage_exception.has_exceptions():
+            raise storage_exception
+
+    def _save_processed_crash_concurrently(self, raw_crash, processed_crash):
+        """Save processed crash to all crashstorage destinations at the same time
+
+        This waits for each save to start and then to finish up to the
+        crashstorage's timeout each.
+
+        """
+
+        saves = []
+        storage_exception = PolyStorageError()
+        for storage_namespace, a_store in self.stores.items():
+            try:
+                with self._timed_out_saves_lock:
+                    busy = len(self.timed_out_saves[storage_namespace])
+                if busy:
+                    raise TimeoutError(
+                        f"{storage_namespace} is still running {busy} save(s) that "
+                        "timed out; not saving"
+                    )
+                save = _ConcurrentSave(a_store)
+                save.future = self.save_executors[storage_namespace].submit(
+                    save.run, raw_crash, processed_crash
                 )
+                saves.append((storage_namespace, save))
+            except Exception:
+                self._log_save_error(a_store, processed_crash)
+                storage_exception.gather_current_exception()
+
+        for storage_namespace, save in saves:
+            timeout = self.save_timeouts.get(storage_namespace) or None
+            try:
+                if not save.started.wait(timeout) and save.future.cancel():
+                    raise TimeoutError(
+                        f"{storage_namespace} save didn't start within {timeout}s"
+                    )
+                # It's started, so wait for what's left of the timeout since then
+                if timeout is not None:
+                    save.started.wait()
+                    timeout = max(timeout - (time.monotonic() - save.start_time), 0)
+                try:
+                    save.future.result(timeout=timeout)
+                except FuturesTimeoutError:
+                    self._track_timed_out_save(storage_namespace, save.future)
+                    raise TimeoutError(
+                        f"{storage_namespace} save timed out after "
+                        f"{self.save_timeouts[storage_namespace]}s"
+                    )
+            except Exception:
+                self._log_save_error(save.a_store, processed_crash)
                 storage_exception.gather_current_exception()
         if storage_exception.has_exceptions():
             raise storage_exception
 
+    def _track_timed_out_save(self, storage_namespace, future):
+        """Keep track of a save that timed out until it's done"""
+        timed_out_saves = self.timed_out_saves[storage_namespace]
+
+        def _done(future):
+            with self._timed_out_saves_lock:
+                timed_out_saves.discard(future)
+
+        with self._timed_out_saves_lock:
+            timed_out_saves.add(future)
+        # This calls _done right away if the save is done already
+        future.add_done_callback(_done)
+
+    def _log_save_error(self, a_store, processed_crash):
+        store_class = getattr(a_store, "wrapped_object", a_store.__class__)
+        crash_id = processed_crash.get("uuid", "NONE")
+        self.logger.error(
+            "%r failed (crash id: %s)", store_class, crash_id, exc_info=True
+        )
+
 
 class BenchmarkingCrashStorage(CrashStorageBase):
     """Wrapper around crash stores that will benchmark the calls in the logs"""
@@ -555,6 +758,13 @@ class BenchmarkingCrashStorage(CrashStorageBase):
         self.logger.debug("%s get_dumps_as_files %s", self.tag, end_time - start_time)
         return result
 
+    def get_crash_bundle(self, crash_id):
+        start_time = self.start_timer()
+        result = self.wrapped_crashstore.get_crash_bundle(crash_id)
+        end_time = self.end_timer()
+        self.logger.debug("%s get_crash_bundle %s", self.tag, end_time - start_time)
+        return result
+
     def get_unredacted_processed(self, crash_id):
         start_time = self.start_timer()
         result = self.wrapped_crashstore.get_unredacted_processed(crash_id)
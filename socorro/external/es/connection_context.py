@@ -10,9 +10,11 @@ import re
 from configman import Namespace, RequiredConfig
 from configman.converters import list_converter
 import elasticsearch
+from elasticsearch.exceptions import SerializationError
 
 from socorro.external.es.super_search_fields import build_mapping
 from socorro.lib.libdatetime import utc_now
+from socorro.lib.libjson import deserialize_json, serialize_json
 
 
 # Elasticsearch indices configuration.
@@ -22,6 +24,26 @@ ES_CUSTOM_ANALYZERS = {
 ES_QUERY_SETTINGS = {"default_field": "signature"}
 
 
+class JSONSerializer(elasticsearch.serializer.JSONSerializer):
+    """Elasticsearch client serializer that uses socorro.lib.libjson"""
+
+    def loads(self, s):
+        try:
+            return deserialize_json(s)
+        except (ValueError, TypeError) as exc:
+            raise SerializationError(s, exc)
+
+    def dumps(self, data):
+        # Strings are passed through as is
+        if isinstance(data, (str, bytes)):
+            return data
+
+        try:
+            return serialize_json(data, default=self.default).decode("utf-8")
+        except (ValueError, TypeError) as exc:
+            raise SerializationError(data, exc)
+
+
 class ConnectionContext(RequiredConfig):
     """Elasticsearch connection manager.
 
@@ -105,6 +127,7 @@ class ConnectionContext(RequiredConfig):
             timeout=timeout,
             connection_class=elasticsearch.connection.RequestsHttpConnection,
             verify_certs=True,
+            serializer=JSONSerializer(),
         )
 
     def get_index_template(self):
@@ -4,8 +4,7 @@
 
 import copy
 import datetime
-from functools import cache
-import json
+from functools import cache, partial
 import re
 import time
 
@@ -24,7 +23,8 @@ from socorro.external.es.super_search_fields import (
     is_indexable,
     parse_mapping,
 )
-from socorro.lib.libdatetime import JsonDTEncoder, string_to_datetime
+from socorro.lib.libdatetime import string_to_datetime
+from socorro.lib.libjson import serialize_json
 
 
 # Maximum size in characters for a keyword field value
@@ -224,60 +224,168 @@ def fix_datetime(value):
     return value
 
 
-def build_document(src, crash_document, fields, all_keys):
-    """Given a source document and fields and valid keys, builds a document to index.
+@cache
+def get_source_accessor(src_key):
+    """Returns a function that pulls the value for a dotted key out of a document
+
+    The function walks the document with item lookups and returns None if any part
+    of the path is missing. It never copies or changes the document.
+
+    :arg str src_key: dotted key like "processed_crash.json_dump.system_info.cpu_count"
+
+    :returns: function that takes a document and returns the value or None
+
+    """
+    parts = tuple(src_key.split("."))
+
+    def accessor(document):
+        value = document
+        for part in parts:
+            try:
+                value = value[part]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    return accessor
+
+
+@cache
+def get_dest_setter(dest_key):
+    """Returns a function that sets the value for a dotted key in a document
+
+    The function creates dicts for the parts of the path that are missing.
+
+    :arg str dest_key: dotted key like "processed_crash.cpu_count"
+
+    :returns: function that takes a document and a value
+
+    """
+    *parents, key = dest_key.split(".")
+    parents = tuple(parents)
+
+    def setter(document, value):
+        for part in parents:
+            document = document.setdefault(part, {})
+        document[key] = value
+
+    return setter
+
+
+def copy_value(value):
+    """Copies values that are lists or dicts so documents don't share them"""
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+def get_fixer(field):
+    """Returns the function that fixes values for a field so they index correctly
+
+    :arg dict field: a super search fields field
+
+    :returns: function that takes a value and returns the fixed value or None if
+        the value shouldn't be indexed
+
+    """
+    storage_type = field.get("type", field["storage_mapping"].get("type"))
+
+    if (
+        storage_type == "multi_field"
+        and glom.glom(field, "storage_mapping.fields.full.type", default="") == "string"
+    ):
+        storage_type = "string"
+
+    if storage_type == "string":
+        analyzer = field.get("analyzer", field["storage_mapping"].get("analyzer"))
+        if analyzer == "keyword":
+            return partial(fix_keyword, max_size=MAX_KEYWORD_FIELD_VALUE_SIZE)
+        return partial(fix_string, max_size=MAX_STRING_FIELD_VALUE_SIZE)
+
+    if storage_type == "integer":
+        return fix_integer
+
+    if storage_type == "long":
+        return fix_long
+
+    if storage_type == "date":
+        return fix_datetime
+
+    return copy_value
+
+
+def build_document_plan(fields, all_keys):
+    """Given fields and valid keys, builds a plan for building documents to index.
+
+    The plan is a list of ``(getter, fixer, setters)`` steps--one for each indexable
+    field that has a valid destination key. It's built once and then executed for
+    every crash with ``execute_document_plan``.
 
-    :param dict src: the source document with raw_crash and processed_crash keys
-    :param dict crash_document: the document to fill
     :param list fields: the list of fields in super search fields
     :param set all_keys: the list of valid keys
 
+    :returns: list of ``(getter, fixer, setters)`` tuples
+
     """
+    plan = []
     for field in fields.values():
         # There are some fields that aren't indexable--skip those
         if not is_indexable(field):
             continue
 
-        src_key = get_source_key(field)
-        value = glom.glom(src, src_key, default=None)
+        setters = tuple(
+            get_dest_setter(dest_key)
+            for dest_key in get_destination_keys(field)
+            if dest_key in all_keys
+        )
+        if not setters:
+            continue
+
+        plan.append(
+            (get_source_accessor(get_source_key(field)), get_fixer(field), setters)
+        )
+    return plan
+
+
+def execute_document_plan(plan, src, crash_document):
+    """Given a plan and a source document, builds a document to index.
+
+    The source document is only read from. Values that are lists or dicts are copied
+    so the crash document doesn't share anything with the source document.
+
+    :param list plan: the plan from ``build_document_plan``
+    :param dict src: the source document with raw_crash and processed_crash keys
+    :param dict crash_document: the document to fill
+
+    """
+    for getter, fixer, setters in plan:
+        value = getter(src)
         if value is None:
             continue
 
-        # Fix values so they index correctly
-        storage_type = field.get("type", field["storage_mapping"].get("type"))
-
-        if (
-            storage_type == "multi_field"
-            and glom.glom(field, "storage_mapping.fields.full.type", default="")
-            == "string"
-        ):
-            storage_type = "string"
-
-        if storage_type == "string":
-            analyzer = field.get("analyzer", field["storage_mapping"].get("analyzer"))
-            if analyzer == "keyword":
-                value = fix_keyword(value, max_size=MAX_KEYWORD_FIELD_VALUE_SIZE)
-            else:
-                value = fix_string(value, max_size=MAX_STRING_FIELD_VALUE_SIZE)
-
-        elif storage_type == "integer":
-            value = fix_integer(value)
-            if value is None:
-                continue
+        value = fixer(value)
+        if value is None:
+            continue
 
-        elif storage_type == "long":
-            value = fix_long(value)
-            if value is None:
-                continue
+        for setter in setters:
+            setter(crash_document, value)
 
-        elif storage_type == "date":
-            value = fix_datetime(value)
-            if value is None:
-                continue
 
-        for dest_key in get_destination_keys(field):
-            if dest_key in all_keys:
-                glom.assign(crash_document, dest_key, value, missing=dict)
+def build_document(src, crash_document, fields, all_keys):
+    """Given a source document and fields and valid keys, builds a document to index.
+
+    This builds a plan and executes it. If you're building documents for many
+    crashes, use ``build_document_plan`` once and ``execute_document_plan`` for
+    each crash.
+
+    :param dict src: the source document with raw_crash and processed_crash keys
+    :param dict crash_document: the document to fill
+    :param list fields: the list of fields in super search fields
+    :param set all_keys: the list of valid keys
+
+    """
+    plan = build_document_plan(fields, all_keys)
+    execute_document_plan(plan, src, crash_document)
 
 
 class ESCrashStorage(CrashStorageBase):
@@ -357,6 +465,15 @@ class ESCrashStorage(CrashStorageBase):
 
         return all_valid_keys
 
+    @cache
+    def get_document_plan(self, index_name, es_doctype):
+        """Returns the plan for building documents for the index
+
+        The plan is cached like the keys it's built from.
+
+        """
+        return build_document_plan(FIELDS, self.get_keys(index_name, es_doctype))
+
     def save_processed_crash(self, raw_crash, processed_crash):
         """Save processed crash report to Elasticsearch"""
         crash_id = processed_crash["uuid"]
@@ -365,19 +482,16 @@ class ESCrashStorage(CrashStorageBase):
             string_to_datetime(processed_crash["date_processed"])
         )
         es_doctype = self.config.elasticsearch.elasticsearch_doctype
-        all_valid_keys = self.get_keys(index_name, es_doctype)
+        plan = self.get_document_plan(index_name, es_doctype)
 
-        src = {
-            "raw_crash": copy.deepcopy(raw_crash),
-            "processed_crash": copy.deepcopy(processed_crash),
-        }
+        src = {"raw_crash": raw_crash, "processed_crash": processed_crash}
 
         crash_document = {
             "crash_id": crash_id,
             "raw_crash": {},
             "processed_crash": {},
         }
-        build_document(src, crash_document, fields=FIELDS, all_keys=all_valid_keys)
+        execute_document_plan(plan, src, crash_document)
 
         # Capture crash data size metrics
         self.capture_crash_metrics(crash_document)
@@ -390,21 +504,32 @@ class ESCrashStorage(CrashStorageBase):
         )
 
     def capture_crash_metrics(self, crash_document):
-        """Capture metrics about crash data being saved to Elasticsearch"""
+        """Capture metrics about crash data being saved to Elasticsearch
 
-        def _capture(key, data):
-            try:
-                self.metrics.histogram(
-                    key, value=len(json.dumps(data, cls=JsonDTEncoder))
-                )
-            except Exception:
-                # NOTE(willkg): An error here shouldn't screw up saving data. Log it so
-                # we can fix it later.
-                self.logger.exception(f"something went wrong when capturing {key}")
-
-        _capture("raw_crash_size", crash_document["raw_crash"])
-        _capture("processed_crash_size", crash_document["processed_crash"])
-        _capture("crash_document_size", crash_document)
+        Each value in the crash document is serialized once and the size of the
+        whole document is added up from those rather than serializing it again.
+        Sizes are of compact JSON.
+
+        """
+        try:
+            sizes = {
+                key: len(serialize_json(value)) for key, value in crash_document.items()
+            }
+        except Exception:
+            # NOTE(willkg): An error here shouldn't screw up saving data. Log it so
+            # we can fix it later.
+            self.logger.exception("something went wrong when capturing crash sizes")
+            return
+
+        # {"key":value,"key":value}
+        document_size = (
+            2
+            + sum(len(serialize_json(key)) + 1 + size for key, size in sizes.items())
+            + max(len(sizes) - 1, 0)
+        )
+        self.metrics.histogram("raw_crash_size", value=sizes["raw_crash"])
+        self.metrics.histogram("processed_crash_size", value=sizes["processed_crash"])
+        self.metrics.histogram("crash_document_size", value=document_size)
 
     def _index_crash(self, connection, es_index, es_doctype, crash_document, crash_id):
         try:
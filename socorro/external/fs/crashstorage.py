@@ -4,7 +4,6 @@
 
 from contextlib import contextmanager, closing
 import gzip
-import json
 from io import BytesIO
 import os
 
@@ -17,7 +16,8 @@ from socorro.external.crashstorage_base import (
     FileDumpsMapping,
     MemoryDumpsMapping,
 )
-from socorro.lib.libdatetime import utc_now, JsonDTISOEncoder
+from socorro.lib.libdatetime import utc_now
+from socorro.lib.libjson import deserialize_json, serialize_json
 from socorro.lib.libooid import date_from_ooid, depth_from_ooid
 
 
@@ -172,10 +172,7 @@ class FSPermanentStorage(CrashStorageBase):
     def save_raw_crash(self, raw_crash, dumps, crash_id):
         if dumps is None:
             dumps = MemoryDumpsMapping()
-        files = {
-            crash_id
-            + self.config.json_file_suffix: json.dumps(raw_crash).encode("utf-8")
-        }
+        files = {crash_id + self.config.json_file_suffix: serialize_json(raw_crash)}
         in_memory_dumps = dumps.as_memory_dumps_mapping()
         files.update(
             {
@@ -190,8 +187,7 @@ class FSPermanentStorage(CrashStorageBase):
         processed_crash = processed_crash.copy()
         f = BytesIO()
         with closing(gzip.GzipFile(mode="wb", fileobj=f)) as fz:
-            data = json.dumps(processed_crash, cls=JsonDTISOEncoder)
-            fz.write(data.encode("utf-8"))
+            fz.write(serialize_json(processed_crash))
         self._save_files(
             crash_id, {crash_id + self.config.jsonz_file_suffix: f.getvalue()}
         )
@@ -201,9 +197,9 @@ class FSPermanentStorage(CrashStorageBase):
         if not os.path.exists(parent_dir):
             raise CrashIDNotFound
         with open(
-            os.sep.join([parent_dir, crash_id + self.config.json_file_suffix])
+            os.sep.join([parent_dir, crash_id + self.config.json_file_suffix]), "rb"
         ) as f:
-            return json.load(f, object_hook=DotDict)
+            return deserialize_json(f.read(), object_hook=DotDict)
 
     def get_raw_dump(self, crash_id, name=None):
         parent_dir = self._get_radixed_parent_directory(crash_id)
@@ -243,7 +239,7 @@ class FSPermanentStorage(CrashStorageBase):
         if not os.path.exists(pathname):
             raise CrashIDNotFound
         with closing(gzip.GzipFile(pathname, "rb")) as f:
-            return json.load(f, object_hook=DotDict)
+            return deserialize_json(f.read(), object_hook=DotDict)
 
     def _get_radixed_parent_directory(self, crash_id):
         return os.sep.join(
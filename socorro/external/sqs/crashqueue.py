@@ -198,6 +198,16 @@ class SQSCrashQueue(CrashQueueBase):
         self.client.delete_message(QueueUrl=queue_url, ReceiptHandle=handle)
         logger.debug("ack %s from %s", handle, queue_url)
 
+    def get_backlog(self):
+        """Return the approximate number of crash ids waiting in all the queues."""
+        backlog = 0
+        for queue_url in self.queue_to_queue_url.values():
+            resp = self.client.get_queue_attributes(
+                QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+            )
+            backlog += int(resp["Attributes"]["ApproximateNumberOfMessages"])
+        return backlog
+
     def __iter__(self):
         """Return iterator over crash ids from AWS SQS.
 
@@ -0,0 +1,213 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""This module defines a producer/consumer system that runs tasks as asyncio
+coroutines.
+
+A single event loop pulls jobs from the iterator and runs up to
+``max_concurrent_tasks`` of them at the same time. Tasks spend most of their time
+waiting on network I/O, so they're written as coroutines that hand blocking I/O to
+the event loop's default executor (``number_of_io_threads`` threads) and hand
+CPU-bound work to a small bounded executor (``number_of_threads`` threads) via
+``run_in_cpu_executor``."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from functools import partial
+import inspect
+import signal
+
+from configman import Namespace
+
+from socorro.lib.task_manager import default_iterator, default_task_func, TaskManager
+
+
+# Sentinel for the job source iterator being exhausted
+_EXHAUSTED = object()
+
+
+class AsyncTaskManager(TaskManager):
+    """Given an iterator over a sequence of job parameters and a function,
+    this class will run the function for many jobs concurrently in an event loop.
+
+    If the function returns an awaitable, it's awaited. Otherwise it's assumed
+    the function did all its work when it was called.
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "max_concurrent_tasks",
+        default=100,
+        doc="the maximum number of tasks to run concurrently",
+    )
+    required_config.add_option(
+        "number_of_io_threads",
+        default=100,
+        doc="the number of threads for blocking I/O like crash storage calls",
+    )
+    # Keep this low--it bounds how many tasks can be doing CPU-bound work (running
+    # rules, running the stackwalker, etc) at the same time.
+    required_config.add_option(
+        "number_of_threads",
+        default=4,
+        doc="the number of threads for CPU-bound work",
+    )
+
+    def __init__(
+        self, config, job_source_iterator=default_iterator, task_func=default_task_func
+    ):
+        """
+        parameters:
+            job_source_iterator - an iterator to serve as the source of data.
+                                  See TaskManager.
+            task_func - a function or coroutine function that will accept the
+                        args and kwargs yielded by the job_source_iterator"""
+        super().__init__(config, job_source_iterator, task_func)
+        self.max_concurrent_tasks = config.max_concurrent_tasks
+        self.cpu_executor = None
+
+    async def run_in_cpu_executor(self, func, *args, **kwargs):
+        """Run a CPU-bound function in the bounded executor and return the result.
+
+        The function runs in a copy of the caller's context so context variables
+        (Sentry hubs, etc) carry over.
+
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.cpu_executor, partial(ctx.run, func, *args, **kwargs)
+        )
+
+    async def _run_task(self, job_params):
+        try:
+            args, kwargs = job_params
+        except ValueError:
+            args = job_params
+            kwargs = {}
+        try:
+            ret = self.task_func(*args, **kwargs)
+            if inspect.isawaitable(ret):
+                await ret
+        except Exception:
+            self.logger.error("Error in processing a job", exc_info=True)
+
+    async def _queuing_loop(self, waiting_func=None):
+        """Pull jobs from the iterator and start tasks for them.
+
+        This loops as long as there are items in the iterator and the quit flag
+        isn't set. When it ends, it waits for the running tasks to complete.
+
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrent_tasks)
+        running_tasks = set()
+
+        def task_done(task):
+            running_tasks.discard(task)
+            semaphore.release()
+
+        waiting_task = None
+        if waiting_func:
+            waiting_task = asyncio.ensure_future(self._waiting_loop(waiting_func))
+
+        iterator = iter(self._get_iterator())
+        try:
+            while not self.quit:
+                # The iterator may block on network I/O (SQS, etc), so advance it
+                # in the default executor
+                job_params = await loop.run_in_executor(
+                    None, next, iterator, _EXHAUSTED
+                )
+                if job_params is _EXHAUSTED:
+                    break
+
+                if job_params is None:
+                    if self.config.quit_on_empty_queue:
+                        break
+                    await self._async_responsive_sleep(self.config.idle_delay)
+                    continue
+
+                self.logger.debug("received %r", job_params)
+                await semaphore.acquire()
+                task = asyncio.ensure_future(self._run_task(job_params))
+                running_tasks.add(task)
+                task.add_done_callback(task_done)
+        except Exception:
+            self.logger.error("queuing jobs has failed", exc_info=True)
+        finally:
+            self.logger.debug("waiting for %d running tasks", len(running_tasks))
+            if running_tasks:
+                await asyncio.wait(list(running_tasks))
+            if waiting_task is not None:
+                waiting_task.cancel()
+            self.quit = True
+
+    async def _async_responsive_sleep(self, seconds):
+        """Sleep for the specified seconds, but wake up early on quit."""
+        for x in range(int(seconds)):
+            if self.quit:
+                break
+            await asyncio.sleep(1.0)
+
+    async def _waiting_loop(self, waiting_func):
+        """Call waiting_func once a second."""
+        while True:
+            await asyncio.sleep(1.0)
+            waiting_func()
+
+    def _handle_quit_request(self):
+        if self.quit:
+            self.logger.warning(
+                "We heard you the first time.  There is no need for further "
+                "keyboard or signal interrupts.  We are waiting for the running "
+                "tasks to complete.  If this app does not halt soon, you may have "
+                "to send SIGKILL (kill -9)"
+            )
+        self.logger.debug("quit request detected")
+        self.quit = True
+
+    def blocking_start(self, waiting_func=None):
+        """Run the event loop until the iterator is exhausted or a quit request.
+
+        A SIGINT (^C) stops pulling new jobs from the iterator, but lets the running
+        tasks finish.
+
+        parameters:
+            waiting_func - this function will be called every one second while
+                           tasks run. This allows for logging timers, status
+                           indicators, etc."""
+        self.logger.debug("async start")
+        loop = asyncio.new_event_loop()
+        loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.config.number_of_io_threads,
+                thread_name_prefix="IOThread",
+            )
+        )
+        self.cpu_executor = ThreadPoolExecutor(
+            max_workers=self.config.number_of_threads,
+            thread_name_prefix="CPUThread",
+        )
+        try:
+            loop.add_signal_handler(signal.SIGINT, self._handle_quit_request)
+        except (NotImplementedError, RuntimeError, ValueError):
+            # Signal handlers can only be added in the main thread
+            pass
+
+        try:
+            loop.run_until_complete(self._queuing_loop(waiting_func))
+        finally:
+            try:
+                loop.remove_signal_handler(signal.SIGINT)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            self.cpu_executor.shutdown(wait=True)
+            loop.close()
+            self.quit = True
+            self.logger.debug("AsyncTaskManager dies quietly")
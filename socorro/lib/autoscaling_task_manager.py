@@ -0,0 +1,249 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""This module defines a threaded producer/consumer system that grows and shrinks
+its flock of worker threads with the load.
+
+A scaling thread periodically looks at how deep the internal queue is, how many
+jobs are waiting in the job source (for example, the SQS backlog), and how long
+tasks are taking, and then adds or retires a worker thread within the configured
+bounds. That lets the processor absorb crash spikes without redeploying with new
+configuration."""
+
+import collections
+import queue
+import threading
+import time
+
+from configman import Namespace
+import markus
+
+from socorro.lib.task_manager import default_iterator, default_task_func
+from socorro.lib.threaded_task_manager import TaskThread, ThreadedTaskManager
+
+
+class AutoscalingThreadedTaskManager(ThreadedTaskManager):
+    """Given an iterator over a sequence of job parameters and a function,
+    this class will execute the function in a set of threads that scales between
+    ``min_threads`` and ``max_threads``.
+
+    Every ``scale_interval`` seconds, it adds a worker thread if there's more work
+    waiting than the workers can pick up and tasks aren't slower than
+    ``target_task_latency``. It retires a worker thread if there's no work waiting
+    or tasks are slower than ``target_task_latency``--that usually means the
+    workers are competing for CPU. Without a ``backlog_func``, an empty internal
+    queue doesn't mean there's no work waiting in the job source, so there have
+    to be ``idle_samples`` empty samples in a row before a worker is retired.
+
+    The maximum size of the internal queue is ``maximum_queue_size`` per worker
+    thread.
+
+    Emits:
+
+    * ``{metrics_prefix}.worker_count``: gauge of the number of worker threads
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "min_threads", default=2, doc="the minimum number of worker threads"
+    )
+    required_config.add_option(
+        "max_threads", default=16, doc="the maximum number of worker threads"
+    )
+    required_config.add_option(
+        "scale_interval",
+        default=30,
+        doc="the number of seconds between scaling decisions",
+    )
+    required_config.add_option(
+        "target_task_latency",
+        default=0.0,
+        doc=(
+            "the average number of seconds a task should take; if tasks take "
+            "longer, workers are retired; 0 to ignore task latency"
+        ),
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "idle_samples",
+        default=3,
+        doc=(
+            "the number of scaling decisions in a row that have to find the "
+            "internal queue empty before retiring a worker when the job source "
+            "backlog isn't known"
+        ),
+    )
+    required_config.add_option(
+        "metrics_prefix",
+        default="processor",
+        doc="a string to be used as the prefix for metrics keys",
+    )
+
+    def __init__(
+        self,
+        config,
+        job_source_iterator=default_iterator,
+        task_func=default_task_func,
+        backlog_func=None,
+    ):
+        """
+        parameters:
+            job_source_iterator - an iterator to serve as the source of data.
+                                  See ThreadedTaskManager.
+            task_func - a function that will accept the args and kwargs yielded
+                        by the job_source_iterator
+            backlog_func - None or a function that takes no arguments and returns
+                           the number of jobs waiting in the job source or None
+                           if it doesn't know"""
+        super().__init__(config, job_source_iterator, task_func)
+        self.metrics = markus.get_metrics(config.metrics_prefix)
+        self.backlog_func = backlog_func
+        self.min_threads = config.min_threads
+        self.max_threads = max(config.max_threads, self.min_threads)
+        self.number_of_threads = min(
+            max(config.number_of_threads, self.min_threads), self.max_threads
+        )
+        self.queue_size_per_thread = max(
+            config.maximum_queue_size // config.number_of_threads, 1
+        )
+        self._set_queue_size()
+
+        self.worker_task_func = task_func
+        self.task_func = self._timed_task
+        # Durations of recent tasks in seconds
+        self.task_durations = collections.deque(maxlen=100)
+        # Number of scaling decisions in a row that found no work waiting
+        self.idle_count = 0
+
+        self._scaling_lock = threading.Lock()
+        self._stop_scaling = threading.Event()
+        self.scaling_thread = None
+
+    def _timed_task(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            self.worker_task_func(*args, **kwargs)
+        finally:
+            self.task_durations.append(time.perf_counter() - start_time)
+
+    def _set_queue_size(self):
+        """Size the internal queue for the current number of worker threads."""
+        with self.task_queue.mutex:
+            self.task_queue.maxsize = (
+                self.queue_size_per_thread * self.number_of_threads
+            )
+            # Wake up the queuing thread if it's waiting for room that's now there
+            self.task_queue.not_full.notify_all()
+
+    def start(self):
+        """Start the worker threads, the queuing thread, and the scaling thread."""
+        super().start()
+        self.metrics.gauge("worker_count", value=self.number_of_threads)
+        self.scaling_thread = threading.Thread(
+            name="ScalingThread", target=self._scaling_thread_func
+        )
+        self.scaling_thread.start()
+
+    def _scaling_thread_func(self):
+        while not self._stop_scaling.wait(self.config.scale_interval):
+            try:
+                self.scale()
+            except Exception:
+                self.logger.error("scaling workers has failed", exc_info=True)
+
+    def get_backlog(self):
+        """Return the number of jobs waiting in the job source or None."""
+        if self.backlog_func is None:
+            return None
+        try:
+            return self.backlog_func()
+        except Exception:
+            self.logger.warning("could not get backlog", exc_info=True)
+            return None
+
+    def get_task_latency(self):
+        """Return the average duration of recent tasks or None."""
+        durations = list(self.task_durations)
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
+
+    def scale(self):
+        """Add or retire a worker thread depending on the load."""
+        queue_depth = self.task_queue.qsize()
+        backlog = self.get_backlog()
+        latency = self.get_task_latency()
+        target_latency = self.config.target_task_latency
+
+        with self._scaling_lock:
+            if self.quit or self._stop_scaling.is_set():
+                return
+
+            number_of_threads = self.number_of_threads
+            too_slow = bool(target_latency and latency and latency > target_latency)
+            # Work is waiting if the workers aren't keeping the internal queue
+            # drained or the job source has more than a queue's worth of jobs
+            work_waiting = queue_depth >= number_of_threads or (
+                backlog is not None and backlog > self.task_queue.maxsize
+            )
+            if queue_depth == 0 and (backlog is None or backlog == 0):
+                self.idle_count += 1
+            else:
+                self.idle_count = 0
+            idle_samples = self.config.idle_samples if backlog is None else 1
+            idle = self.idle_count >= idle_samples
+
+            if too_slow or idle:
+                if number_of_threads > self.min_threads:
+                    self._retire_worker()
+            elif work_waiting:
+                if number_of_threads < self.max_threads:
+                    self._add_worker()
+
+            if self.number_of_threads != number_of_threads:
+                self.logger.info(
+                    "scaled workers %d -> %d (queue depth: %d, backlog: %s, "
+                    "task latency: %s)",
+                    number_of_threads,
+                    self.number_of_threads,
+                    queue_depth,
+                    backlog,
+                    latency,
+                )
+            self.metrics.gauge("worker_count", value=self.number_of_threads)
+
+    def _add_worker(self):
+        # Drop the threads that have been retired
+        self.thread_list = [t for t in self.thread_list if t.is_alive()]
+        new_thread = TaskThread(self.config, self.task_queue)
+        self.thread_list.append(new_thread)
+        new_thread.start()
+        self.number_of_threads += 1
+        self._set_queue_size()
+
+    def _retire_worker(self):
+        # A worker thread quits when it gets the death token; it's queued behind
+        # the jobs already in the queue, so those still get done. If the queue
+        # is full, try again at the next scaling decision rather than wait with
+        # the scaling lock held.
+        try:
+            self.task_queue.put_nowait((None, None))
+        except queue.Full:
+            self.logger.debug("queue is full; not retiring a worker yet")
+            return
+        self.number_of_threads -= 1
+        self._set_queue_size()
+
+    def _kill_worker_threads(self):
+        """Stop the scaling thread and then the worker threads.
+
+        This is a blocking call.
+
+        """
+        self._stop_scaling.set()
+        if self.scaling_thread is not None:
+            self.scaling_thread.join()
+        with self._scaling_lock:
+            super()._kill_worker_threads()
@@ -6,8 +6,103 @@
 Utilities for working with JSON schemas and JSON.
 """
 
+import datetime
+import json
 import re
 
+try:
+    # orjson serializes and deserializes JSON a lot faster than the json module
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(obj):
+    """Serializes dates and datetimes as ISO 8601 strings
+
+    This is the ``default`` for ``serialize_json``.
+
+    :raises TypeError: if it's not a date or datetime
+
+    """
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    raise TypeError(f"Don't know about {obj!r}")
+
+
+def serialize_json(data, default=json_default):
+    """Serializes data to compact JSON as UTF-8 encoded bytes
+
+    This uses orjson if it's installed and the json module if it's not or if
+    orjson can't serialize the data (for example, integers that don't fit in 64
+    bits). Dates and datetimes always go through ``default``, so they serialize
+    the same way either way.
+
+    :arg data: the data to serialize
+    :arg default: function that takes an object JSON can't represent and returns
+        one it can or raises a TypeError
+
+    :returns: bytes
+
+    :raises TypeError: if the data can't be serialized
+
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                data,
+                default=default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            pass
+    serialized = json.dumps(
+        data, default=default, separators=(",", ":"), ensure_ascii=False
+    )
+    try:
+        return serialized.encode("utf-8")
+    except UnicodeEncodeError:
+        # Lone surrogates can't be encoded as UTF-8, so escape everything
+        return json.dumps(data, default=default, separators=(",", ":")).encode("utf-8")
+
+
+def _apply_object_hook(obj, object_hook):
+    """Applies an object hook to every dict from the innermost out"""
+    if isinstance(obj, dict):
+        return object_hook(
+            {key: _apply_object_hook(value, object_hook) for key, value in obj.items()}
+        )
+    if isinstance(obj, list):
+        return [_apply_object_hook(item, object_hook) for item in obj]
+    return obj
+
+
+def deserialize_json(data, object_hook=None):
+    """Deserializes JSON
+
+    This uses orjson if it's installed and the json module if it's not or if
+    orjson can't deserialize the data (for example, ``NaN``).
+
+    :arg data: JSON as bytes or str
+    :arg object_hook: function that's called with every dict, innermost first,
+        and returns what to use instead like the json module's ``object_hook``
+
+    :returns: the deserialized data
+
+    :raises ValueError: if the data isn't valid JSON
+
+    """
+    if orjson is not None:
+        try:
+            obj = orjson.loads(data)
+        except ValueError:
+            pass
+        else:
+            if object_hook is not None and object_hook is not dict:
+                obj = _apply_object_hook(obj, object_hook)
+            return obj
+    return json.loads(data, object_hook=object_hook)
+
 
 class InvalidDocumentError(Exception):
     """Raised when the document is invalid"""
@@ -0,0 +1,228 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""This module defines a producer/consumer system that runs tasks in a pool of
+worker processes.
+
+The queuing thread and a flock of dispatcher threads live in the main process just
+like with the ThreadedTaskManager. Each dispatcher thread hands the args of a job to
+a worker process, waits for it to finish, and then calls the job's
+``finished_func`` in the main process. That way, the job source iterator and
+whatever ``finished_func`` closes over (SQS clients, etc) never leave the main
+process and the CPU-bound part of the task isn't serialized behind the GIL.
+
+Worker processes are forked, so the task function and the worker init function
+don't need to be picklable."""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import signal
+import threading
+
+from configman import Namespace
+
+from socorro.lib.task_manager import default_iterator, default_task_func
+from socorro.lib.threaded_task_manager import ThreadedTaskManager
+
+
+# The task function for this worker process; set by _worker_initializer
+_worker_task_func = None
+
+
+def _worker_initializer(task_func, worker_init_func):
+    """Set up a worker process.
+
+    This runs in the worker process after it's forked from the main process. It
+    doesn't have any of the main process' threads, so ``worker_init_func`` should
+    rebuild anything that needs them.
+
+    :arg task_func: the function to run for each job
+    :arg worker_init_func: None or a function to call to build per-process
+        resources
+
+    """
+    global _worker_task_func
+
+    # The main process handles KeyboardInterrupt and tells the workers when to
+    # stop, so workers ignore SIGINT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if worker_init_func is not None:
+        worker_init_func()
+    _worker_task_func = task_func
+
+
+def _worker_started():
+    """Do nothing in the worker process; see ProcessPoolTaskManager.start_workers"""
+
+
+def _run_task(args, kwargs):
+    """Run a job in the worker process."""
+    _worker_task_func(*args, **kwargs)
+
+
+class ProcessPoolTaskManager(ThreadedTaskManager):
+    """Given an iterator over a sequence of job parameters and a function,
+    this class will execute the function in a pool of worker processes.
+
+    Worker processes are forked from the main process once in
+    ``start_workers``. Call it before the main process starts any threads--forked
+    processes only get the forking thread and locks other threads held stay held
+    in them. ``start`` calls it if it hasn't been called yet. Anything that can't
+    be shared across processes (network clients, connection pools, threads, etc)
+    should be rebuilt in ``worker_init_func``.
+
+    Jobs that have a ``finished_func`` keyword argument have it called in the main
+    process after the worker is done with the job regardless of whether the job
+    succeeded or failed.
+
+    If a worker process dies abruptly (OOM killer, segfault, etc), the pool is
+    broken and the jobs running in it fail. Forking a new pool then isn't safe
+    because the main process has threads, so the task manager stops instead:
+    jobs that haven't been handed to the pool are left alone without calling
+    their ``finished_func`` and ``blocking_start`` raises ``BrokenProcessPool``
+    once the threads have stopped. Whatever runs the process should restart it.
+
+    There's one dispatcher thread per worker process, so ``number_of_threads`` is
+    ignored.
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "number_of_processes",
+        default=os.cpu_count() or 1,
+        doc="the number of worker processes",
+    )
+
+    def __init__(
+        self,
+        config,
+        job_source_iterator=default_iterator,
+        task_func=default_task_func,
+        worker_init_func=None,
+    ):
+        """
+        parameters:
+            job_source_iterator - an iterator to serve as the source of data.
+                                  See ThreadedTaskManager.
+            task_func - a function that will accept the args and kwargs yielded
+                        by the job_source_iterator; this is run in a worker
+                        process
+            worker_init_func - None or a function that takes no arguments and
+                               is called once in each worker process when it
+                               starts"""
+        super().__init__(config, job_source_iterator, task_func)
+        self.worker_task_func = task_func
+        self.worker_init_func = worker_init_func
+        # The dispatcher threads are the TaskThreads; each one shepherds one job
+        # at a time through a worker process, so there's one per process
+        self.number_of_processes = config.number_of_processes
+        if config.number_of_threads != self.number_of_processes:
+            self.logger.warning(
+                "number_of_threads (%s) is ignored; there's one dispatcher thread "
+                + "per worker process (number_of_processes=%s)",
+                config.number_of_threads,
+                self.number_of_processes,
+            )
+        self.number_of_threads = self.number_of_processes
+        self.task_func = self._dispatch
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pool_broken = False
+
+    def start_workers(self):
+        """Fork the worker processes if they haven't been forked yet.
+
+        This blocks until a worker process has run ``worker_init_func``.
+
+        :raises BrokenProcessPool: if ``worker_init_func`` failed
+
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                return
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.number_of_processes,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_worker_initializer,
+                initargs=(self.worker_task_func, self.worker_init_func),
+            )
+            # ProcessPoolExecutor forks all its worker processes the first time a
+            # job is submitted and before it starts its own threads. Run a job
+            # that does nothing so that happens now.
+            self._executor.submit(_worker_started).result()
+
+    def signal_workers(self, signal_number):
+        """Send a signal to the worker processes."""
+        with self._executor_lock:
+            if self._executor is None:
+                return
+            # ProcessPoolExecutor doesn't have a public way to get its processes
+            pids = list(self._executor._processes or {})
+        for pid in pids:
+            try:
+                os.kill(pid, signal_number)
+            except ProcessLookupError:
+                pass
+
+    def _dispatch(self, *args, finished_func=None, **kwargs):
+        """Run the job in a worker process and call finished_func when done.
+
+        This runs in a dispatcher thread in the main process.
+
+        """
+        if self._pool_broken:
+            # Leave the job for whatever processes it after this process is
+            # restarted
+            raise BrokenProcessPool("worker processes are gone; job not run")
+
+        try:
+            self._executor.submit(_run_task, args, kwargs).result()
+        except BrokenProcessPool:
+            if not self._pool_broken:
+                self.logger.critical("a worker process died abruptly; stopping")
+                self._pool_broken = True
+                self.quit = True
+            raise
+        finally:
+            if finished_func is not None:
+                finished_func()
+
+    def _get_iterator(self):
+        """Stop queuing jobs when the task manager is quitting."""
+        for job_params in super()._get_iterator():
+            if self.quit:
+                break
+            yield job_params
+
+    def start(self):
+        """Start the worker processes and then the queuing and dispatcher threads."""
+        self.start_workers()
+        super().start()
+
+    def blocking_start(self, waiting_func=None):
+        """Run until the job source is exhausted or the task manager is stopped.
+
+        :raises BrokenProcessPool: if the task manager stopped because a worker
+            process died
+
+        """
+        super().blocking_start(waiting_func=waiting_func)
+        if self._pool_broken:
+            raise BrokenProcessPool("a worker process died abruptly")
+
+    def _kill_worker_threads(self):
+        """Stop the dispatcher threads and then shut down the worker processes.
+
+        This is a blocking call.
+
+        """
+        super()._kill_worker_threads()
+        with self._executor_lock:
+            if self._executor is not None:
+                self.logger.debug("waiting for worker processes to stop")
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -0,0 +1,223 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""This module defines a threaded producer/consumer system where each job goes
+through a series of stages.
+
+Each stage has its own bounded queue and its own flock of worker threads. A stage
+function takes the output of the previous stage and returns the input for the next
+stage. Because the queues are bounded, a slow stage backs up the stages before it
+rather than letting work pile up in memory, and a slow stage doesn't idle the
+workers of the other stages while it has work queued."""
+
+from functools import partial
+import queue
+import threading
+import time
+
+from configman import Namespace
+import markus
+
+from socorro.lib.task_manager import default_iterator, default_task_func
+from socorro.lib.threaded_task_manager import TaskThread, ThreadedTaskManager
+
+
+def str_to_stage_threads(value):
+    """Convert "stage:number, stage:number" string to a dict of stage -> number"""
+    stage_threads = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, number = item.split(":")
+        stage_threads[name.strip()] = int(number)
+    return stage_threads
+
+
+class StagedJob:
+    """Bookkeeping for a job going through the stages"""
+
+    def __init__(self, finished_func, enqueued_at):
+        self.finished_func = finished_func
+        self.enqueued_at = enqueued_at
+
+
+class StageQueue(queue.Queue):
+    """Queue of (function, arguments) items for a stage
+
+    When an item is put on the queue, the putting thread passes the time to the
+    function as ``enqueued_at``, so time spent blocked on a full queue doesn't
+    count as time waiting for a stage worker.
+
+    """
+
+    def _put(self, item):
+        function, arguments = item
+        if function is not None:
+            item = (partial(function, enqueued_at=time.time()), arguments)
+        super()._put(item)
+
+
+class StagedTaskManager(ThreadedTaskManager):
+    """Given an iterator over a sequence of job parameters and a list of stages,
+    this class runs each job through the stages using a set of threads per stage.
+
+    The first stage is called with the args and kwargs yielded by the iterator minus
+    ``finished_func``. If a stage returns None, the job is done and skips the rest
+    of the stages. Once the job is done or a stage raises an exception, the job's
+    ``finished_func`` is called.
+
+    Emits:
+
+    * ``{metrics_prefix}.stage.queue_depth``: gauge of items waiting for a stage
+    * ``{metrics_prefix}.stage.wait_timing``: time an item waited for a stage worker
+    * ``{metrics_prefix}.stage.timing``: time a stage took to run
+
+    All are tagged with ``stage:{name}``.
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "stage_threads",
+        default="",
+        doc=(
+            "comma-delimited list of stage:number_of_threads; stages that aren't "
+            "listed get number_of_threads threads"
+        ),
+        from_string_converter=str_to_stage_threads,
+    )
+    required_config.add_option(
+        "metrics_prefix",
+        default="processor",
+        doc="a string to be used as the prefix for stage metrics keys",
+    )
+
+    def __init__(
+        self,
+        config,
+        job_source_iterator=default_iterator,
+        task_func=default_task_func,
+        stages=None,
+    ):
+        """
+        parameters:
+            job_source_iterator - an iterator to serve as the source of data.
+                                  See ThreadedTaskManager.
+            task_func - a function that will accept the args and kwargs yielded
+                        by the job_source_iterator; this is only used if stages
+                        is None
+            stages - list of (name, function) tuples"""
+        super().__init__(config, job_source_iterator, task_func)
+        self.stages = stages or [("task", task_func)]
+        self.metrics = markus.get_metrics(config.metrics_prefix)
+
+        stage_threads = config.stage_threads or {}
+        if isinstance(stage_threads, str):
+            stage_threads = str_to_stage_threads(stage_threads)
+        self.stage_number_of_threads = [
+            stage_threads.get(name, config.number_of_threads) for name, _ in self.stages
+        ]
+        self.stage_queues = [StageQueue(config.maximum_queue_size) for _ in self.stages]
+        self.stage_thread_lists = [[] for _ in self.stages]
+
+        # The queuing thread puts (self.task_func, job_params) in self.task_queue, so
+        # point those at the first stage
+        self.task_queue = self.stage_queues[0]
+        self.task_func = self._start_job
+
+    def start(self):
+        """Start the worker threads for each stage and then the queuing thread."""
+        self.logger.debug("start")
+        for index, number_of_threads in enumerate(self.stage_number_of_threads):
+            for x in range(number_of_threads):
+                new_thread = TaskThread(self.config, self.stage_queues[index])
+                self.stage_thread_lists[index].append(new_thread)
+                self.thread_list.append(new_thread)
+                new_thread.start()
+        self.queuing_thread = threading.Thread(
+            name="QueuingThread", target=self._queuing_thread_func
+        )
+        self.queuing_thread.start()
+
+    def wait_for_empty_queue(self, wait_log_interval=0, wait_reason=""):
+        """Sit around and wait for all the stage queues to become empty"""
+        seconds = 0
+        while True:
+            if all(stage_queue.empty() for stage_queue in self.stage_queues):
+                break
+            if wait_log_interval and not seconds % wait_log_interval:
+                self.logger.info("%s: %dsec so far", wait_reason, seconds)
+            seconds += 1
+            time.sleep(1.0)
+
+    def _kill_worker_threads(self):
+        """Stop the worker threads stage by stage.
+
+        The death tokens for a stage are queued after the workers of the previous
+        stage have stopped, so every job in flight makes it through all the stages
+        before the workers stop.
+
+        This is a blocking call.
+
+        """
+        for index, thread_list in enumerate(self.stage_thread_lists):
+            for x in range(len(thread_list)):
+                self.stage_queues[index].put((None, None))
+            self.logger.debug(
+                "waiting for %s stage threads to stop", self.stages[index][0]
+            )
+            for t in thread_list:
+                t.join()
+
+    def _start_job(self, *args, finished_func=None, enqueued_at=None, **kwargs):
+        """Run the first stage for a job"""
+        self.metrics.gauge(
+            "stage.queue_depth",
+            value=self.stage_queues[0].qsize(),
+            tags=[f"stage:{self.stages[0][0]}"],
+        )
+        job = StagedJob(finished_func, enqueued_at or time.time())
+        self._run_stage(0, job, *args, **kwargs)
+
+    def _continue_job(self, index, job, *args, enqueued_at, **kwargs):
+        """Run a later stage for a job"""
+        job.enqueued_at = enqueued_at
+        self._run_stage(index, job, *args, **kwargs)
+
+    def _run_stage(self, index, job, *args, **kwargs):
+        """Run a stage for a job and queue the result for the next stage"""
+        name, stage_func = self.stages[index]
+        tags = [f"stage:{name}"]
+        self.metrics.timing(
+            "stage.wait_timing", value=(time.time() - job.enqueued_at) * 1000, tags=tags
+        )
+        try:
+            with self.metrics.timer("stage.timing", tags=tags):
+                result = stage_func(*args, **kwargs)
+        except Exception:
+            self._finish_job(job)
+            raise
+
+        next_index = index + 1
+        if result is None or next_index >= len(self.stages):
+            self._finish_job(job)
+            return
+
+        next_queue = self.stage_queues[next_index]
+        # This blocks if the next stage is backed up
+        next_queue.put((partial(self._continue_job, next_index, job), ((result,), {})))
+        self.metrics.gauge(
+            "stage.queue_depth",
+            value=next_queue.qsize(),
+            tags=[f"stage:{self.stages[next_index][0]}"],
+        )
+
+    def _finish_job(self, job):
+        if job.finished_func is None:
+            return
+        try:
+            job.finished_func()
+        except Exception:
+            self.logger.exception("Error calling finished_func")
@@ -0,0 +1,346 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Benchmark for the processor pipeline.
+
+This runs a corpus of crashes through a ruleset and reports crashes per second,
+per-rule timings, and peak RSS. minidump-stackwalk isn't run--the stackwalker
+output is the ``json_dump`` from the processed crash in the corpus--so the
+numbers are for the rules and not for stackwalking or the network.
+
+The default corpus in ``benchmark_data`` is a few synthetic crashes made for
+this benchmark.
+
+"""
+
+import argparse
+import copy
+import glob
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from configman import ConfigurationManager
+
+from socorro.processor.processor_pipeline import ProcessorPipeline
+from socorro.processor.rule_profiler import PERCENTILES, RuleProfiler
+from socorro.processor.rules.breakpad import MinidumpStackwalkRule
+from socorro.processor.rules.mozilla import BetaVersionRule
+from socorro.scripts import WrappedTextHelpFormatter
+
+
+DESCRIPTION = """
+Benchmarks the processor pipeline by running a corpus of crashes through a
+ruleset.
+
+minidump-stackwalk isn't run. Instead, the stackwalker output comes from the
+json_dump in the processed crash in the corpus. Version lookups for beta crashes
+aren't done, either.
+"""
+
+EPILOG = """
+The corpus directory is laid out like the output of "socorro-cmd fetch_crash_data
+--processed". If you don't specify one, it uses a small corpus of synthetic
+crashes that comes with Socorro.
+
+To catch regressions, save a baseline with --save-baseline and compare against it
+later with --baseline. The benchmark exits with 1 if crashes per second dropped
+by more than --max-regression percent.
+"""
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "benchmark_data")
+
+
+class StubbedMinidumpStackwalkRule(MinidumpStackwalkRule):
+    """MinidumpStackwalkRule that returns canned minidump-stackwalk output
+
+    The dump files are the canned JSON output, so nothing gets run.
+
+    """
+
+    def get_version(self):
+        return "stubbed"
+
+    def build_directories(self):
+        pass
+
+    def execute_stackwalker(
+        self, dump_file_path, raw_crash_path, stdout_handler, kill_timeout=None
+    ):
+        with open(dump_file_path, "rb") as fp:
+            output = stdout_handler(fp)
+        return {"output": output, "stderr": b"", "returncode": 0}
+
+
+class StubbedBetaVersionRule(BetaVersionRule):
+    """BetaVersionRule that doesn't look up versions"""
+
+    def _get_real_version(self, product, channel, build_id):
+        return None
+
+
+class BenchmarkPipeline(ProcessorPipeline):
+    """ProcessorPipeline with stubbed rules for benchmarking"""
+
+    stackwalk_rule_class = StubbedMinidumpStackwalkRule
+
+    def get_rulesets(self, config):
+        rulesets = super().get_rulesets(config)
+        for ruleset in rulesets.values():
+            for i, rule in enumerate(ruleset):
+                if isinstance(rule, BetaVersionRule):
+                    ruleset[i] = StubbedBetaVersionRule(
+                        version_string_api=rule.version_string_api
+                    )
+        return rulesets
+
+
+def load_corpus(corpus_dir, dump_dir):
+    """Loads the crashes in a corpus
+
+    The canned stackwalker output for each minidump is written to a file in
+    ``dump_dir``.
+
+    :arg str corpus_dir: directory laid out like fetch_crash_data output
+    :arg str dump_dir: directory to write canned stackwalker output to
+
+    :returns: list of (raw_crash, dumps) tuples
+
+    """
+    corpus = []
+    raw_crash_paths = glob.glob(
+        os.path.join(corpus_dir, "v2", "raw_crash", "*", "*", "*")
+    )
+    for raw_crash_path in sorted(raw_crash_paths):
+        crash_id = os.path.basename(raw_crash_path)
+        with open(raw_crash_path, "r") as fp:
+            raw_crash = json.load(fp)
+        raw_crash.setdefault("uuid", crash_id)
+
+        dumps = {}
+        processed_crash_path = os.path.join(
+            corpus_dir, "v1", "processed_crash", crash_id
+        )
+        if os.path.exists(processed_crash_path):
+            with open(processed_crash_path, "r") as fp:
+                processed_crash = json.load(fp)
+
+            dump_names = list(raw_crash.get("dump_checksums", {}).keys())
+            for dump_name in dump_names or ["upload_file_minidump"]:
+                if dump_name == "upload_file_minidump":
+                    json_dump = processed_crash.get("json_dump")
+                else:
+                    json_dump = processed_crash.get(dump_name, {}).get("json_dump")
+                if not json_dump:
+                    continue
+
+                dump_path = os.path.join(dump_dir, f"{crash_id}.{dump_name}.json")
+                with open(dump_path, "w") as fp:
+                    json.dump(json_dump, fp)
+                dumps[dump_name] = dump_path
+
+        corpus.append((raw_crash, dumps))
+    return corpus
+
+
+def get_config(tmp_path):
+    """Returns configuration for a BenchmarkPipeline"""
+    cm = ConfigurationManager(
+        definition_source=ProcessorPipeline.get_required_config(),
+        values_source_list=[],
+    )
+    config = cm.get_config()
+    config.minidumpstackwalk.tmp_path = tmp_path
+    config.profiling.enabled = True
+    return config
+
+
+def get_peak_rss_mb():
+    """Returns the peak resident set size of this process in megabytes"""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    if sys.platform == "darwin":
+        return maxrss / 1024 / 1024
+    return maxrss / 1024
+
+
+def run_benchmark(pipeline, corpus, ruleset_name="default", iterations=5, warmup=1):
+    """Processes the corpus with the pipeline and returns the results
+
+    :arg pipeline: a ProcessorPipeline with profiling enabled
+    :arg corpus: list of (raw_crash, dumps) tuples
+    :arg ruleset_name: the ruleset to process crashes with
+    :arg iterations: the number of times to process the corpus
+    :arg warmup: the number of times to process the corpus before measuring
+
+    :returns: dict of results
+
+    """
+    for _ in range(warmup):
+        for raw_crash, dumps in corpus:
+            pipeline.process_crash(ruleset_name, copy.deepcopy(raw_crash), dumps, {})
+
+    # Throw out the rule timings from the warmup
+    pipeline.profiler = RuleProfiler(
+        window_size=max(iterations * len(corpus), 1),
+        trace_memory=pipeline.profiler.trace_memory,
+    )
+
+    total_time = 0.0
+    count = 0
+    for _ in range(iterations):
+        for raw_crash, dumps in corpus:
+            raw_crash = copy.deepcopy(raw_crash)
+            processed_crash = {}
+            start_time = time.perf_counter()
+            pipeline.process_crash(ruleset_name, raw_crash, dumps, processed_crash)
+            total_time += time.perf_counter() - start_time
+            count += 1
+
+    rules = {}
+    for name, stats in pipeline.profiler.rule_stats.items():
+        rule_results = {"count": stats.count, "total_ms": stats.total_wall_time * 1000}
+        for pct, value in zip(PERCENTILES, stats.percentiles(stats.wall_times)):
+            rule_results[f"p{pct}_ms"] = value * 1000
+        rules[name] = rule_results
+
+    return {
+        "crashes": count,
+        "total_sec": total_time,
+        "crashes_per_sec": count / total_time if total_time else 0.0,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "rules": rules,
+    }
+
+
+def percent_change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def format_results(results, baseline=None):
+    """Formats results as text with changes from the baseline if there is one"""
+
+    def change(old, new):
+        if old is None:
+            return ""
+        return f"({percent_change(old, new):+.1f}%)"
+
+    baseline = baseline or {}
+    baseline_rules = baseline.get("rules", {})
+    lines = [
+        f"crashes:         {results['crashes']}",
+        f"crashes/sec:     {results['crashes_per_sec']:.2f} "
+        + change(baseline.get("crashes_per_sec"), results["crashes_per_sec"]),
+        f"peak rss:        {results['peak_rss_mb']:.1f} MB "
+        + change(baseline.get("peak_rss_mb"), results["peak_rss_mb"]),
+        "",
+    ]
+    pcts = [f"p{pct}_ms" for pct in PERCENTILES]
+    lines.append(
+        f"{'rule':<72} {'total ms':>10} "
+        + " ".join(f"{pct:>10}" for pct in pcts)
+        + f" {'p50 change':>12}"
+    )
+    rules = sorted(
+        results["rules"].items(), key=lambda item: item[1]["total_ms"], reverse=True
+    )
+    for name, rule_results in rules:
+        baseline_p50 = baseline_rules.get(name, {}).get("p50_ms")
+        lines.append(
+            f"{name:<72} {rule_results['total_ms']:>10.2f} "
+            + " ".join(f"{rule_results[pct]:>10.3f}" for pct in pcts)
+            + f" {change(baseline_p50, rule_results['p50_ms']):>12}"
+        )
+    return "\n".join(lines)
+
+
+def is_regression(baseline, results, max_regression):
+    """Returns True if crashes per second dropped by more than max_regression percent"""
+    change = percent_change(baseline["crashes_per_sec"], results["crashes_per_sec"])
+    return change < -max_regression
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        formatter_class=WrappedTextHelpFormatter,
+        description=DESCRIPTION.strip(),
+        epilog=EPILOG.strip(),
+    )
+    parser.add_argument(
+        "--ruleset", default="default", help="the ruleset to process crashes with"
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=5,
+        help="the number of times to process the corpus",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=1,
+        help="the number of times to process the corpus before measuring",
+    )
+    parser.add_argument("--baseline", help="JSON file of results to compare against")
+    parser.add_argument(
+        "--save-baseline", help="JSON file to save the results to as a baseline"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=10.0,
+        help="the percent drop in crashes/sec from the baseline that fails",
+    )
+    parser.add_argument(
+        "corpus", nargs="?", default=DEFAULT_CORPUS, help="directory of crash data"
+    )
+
+    if argv is None:
+        args = parser.parse_args()
+    else:
+        args = parser.parse_args(argv)
+
+    # The pipeline logs every crash it processes and that's not helpful here
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        corpus = load_corpus(args.corpus, tmp_path)
+        if not corpus:
+            print(f"No crashes found in {args.corpus}. Exiting.")
+            return 1
+
+        pipeline = BenchmarkPipeline(get_config(tmp_path))
+        results = run_benchmark(
+            pipeline,
+            corpus,
+            ruleset_name=args.ruleset,
+            iterations=args.iterations,
+            warmup=args.warmup,
+        )
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as fp:
+            baseline = json.load(fp)
+
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        print(f"\nSaved results to {args.save_baseline}")
+
+    if baseline and is_regression(baseline, results, args.max_regression):
+        print(
+            f"\ncrashes/sec dropped more than {args.max_regression}% from the baseline"
+        )
+        return 1
+
+    return 0
@@ -5,13 +5,16 @@
 
 """The processor app converts raw crashes into processed crashes."""
 
+import asyncio
+import contextlib
 import os
+import signal
 import sys
+import threading
 import time
 
 from configman import Namespace
 from configman.converters import class_converter
-from configman.dotdict import DotDict
 from fillmore.libsentry import set_up_sentry
 from fillmore.scrubber import Scrubber, SCRUB_RULES_DEFAULT
 import markus
@@ -28,6 +31,7 @@ from socorro.app.fetch_transform_save_app import FetchTransformSaveApp
 from socorro.external.crashstorage_base import CrashIDNotFound, PolyStorageError
 from socorro.lib.libdatetime import isoformat_to_time
 from socorro.lib.libdockerflow import get_release_name
+from socorro.lib.process_pool_task_manager import ProcessPoolTaskManager
 from socorro.lib.util import dotdict_to_dict
 
 
@@ -37,6 +41,8 @@ CONFIG_DEFAULTS = {
     "source": {
         "benchmark_tag": "BotoS3CrashStorage",
         "crashstorage_class": "socorro.external.crashstorage_base.BenchmarkingCrashStorage",
+        # The processor works with plain dicts
+        "json_object_hook": "dict",
         "wrapped_crashstore": "socorro.external.boto.crashstorage.BotoS3CrashStorage",
     },
     "destination": {
@@ -108,6 +114,18 @@ def count_sentry_scrub_error(msg):
     METRICS.incr("sentry_scrub_error", 1)
 
 
+def as_dict(mapping):
+    """Returns the crash data as a dict.
+
+    The processor works with plain dicts. Crash storage sources that load crash
+    data into DotDicts get converted here once when the crash is fetched.
+
+    """
+    if isinstance(mapping, dict):
+        return mapping
+    return dotdict_to_dict(mapping)
+
+
 class ProcessorApp(FetchTransformSaveApp):
     """Configman app that transforms raw crashes into processed crashes."""
 
@@ -181,22 +199,35 @@ class ProcessorApp(FetchTransformSaveApp):
             self.logger.exception("error in crash id iterator")
             raise
 
-    def _transform(self, task):
-        """Runs a transform on a task.
+    def _parse_task(self, task):
+        """Parses a task into a crash id and ruleset name.
 
         The ``task`` passed in is in the form of CRASHID or CRASHID:RULESET.
         In the case of the former, it uses the default pipeline.
 
-        """
+        :returns: (crash_id, ruleset_name) tuple
 
+        """
         if ":" in task:
             crash_id, ruleset_name = task.split(":", 1)
         else:
             crash_id, ruleset_name = task, "default"
+        return crash_id, ruleset_name
+
+    def _transform(self, task):
+        """Runs a transform on a task."""
+        crash_id, ruleset_name = self._parse_task(task)
 
         with METRICS.timer("process_crash", tags=[f"ruleset:{ruleset_name}"]):
             self.process_crash(crash_id, ruleset_name)
 
+    async def _transform_async(self, task):
+        """Runs a transform on a task using the async crashstorage API."""
+        crash_id, ruleset_name = self._parse_task(task)
+
+        with METRICS.timer("process_crash", tags=[f"ruleset:{ruleset_name}"]):
+            await self.process_crash_async(crash_id, ruleset_name)
+
     def process_crash(self, crash_id, ruleset_name):
         """Processed crash data using a specified ruleset into a processed crash.
 
@@ -205,78 +236,308 @@ class ProcessorApp(FetchTransformSaveApp):
         ``destination``.
 
         """
+        with self._crash_scope(crash_id, ruleset_name):
+            fetched = self._fetch_crash(crash_id)
+            if fetched is None:
+                return
+            raw_crash, dumps, processed_crash, new_crash = fetched
+
+            # Process the crash and remove any temporary artifacts from disk
+            try:
+                raw_crash, processed_crash = self._process(
+                    ruleset_name, raw_crash, dumps, processed_crash
+                )
+                self._save(crash_id, raw_crash, processed_crash)
+            finally:
+                self._remove_temporary_dumps(dumps)
+
+            if ruleset_name == "default" and new_crash:
+                self._capture_ingestion_timing(raw_crash)
+
+    @contextlib.contextmanager
+    def _crash_scope(self, crash_id, ruleset_name):
+        """Sentry scope for processing a crash."""
         with sentry_sdk.push_scope() as scope:
             scope.set_extra("crash_id", crash_id)
             scope.set_extra("ruleset", ruleset_name)
+            yield
+
+    def _fetch_crash(self, crash_id):
+        """Fetch the crash data from the source.
+
+        If the crash can't be fetched, it's rejected.
+
+        :returns: (raw_crash, dumps, processed_crash, new_crash) tuple or None if
+            the crash was rejected
 
-            # Fetch the raw crash data
+        """
+        # Fetch the raw crash data and processed crash data--there won't be any
+        # processed crash data if this crash hasn't been processed, yet
+        try:
+            raw_crash, dumps, processed_crash = self.source.get_crash_bundle(crash_id)
+        except Exception as exc:
+            self._reject_unfetchable_crash(crash_id, exc)
+            return None
+        return self._prepare_fetched_crash(raw_crash, dumps, processed_crash)
+
+    async def _fetch_crash_async(self, crash_id):
+        """Async variant of _fetch_crash."""
+        try:
+            raw_crash = await self.source.get_raw_crash_async(crash_id)
             try:
-                raw_crash = self.source.get_raw_crash(crash_id)
-                dumps = self.source.get_dumps_as_files(crash_id)
-            except CrashIDNotFound:
-                # If the crash isn't found, we just reject it--no need to capture
-                # errors here
-                self.processor.reject_raw_crash(
-                    crash_id, "crash cannot be found in raw crash storage"
+                processed_crash = await self.source.get_unredacted_processed_async(
+                    crash_id
                 )
-                return
-            except Exception as exc:
-                sentry_sdk.capture_exception(exc)
-                self.logger.exception("error: crash id %s: %r", crash_id, exc)
-                self.processor.reject_raw_crash(crash_id, f"error in loading: {exc}")
-                return
+            except CrashIDNotFound:
+                processed_crash = None
+            dumps = await self.source.get_dumps_as_files_async(crash_id)
+        except Exception as exc:
+            self._reject_unfetchable_crash(crash_id, exc)
+            return None
+        return self._prepare_fetched_crash(raw_crash, dumps, processed_crash)
+
+    def _reject_unfetchable_crash(self, crash_id, exc):
+        """Reject a crash that couldn't be fetched from the source.
+
+        This is called while handling the exception.
+
+        """
+        if isinstance(exc, CrashIDNotFound):
+            # If the crash isn't found, we just reject it--no need to capture
+            # errors here
+            self.processor.reject_raw_crash(
+                crash_id, "crash cannot be found in raw crash storage"
+            )
+            return
+
+        sentry_sdk.capture_exception(exc)
+        self.logger.exception("error: crash id %s: %r", crash_id, exc)
+        self.processor.reject_raw_crash(crash_id, f"error in loading: {exc}")
+
+    def _prepare_fetched_crash(self, raw_crash, dumps, processed_crash):
+        """Prepare fetched crash data for processing.
+
+        :arg processed_crash: the processed crash or None if the crash hasn't been
+            processed, yet
+
+        :returns: (raw_crash, dumps, processed_crash, new_crash) tuple
+
+        """
+        new_crash = processed_crash is None
+        if new_crash:
+            processed_crash = {}
+        return as_dict(raw_crash), dumps, as_dict(processed_crash), new_crash
+
+    @contextlib.contextmanager
+    def _saving(self, crash_id):
+        """Context for saving a processed crash that logs storage errors."""
+        try:
+            yield
+            self.logger.info("saved - %s", crash_id)
+        except PolyStorageError as poly_storage_error:
+            self._log_storage_errors(crash_id, poly_storage_error)
+
+            # Re-raise the original exception with the correct traceback
+            raise
 
-            # Fetch processed crash data--there won't be any if this crash hasn't
-            # been processed, yet
+    def _save(self, crash_id, raw_crash, processed_crash):
+        """Save the processed crash to the destination."""
+        with self._saving(crash_id):
+            self.destination.save_processed_crash(raw_crash, processed_crash)
+
+    async def _save_async(self, crash_id, raw_crash, processed_crash):
+        """Async variant of _save."""
+        with self._saving(crash_id):
+            await self.destination.save_processed_crash_async(
+                raw_crash, processed_crash
+            )
+
+    def get_stages(self):
+        """Returns the stages for the StagedTaskManager.
+
+        Each stage after the first takes a dict of crash state from the previous
+        stage and returns it for the next one.
+
+        """
+        return [
+            ("fetch", self._fetch_stage),
+            ("stackwalk", self._stackwalk_stage),
+            ("rules", self._rules_stage),
+            ("save", self._save_stage),
+        ]
+
+    @contextlib.contextmanager
+    def _crash_stage(self, state):
+        """Context for running a stage on a crash.
+
+        Stages for a crash run in different threads, so each one sets up the Sentry
+        scope. If the stage fails, the crash doesn't make it to the save stage, so
+        temporary dump files are removed here.
+
+        """
+        with self._crash_scope(state["crash_id"], state["ruleset_name"]):
             try:
-                processed_crash = self.source.get_unredacted_processed(crash_id)
-                new_crash = False
-            except CrashIDNotFound:
-                new_crash = True
-                processed_crash = DotDict()
+                yield
+            except Exception:
+                self._remove_temporary_dumps(state["dumps"])
+                raise
 
-            # Process the crash and remove any temporary artifacts from disk
+    def _fetch_stage(self, task):
+        """Fetch stage: fetches the crash data from the source."""
+        crash_id, ruleset_name = self._parse_task(task)
+        with self._crash_scope(crash_id, ruleset_name):
+            fetched = self._fetch_crash(crash_id)
+            if fetched is None:
+                return None
+            raw_crash, dumps, processed_crash, new_crash = fetched
+
+        return {
+            "crash_id": crash_id,
+            "ruleset_name": ruleset_name,
+            "raw_crash": raw_crash,
+            "dumps": dumps,
+            "processed_crash": processed_crash,
+            "new_crash": new_crash,
+            "processor_meta_data": None,
+        }
+
+    def _stackwalk_stage(self, state):
+        """Stackwalk stage: runs the rules up to and including the stackwalker."""
+        with self._crash_stage(state):
+            processor_meta_data = self.processor.start_crash(
+                state["ruleset_name"], state["raw_crash"], state["processed_crash"]
+            )
+            state["processor_meta_data"] = processor_meta_data
+            if processor_meta_data is None:
+                # There's no such ruleset, so the processed crash gets saved as is
+                return state
+
+            stackwalk_rules, _ = self.processor.split_ruleset(state["ruleset_name"])
+            self.processor.apply_rules(
+                stackwalk_rules,
+                state["ruleset_name"],
+                state["raw_crash"],
+                state["dumps"],
+                state["processed_crash"],
+                processor_meta_data,
+            )
+        return state
+
+    def _rules_stage(self, state):
+        """Rules stage: runs the rest of the rules."""
+        with self._crash_stage(state):
+            processor_meta_data = state["processor_meta_data"]
+            if processor_meta_data is not None:
+                _, rest_of_rules = self.processor.split_ruleset(state["ruleset_name"])
+                self.processor.apply_rules(
+                    rest_of_rules,
+                    state["ruleset_name"],
+                    state["raw_crash"],
+                    state["dumps"],
+                    state["processed_crash"],
+                    processor_meta_data,
+                )
+                state["processed_crash"] = self.processor.finish_crash(
+                    state["raw_crash"], state["processed_crash"], processor_meta_data
+                )
+        return state
+
+    def _save_stage(self, state):
+        """Save stage: saves the processed crash to the destination."""
+        with self._crash_stage(state):
             try:
-                # Process the crash to generate a processed crash
-                processed_crash = self.processor.process_crash(
-                    ruleset_name, raw_crash, dumps, processed_crash
+                self._save(
+                    state["crash_id"], state["raw_crash"], state["processed_crash"]
                 )
+            finally:
+                self._remove_temporary_dumps(state["dumps"])
 
-                # Convert the raw and processed crashes from DotDict into Python
-                # standard data structures
-                raw_crash = dotdict_to_dict(raw_crash)
-                processed_crash = dotdict_to_dict(processed_crash)
-
-                self.destination.save_processed_crash(raw_crash, processed_crash)
-                self.logger.info("saved - %s", crash_id)
-            except PolyStorageError as poly_storage_error:
-                # Capture and log the exceptions raised by storage backends
-                for storage_error in poly_storage_error:
-                    sentry_sdk.capture_exception(storage_error)
-                    self.logger.error("error: crash id %s: %r", crash_id, storage_error)
-                self.logger.warning("error in processing or saving crash %s", crash_id)
-
-                # Re-raise the original exception with the correct traceback
-                raise
+        if state["ruleset_name"] == "default" and state["new_crash"]:
+            self._capture_ingestion_timing(state["raw_crash"])
 
-            finally:
-                # Clean up any dump files saved to the file system
-                for a_dump_pathname in dumps.values():
-                    if "TEMPORARY" in a_dump_pathname:
-                        try:
-                            os.unlink(a_dump_pathname)
-                        except OSError as x:
-                            self.logger.info("deletion of dump failed: %s", x)
+    async def process_crash_async(self, crash_id, ruleset_name):
+        """Async variant of process_crash.
 
-            if ruleset_name == "default" and new_crash:
-                # Capture the total time for ingestion covering when the crash report was
-                # collected (submitted_timestamp) to the end of processing (now). We only
-                # want to do this for crash reports being processed for the first time.
-                collected = raw_crash.get("submitted_timestamp", None)
-                if collected:
-                    delta = time.time() - isoformat_to_time(collected)
-                    delta = delta * 1000
-                    METRICS.timing("ingestion_timing", value=delta)
+        Fetching and saving use the async crashstorage API so they don't block
+        other crashes. Processing is CPU-bound (and runs the stackwalker), so it
+        runs in an executor; see ``_run_in_cpu_executor``.
+
+        """
+        # Each crash gets its own Sentry hub so scopes of crashes being processed
+        # concurrently don't mix
+        with sentry_sdk.Hub(sentry_sdk.Hub.current):
+            with self._crash_scope(crash_id, ruleset_name):
+                fetched = await self._fetch_crash_async(crash_id)
+                if fetched is None:
+                    return
+                raw_crash, dumps, processed_crash, new_crash = fetched
+
+                # Process the crash and remove any temporary artifacts from disk
+                try:
+                    raw_crash, processed_crash = await self._run_in_cpu_executor(
+                        self._process, ruleset_name, raw_crash, dumps, processed_crash
+                    )
+                    await self._save_async(crash_id, raw_crash, processed_crash)
+                finally:
+                    self._remove_temporary_dumps(dumps)
+
+                if ruleset_name == "default" and new_crash:
+                    self._capture_ingestion_timing(raw_crash)
+
+    async def _run_in_cpu_executor(self, func, *args):
+        """Run a CPU-bound function in an executor.
+
+        This uses the task manager's bounded executor if it has one and the event
+        loop's default executor if it doesn't.
+
+        """
+        run_in_cpu_executor = getattr(
+            getattr(self, "task_manager", None), "run_in_cpu_executor", None
+        )
+        if run_in_cpu_executor is not None:
+            return await run_in_cpu_executor(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _process(self, ruleset_name, raw_crash, dumps, processed_crash):
+        """Process the crash to generate a processed crash.
+
+        :returns: (raw_crash, processed_crash) tuple ready to be saved
+
+        """
+        processed_crash = self.processor.process_crash(
+            ruleset_name, raw_crash, dumps, processed_crash
+        )
+        return raw_crash, processed_crash
+
+    def _log_storage_errors(self, crash_id, poly_storage_error):
+        """Capture and log the exceptions raised by storage backends."""
+        for storage_error in poly_storage_error:
+            sentry_sdk.capture_exception(storage_error)
+            self.logger.error("error: crash id %s: %r", crash_id, storage_error)
+        self.logger.warning("error in processing or saving crash %s", crash_id)
+
+    def _remove_temporary_dumps(self, dumps):
+        """Clean up any dump files saved to the file system."""
+        for a_dump_pathname in dumps.values():
+            if "TEMPORARY" in a_dump_pathname:
+                try:
+                    os.unlink(a_dump_pathname)
+                except OSError as x:
+                    self.logger.info("deletion of dump failed: %s", x)
+
+    def _capture_ingestion_timing(self, raw_crash):
+        """Capture the total time for ingestion.
+
+        This covers when the crash report was collected (submitted_timestamp) to the
+        end of processing (now). We only want to do this for crash reports being
+        processed for the first time.
+
+        """
+        collected = raw_crash.get("submitted_timestamp", None)
+        if collected:
+            delta = time.time() - isoformat_to_time(collected)
+            delta = delta * 1000
+            METRICS.timing("ingestion_timing", value=delta)
 
     def _setup_source_and_destination(self):
         """Instantiate classes necessary for processing."""
@@ -296,6 +557,57 @@ class ProcessorApp(FetchTransformSaveApp):
             config=self.config.processor, host_id=self.app_instance_name
         )
 
+        self._set_up_profile_report_signal()
+
+    def _set_up_profile_report_signal(self):
+        """If rule profiling is enabled, SIGUSR1 dumps the report."""
+        if getattr(self.processor, "profiler", None) is not None:
+            signal.signal(signal.SIGUSR1, self._handle_dump_profile_report)
+
+    def _handle_dump_profile_report(self, signal_number, frame):
+        # Dumping the report takes the profiler's lock, which the interrupted code
+        # might be holding, so do it in another thread
+        threading.Thread(
+            name="DumpProfileReport", target=self._dump_profile_report, daemon=True
+        ).start()
+
+    def _dump_profile_report(self):
+        """Dump the rule profile report.
+
+        With the ProcessPoolTaskManager, crashes are processed in the worker
+        processes and each one has its own profiler, so the main process passes
+        the signal on to them and they each write their own report.
+
+        """
+        task_manager = getattr(self, "task_manager", None)
+        if not self.is_worker_process and isinstance(
+            task_manager, ProcessPoolTaskManager
+        ):
+            task_manager.signal_workers(signal.SIGUSR1)
+            return
+
+        try:
+            self.processor.profiler.dump_report()
+        except Exception:
+            self.logger.exception("error dumping rule profile report")
+
+    def _setup_worker_process(self):
+        """Set up a task manager worker process with its own processor."""
+        super()._setup_worker_process()
+        # The companion process belongs to the main process
+        self.companion_process = None
+        self.processor = self.config.processor.processor_class(
+            config=self.config.processor, host_id=self.app_instance_name
+        )
+
+        profiler = getattr(self.processor, "profiler", None)
+        if profiler is not None and profiler.report_dir:
+            # Keep worker processes from writing over each other's reports
+            profiler.report_dir = os.path.join(
+                profiler.report_dir, f"worker-{os.getpid()}"
+            )
+        self._set_up_profile_report_signal()
+
     def close(self):
         """Clean up the processor on shutdown."""
         super().close()
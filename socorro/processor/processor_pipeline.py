@@ -7,13 +7,13 @@ crash.  In this latest version, all transformations have been reimplemented
 as sets of loadable rules.  The rules are applied one at a time, each doing
 some small part of the transformation process."""
 
+import contextlib
 import logging
 import os
 import tempfile
 
 from configman import Namespace, RequiredConfig
 from configman.converters import str_to_list
-from configman.dotdict import DotDict
 import sentry_sdk
 
 from socorro.lib.libdatetime import utc_now
@@ -30,6 +30,7 @@ from socorro.processor.rules.general import (
     IdentifierRule,
     OSInfoRule,
 )
+from socorro.processor.rule_profiler import RuleProfiler
 from socorro.processor.rules.memory_report_extraction import MemoryReportExtraction
 from socorro.processor.rules.mozilla import (
     AddonsRule,
@@ -69,6 +70,9 @@ from socorro.processor.rules.mozilla import (
 class ProcessorPipeline(RequiredConfig):
     """Processor pipeline for Mozilla crash ingestion."""
 
+    # The class of the rule that runs minidump-stackwalk
+    stackwalk_rule_class = MinidumpStackwalkRule
+
     required_config = Namespace("transform_rules")
 
     # MinidumpStackwalkRule configuration
@@ -130,6 +134,111 @@ class ProcessorPipeline(RequiredConfig):
         default=tempfile.gettempdir(),
     )
 
+    required_config.minidumpstackwalk.add_option(
+        "stream_output",
+        doc=(
+            "whether to parse minidump-stackwalk output as it's read rather than "
+            "after reading all of it with ijson; this lowers memory usage"
+        ),
+        default=False,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "parallel_dumps",
+        doc=(
+            "whether to stackwalk all the minidumps in a crash at the same time "
+            "rather than one after another"
+        ),
+        default=False,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "max_concurrent_stackwalks",
+        doc=(
+            "the maximum number of stackwalks to run at the same time across all "
+            "crashes being processed; 0 for no limit"
+        ),
+        default=0,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "stackwalk_slots_path",
+        doc=(
+            "directory of slot files shared by the processors on a node; if set, "
+            "max_concurrent_stackwalks is the limit for the whole node rather than "
+            "for each processor"
+        ),
+        default="",
+    )
+    required_config.minidumpstackwalk.add_option(
+        "cache_path",
+        doc=(
+            "a path to cache stackwalker results in so reprocessing a crash doesn't "
+            "run the stackwalker again; empty to not cache results"
+        ),
+        default="",
+    )
+    required_config.minidumpstackwalk.add_option(
+        "cache_max_size",
+        doc="the maximum size of the stackwalker results cache in bytes",
+        default=1024 * 1024 * 1024,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "symbols_generation",
+        doc=(
+            "identifies the symbols cached stackwalker results were made with; "
+            "change this to stop using cached results when symbols change"
+        ),
+        default="",
+    )
+    required_config.minidumpstackwalk.add_option(
+        "modules_log_path",
+        doc=(
+            "a file to log the modules symbols were loaded for to; the symbols "
+            "prefetcher reads it; empty to not log modules"
+        ),
+        default="",
+    )
+    required_config.minidumpstackwalk.add_option(
+        "adaptive_kill_timeout",
+        doc=(
+            "whether to base each minidump's kill timeout on how long recent "
+            "minidumps of similar size took; kill_timeout is the most it can be"
+        ),
+        default=False,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "min_kill_timeout",
+        doc="the least time in seconds an adaptive kill timeout can be",
+        default=30,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "kill_timeout_multiplier",
+        doc=(
+            "adaptive kill timeouts are this multiple of the 99th percentile of "
+            "recent durations"
+        ),
+        default=4.0,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "quarantine_path",
+        doc=(
+            "a path to keep track of minidumps that were killed in; empty to not "
+            "quarantine minidumps"
+        ),
+        default="",
+    )
+    required_config.minidumpstackwalk.add_option(
+        "quarantine_ttl",
+        doc="time in seconds a killed minidump stays quarantined",
+        default=7 * 24 * 60 * 60,
+    )
+    required_config.minidumpstackwalk.add_option(
+        "quarantine_kill_timeout",
+        doc=(
+            "time in seconds to let minidump-stackwalk run on a quarantined minidump "
+            "before killing it; 0 to skip quarantined minidumps"
+        ),
+        default=0,
+    )
+
     # BetaVersionRule configuration
     required_config.betaversion = Namespace()
     required_config.betaversion.add_option(
@@ -138,12 +247,52 @@ class ProcessorPipeline(RequiredConfig):
         default="https://crash-stats.mozilla.org/api/VersionString",
     )
 
+    # Rule profiling configuration
+    required_config.profiling = Namespace()
+    required_config.profiling.add_option(
+        "enabled",
+        doc="whether to record per-rule wall time, CPU time, and memory",
+        default=False,
+    )
+    required_config.profiling.add_option(
+        "window_size",
+        doc="the number of samples per rule to calculate percentiles from",
+        default=1000,
+    )
+    required_config.profiling.add_option(
+        "trace_memory",
+        doc="whether to record memory allocated by each rule using tracemalloc",
+        default=False,
+    )
+    required_config.profiling.add_option(
+        "slowest_crashes",
+        doc="the number of slowest crashes to keep cProfile profiles of; 0 for none",
+        default=0,
+    )
+    required_config.profiling.add_option(
+        "report_dir",
+        doc=(
+            "directory to write the profiling report and profiles to on SIGUSR1; "
+            "if empty, the report is logged; with the ProcessPoolTaskManager, each "
+            "worker process writes to a worker-PID subdirectory"
+        ),
+        default="",
+    )
+
     def __init__(self, config, rules=None, host_id=None):
         super().__init__()
         self.config = config
         self.logger = logging.getLogger(__name__ + "." + self.__class__.__name__)
         self.host_id = host_id or "unknown"
         self.rulesets = rules or self.get_rulesets(config)
+        self.profiler = None
+        if config.profiling.enabled:
+            self.profiler = RuleProfiler(
+                window_size=config.profiling.window_size,
+                trace_memory=config.profiling.trace_memory,
+                slowest_crashes=config.profiling.slowest_crashes,
+                report_dir=config.profiling.report_dir,
+            )
         for ruleset_name, ruleset in self.rulesets.items():
             self.logger.info(f"Loading ruleset: {ruleset_name}")
             for rule in ruleset:
@@ -180,7 +329,7 @@ class ProcessorPipeline(RequiredConfig):
                 ProcessTypeRule(),
                 IdentifierRule(),
                 MinidumpSha256Rule(),
-                MinidumpStackwalkRule(
+                self.stackwalk_rule_class(
                     dump_field=config.minidumpstackwalk.dump_field,
                     symbols_urls=config.minidumpstackwalk.symbols_urls,
                     command_line=config.minidumpstackwalk.command_line,
@@ -189,6 +338,28 @@ class ProcessorPipeline(RequiredConfig):
                     symbol_tmp_path=config.minidumpstackwalk.symbol_tmp_path,
                     symbol_cache_path=config.minidumpstackwalk.symbol_cache_path,
                     tmp_path=config.minidumpstackwalk.tmp_path,
+                    stream_output=config.minidumpstackwalk.stream_output,
+                    parallel_dumps=config.minidumpstackwalk.parallel_dumps,
+                    max_concurrent_stackwalks=(
+                        config.minidumpstackwalk.max_concurrent_stackwalks
+                    ),
+                    stackwalk_slots_path=config.minidumpstackwalk.stackwalk_slots_path,
+                    cache_path=config.minidumpstackwalk.cache_path,
+                    cache_max_size=config.minidumpstackwalk.cache_max_size,
+                    symbols_generation=config.minidumpstackwalk.symbols_generation,
+                    modules_log_path=config.minidumpstackwalk.modules_log_path,
+                    adaptive_kill_timeout=(
+                        config.minidumpstackwalk.adaptive_kill_timeout
+                    ),
+                    min_kill_timeout=config.minidumpstackwalk.min_kill_timeout,
+                    kill_timeout_multiplier=(
+                        config.minidumpstackwalk.kill_timeout_multiplier
+                    ),
+                    quarantine_path=config.minidumpstackwalk.quarantine_path,
+                    quarantine_ttl=config.minidumpstackwalk.quarantine_ttl,
+                    quarantine_kill_timeout=(
+                        config.minidumpstackwalk.quarantine_kill_timeout
+                    ),
                 ),
                 ModuleURLRewriteRule(),
                 CrashingThreadInfoRule(),
@@ -239,44 +410,107 @@ class ProcessorPipeline(RequiredConfig):
 
         If this throws an exception, the crash was not processed correctly.
 
+        """
+        processor_meta_data = self.start_crash(ruleset_name, raw_crash, processed_crash)
+        if processor_meta_data is None:
+            return processed_crash
+
+        if self.profiler is not None:
+            profile_crash = self.profiler.profile_crash(raw_crash["uuid"])
+        else:
+            profile_crash = contextlib.nullcontext()
+        with profile_crash:
+            self.apply_rules(
+                self.rulesets[ruleset_name],
+                ruleset_name,
+                raw_crash,
+                dumps,
+                processed_crash,
+                processor_meta_data,
+            )
+        return self.finish_crash(raw_crash, processed_crash, processor_meta_data)
+
+    def split_ruleset(self, ruleset_name):
+        """Split a ruleset into stackwalk rules and the rest of the rules
+
+        The stackwalk rules are the rules up to and including the last
+        MinidumpStackwalkRule. If there is no MinidumpStackwalkRule in the ruleset,
+        all the rules are in the rest of the rules.
+
+        :arg ruleset_name: the name of the ruleset
+
+        :returns: (stackwalk_rules, rest_of_rules) tuple of lists
+
+        """
+        ruleset = self.rulesets.get(ruleset_name) or []
+        split_at = 0
+        for i, rule in enumerate(ruleset):
+            if isinstance(rule, MinidumpStackwalkRule):
+                split_at = i + 1
+        return ruleset[:split_at], ruleset[split_at:]
+
+    def start_crash(self, ruleset_name, raw_crash, processed_crash):
+        """Start processing a crash
+
+        :returns: processor_meta_data to pass to apply_rules and finish_crash or
+            None if there's no ruleset by that name
+
         """
         # processor_meta_data will be used to ferry "inside information" to
         # transformation rules. Sometimes rules need a bit more extra
         # information about the transformation process itself.
-        processor_meta_data = DotDict()
-        processor_meta_data.processor = self
-        processor_meta_data.config = self.config
-        processor_meta_data.processor_notes = []
+        processor_meta_data = {
+            "processor": self,
+            "config": self.config,
+            "processor_notes": [],
+        }
 
-        processed_crash.success = False
+        processed_crash["success"] = False
         start_time = utc_now()
-        processed_crash.started_datetime = start_time
+        processed_crash["started_datetime"] = start_time
 
-        processor_meta_data.processor_notes.append(
+        processor_meta_data["processor_notes"].append(
             f">>> Start processing: {start_time:%Y-%m-%d %H:%M:%S} ({self.host_id})"
         )
 
-        processed_crash.signature = "EMPTY: crash failed to process"
+        processed_crash["signature"] = "EMPTY: crash failed to process"
 
         crash_id = raw_crash["uuid"]
 
         ruleset = self.rulesets.get(ruleset_name)
         if ruleset is None:
-            processor_meta_data.processor_notes.append(
+            processor_meta_data["processor_notes"].append(
                 f"error: no ruleset: {ruleset_name}"
             )
-            return processed_crash
+            return None
 
         self.logger.info(f"starting transform {ruleset_name} for crash: {crash_id}")
-        processor_meta_data.started_timestamp = utc_now()
-
-        # Apply rules; if a rule fails, capture the error and continue onward
-        for rule in ruleset:
+        processor_meta_data["started_timestamp"] = utc_now()
+        return processor_meta_data
+
+    def apply_rules(
+        self,
+        rules,
+        ruleset_name,
+        raw_crash,
+        dumps,
+        processed_crash,
+        processor_meta_data,
+    ):
+        """Apply rules; if a rule fails, capture the error and continue onward"""
+        crash_id = raw_crash["uuid"]
+        for rule in rules:
             with sentry_sdk.push_scope() as scope:
                 scope.set_extra("rule", rule.name)
 
                 try:
-                    rule.act(raw_crash, dumps, processed_crash, processor_meta_data)
+                    if self.profiler is not None:
+                        with self.profiler.profile_rule(rule.name):
+                            rule.act(
+                                raw_crash, dumps, processed_crash, processor_meta_data
+                            )
+                    else:
+                        rule.act(raw_crash, dumps, processed_crash, processor_meta_data)
 
                 except Exception as exc:
                     sentry_sdk.capture_exception(exc)
@@ -290,30 +524,38 @@ class ProcessorPipeline(RequiredConfig):
 
                     # NOTE(willkg): notes are public, so we can't put exception
                     # messages in them
-                    processor_meta_data.processor_notes.append(
+                    processor_meta_data["processor_notes"].append(
                         f"ruleset {ruleset_name!r} rule {rule.name!r} failed: "
                         f"{exc.__class__.__name__}"
                     )
 
+    def finish_crash(self, raw_crash, processed_crash, processor_meta_data):
+        """Finish processing a crash after all the rules have been applied
+
+        :returns: the processed crash
+
+        """
+        crash_id = raw_crash["uuid"]
+
         # The crash made it through the processor rules with no exceptions
         # raised, call it a success
-        processed_crash.success = True
+        processed_crash["success"] = True
 
         # Join notes into a single string
         if processed_crash.get("processor_notes"):
             previous_notes = processed_crash["processor_notes"]
             previous_notes = [line.strip() for line in previous_notes.split("\n")]
-            processor_meta_data.processor_notes.extend(previous_notes)
+            processor_meta_data["processor_notes"].extend(previous_notes)
 
         processed_crash["processor_notes"] = "\n".join(
-            processor_meta_data.processor_notes
+            processor_meta_data["processor_notes"]
         )
         completed_datetime = utc_now()
         processed_crash["completed_datetime"] = completed_datetime
 
         self.logger.info(
             "finishing %s transform for crash: %s",
-            "successful" if processed_crash.success else "failed",
+            "successful" if processed_crash["success"] else "failed",
             crash_id,
         )
         return processed_crash
@@ -323,5 +565,9 @@ class ProcessorPipeline(RequiredConfig):
 
     def close(self):
         self.logger.debug("closing rules")
-        for rule in self.rules:
+        # The same rule can be in more than one ruleset, so only close it once
+        rules = {
+            id(rule): rule for ruleset in self.rulesets.values() for rule in ruleset
+        }
+        for rule in rules.values():
             rule.close()
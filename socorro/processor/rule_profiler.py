@@ -0,0 +1,228 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Profiling for processor rules.
+
+The ``RuleProfiler`` records how long each rule takes (wall time and CPU time) and,
+optionally, how much memory it allocated for every crash the processor processes.
+It keeps a rolling window of samples for each rule and generates a report of
+percentiles so we can tell which rules are worth optimizing. It can also run
+cProfile on every crash and keep the profiles of the slowest ones.
+
+Profiling adds overhead--tracing memory and running cProfile especially--so it's
+off by default.
+
+"""
+
+import collections
+import contextlib
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(sorted_values, pct):
+    """Return the nearest-rank percentile of a sorted list of values."""
+    if not sorted_values:
+        return 0
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class RuleStats:
+    """Rolling window of samples for a single rule."""
+
+    def __init__(self, window_size):
+        self.count = 0
+        self.total_wall_time = 0.0
+        self.wall_times = collections.deque(maxlen=window_size)
+        self.cpu_times = collections.deque(maxlen=window_size)
+        self.memory = collections.deque(maxlen=window_size)
+
+    def add(self, wall_time, cpu_time, memory):
+        self.count += 1
+        self.total_wall_time += wall_time
+        self.wall_times.append(wall_time)
+        self.cpu_times.append(cpu_time)
+        if memory is not None:
+            self.memory.append(memory)
+
+    def percentiles(self, samples):
+        sorted_samples = sorted(samples)
+        return [percentile(sorted_samples, pct) for pct in PERCENTILES]
+
+
+class RuleProfiler:
+    """Records per-rule and per-crash profiling data
+
+    :arg window_size: the number of samples to keep for each rule
+    :arg trace_memory: whether to record memory allocated by each rule using
+        tracemalloc; the memory numbers are for the whole process, so they're only
+        accurate when the processor is processing one crash at a time
+    :arg slowest_crashes: the number of slowest crashes to keep cProfile profiles
+        for; 0 to not run cProfile
+    :arg report_dir: directory to write reports and profiles to when
+        ``dump_report`` is called; if empty, the report is logged
+
+    """
+
+    def __init__(
+        self, window_size=1000, trace_memory=False, slowest_crashes=0, report_dir=""
+    ):
+        self.logger = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.window_size = window_size
+        self.trace_memory = trace_memory
+        self.slowest_crashes = slowest_crashes
+        self.report_dir = report_dir
+
+        self._lock = threading.Lock()
+        self.rule_stats = {}
+        # Heap of (wall_time, counter, crash_id, cProfile.Profile) for the slowest
+        # crashes; the counter breaks ties
+        self.crash_profiles = []
+        self._counter = itertools.count()
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def profile_rule(self, rule_name):
+        """Records wall time, CPU time, and allocated memory for a rule run."""
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_cpu = time.thread_time()
+        start_wall = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            cpu_time = time.thread_time() - start_cpu
+            memory = None
+            if self.trace_memory:
+                memory = tracemalloc.get_traced_memory()[0] - start_memory
+
+            with self._lock:
+                stats = self.rule_stats.get(rule_name)
+                if stats is None:
+                    stats = self.rule_stats[rule_name] = RuleStats(self.window_size)
+                stats.add(wall_time, cpu_time, memory)
+
+    @contextlib.contextmanager
+    def profile_crash(self, crash_id):
+        """Runs cProfile for a crash and keeps the profile if it's one of the
+        slowest."""
+        if not self.slowest_crashes:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        start_wall = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            wall_time = time.perf_counter() - start_wall
+            with self._lock:
+                if len(self.crash_profiles) < self.slowest_crashes:
+                    heapq.heappush(
+                        self.crash_profiles,
+                        (wall_time, next(self._counter), crash_id, profiler),
+                    )
+                elif wall_time > self.crash_profiles[0][0]:
+                    heapq.heapreplace(
+                        self.crash_profiles,
+                        (wall_time, next(self._counter), crash_id, profiler),
+                    )
+
+    def get_slowest_crashes(self):
+        """Returns list of (wall_time, crash_id, profiler) slowest first."""
+        with self._lock:
+            crash_profiles = sorted(self.crash_profiles, reverse=True)
+        return [
+            (wall_time, crash_id, profiler)
+            for wall_time, _, crash_id, profiler in crash_profiles
+        ]
+
+    def report(self):
+        """Generates a text report of the per-rule percentiles.
+
+        Rules are sorted by total wall time with the most expensive first. Times
+        are in milliseconds and memory is in bytes.
+
+        """
+        with self._lock:
+            rule_stats = [
+                (
+                    name,
+                    stats.count,
+                    stats.total_wall_time,
+                    stats.percentiles(stats.wall_times),
+                    stats.percentiles(stats.cpu_times),
+                    stats.percentiles(stats.memory) if stats.memory else None,
+                )
+                for name, stats in self.rule_stats.items()
+            ]
+        rule_stats.sort(key=lambda item: item[2], reverse=True)
+
+        pcts = "/".join(f"p{pct}" for pct in PERCENTILES)
+        lines = [
+            f"{'rule':<60} {'count':>8} {'total ms':>12} "
+            f"{'wall ms ' + pcts:>28} {'cpu ms ' + pcts:>28} {'mem B ' + pcts:>30}"
+        ]
+        for name, count, total, wall, cpu, memory in rule_stats:
+            wall = "/".join(f"{value * 1000:.2f}" for value in wall)
+            cpu = "/".join(f"{value * 1000:.2f}" for value in cpu)
+            memory = "/".join(str(value) for value in memory) if memory else "-"
+            lines.append(
+                f"{name:<60} {count:>8} {total * 1000:>12.2f} "
+                f"{wall:>28} {cpu:>28} {memory:>30}"
+            )
+
+        slowest = self.get_slowest_crashes()
+        if slowest:
+            lines.append("")
+            lines.append("slowest crashes:")
+            for wall_time, crash_id, _ in slowest:
+                lines.append(f"{crash_id} {wall_time * 1000:.2f} ms")
+
+        return "\n".join(lines)
+
+    def dump_report(self):
+        """Writes the report and the cProfile profiles of the slowest crashes.
+
+        If ``report_dir`` is set, the report is written to ``rule_profile.txt`` and
+        profiles are written to ``{crash_id}.prof`` files that can be loaded with
+        ``pstats``. Otherwise, the report and the top functions of the slowest
+        crashes are logged.
+
+        """
+        report = self.report()
+        slowest = self.get_slowest_crashes()
+
+        if not self.report_dir:
+            for wall_time, crash_id, profiler in slowest:
+                stream = io.StringIO()
+                stats = pstats.Stats(profiler, stream=stream)
+                stats.sort_stats("cumulative").print_stats(20)
+                report += f"\n\n{crash_id}:\n{stream.getvalue()}"
+            self.logger.info("rule profile:\n%s", report)
+            return
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        with open(os.path.join(self.report_dir, "rule_profile.txt"), "w") as fp:
+            fp.write(report)
+        for wall_time, crash_id, profiler in slowest:
+            profiler.dump_stats(os.path.join(self.report_dir, f"{crash_id}.prof"))
+        self.logger.info("rule profile written to %s", self.report_dir)
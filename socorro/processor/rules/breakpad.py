@@ -3,19 +3,36 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 from collections.abc import Mapping
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+import io
 import json
 import logging
 import os
 import shlex
 import subprocess
 import threading
+import time
 
 import glom
 import markus
 
-from socorro.lib.util import dotdict_to_dict
+try:
+    # ijson parses JSON incrementally so we don't have to hold all the bytes
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    # orjson parses JSON faster than the json module
+    import orjson
+except ImportError:
+    orjson = None
+
 from socorro.processor.rules.base import Rule
+from socorro.processor.stackwalk_budget import StackwalkBudget, StackwalkQuarantine
+from socorro.processor.stackwalk_cache import sha256_file, StackwalkCache
+from socorro.processor.stackwalk_slots import StackwalkSlots
 
 
 LOGGER = logging.getLogger(__name__)
@@ -68,7 +85,7 @@ def tmp_raw_crash_file(tmp_path, raw_crash, crash_id):
     """Saves JSON data to file, returns path, and deletes file when done.
 
     :param tmp_path: str path to temp storage
-    :param raw_crash: dotdict or dict of raw crash data
+    :param raw_crash: dict of raw crash data
     :param crash_id: crash id for this crash report
 
     :yields: absolute path to temp file
@@ -79,7 +96,7 @@ def tmp_raw_crash_file(tmp_path, raw_crash, crash_id):
         tmp_path, f"{crash_id}.{threading.currentThread().getName()}.TEMPORARY.json"
     )
     with open(path, "w") as fp:
-        json.dump(dotdict_to_dict(raw_crash), fp)
+        json.dump(raw_crash, fp)
 
     try:
         yield path
@@ -107,6 +124,103 @@ def execute_process(command_line):
     return ret
 
 
+def execute_process_streaming(command_line, stdout_handler):
+    """Executes process and hands stdout to a handler as it's produced.
+
+    Unlike ``execute_process``, stdout isn't held in memory. stderr is read in a
+    separate thread so the process doesn't block on a full stderr pipe.
+
+    :param command_line: the complete command line to run
+    :param stdout_handler: function that takes a binary file object of stdout; it
+        should read what it needs; anything left is read and thrown away
+
+    :returns: dict with output (what stdout_handler returned), stderr, and
+        returncode keys
+
+    """
+    args = shlex.split(command_line, comments=False, posix=True)
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = []
+    stderr_thread = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+    stderr_thread.start()
+    try:
+        output = stdout_handler(proc.stdout)
+        # Drain stdout so the process can finish
+        while proc.stdout.read(65536):
+            pass
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        stderr_thread.join()
+        proc.stderr.close()
+
+    return {
+        "output": output,
+        "stderr": b"".join(stderr),
+        "returncode": returncode,
+    }
+
+
+class CountingReader:
+    """Wraps a binary file object and keeps track of what's read from it
+
+    This counts the bytes read, adds up the time spent waiting on reads, and
+    keeps the first ``prefix_size`` bytes read so they can be logged if the
+    output can't be parsed.
+
+    """
+
+    def __init__(self, fp, prefix_size=1000):
+        self.fp = fp
+        self.prefix_size = prefix_size
+        self.bytes_read = 0
+        self.read_time = 0.0
+        self.prefix = bytearray()
+
+    def read(self, size=-1):
+        start_time = time.perf_counter()
+        data = self.fp.read(size)
+        self.read_time += time.perf_counter() - start_time
+        self.bytes_read += len(data)
+        if len(self.prefix) < self.prefix_size:
+            self.prefix.extend(data[: self.prefix_size - len(self.prefix)])
+        return data
+
+
+def parse_json_stream(fp, incremental=True):
+    """Parses a JSON document from a binary file object
+
+    If ``incremental`` is True and ijson is installed, this parses the document
+    as it's read. Otherwise, it reads everything into one buffer and parses that
+    with orjson if it's installed or json.
+
+    :param fp: binary file object
+    :param incremental: whether to parse the document as it's read
+
+    :returns: (data, parser name) tuple
+
+    :raises ValueError: if the document isn't valid JSON
+
+    """
+    if incremental and ijson is not None:
+        try:
+            return next(ijson.items(fp, "", use_float=True)), "ijson"
+        except StopIteration:
+            raise ValueError("no JSON document")
+        except ijson.JSONError as exc:
+            raise ValueError(str(exc)) from exc
+
+    buffer = bytearray()
+    while True:
+        chunk = fp.read(65536)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+    if orjson is not None:
+        return orjson.loads(buffer), "orjson"
+    return json.loads(buffer), "json"
+
+
 class CommandError(Exception):
     pass
 
@@ -130,6 +244,41 @@ class MinidumpStackwalkRule(Rule):
 
     Also adds processor notes.
 
+    If ``stream_output`` is True, the stackwalker output is parsed with ijson as
+    it's read rather than after reading all of it. That lowers peak memory usage.
+
+    If ``parallel_dumps`` is True, all the minidumps in a crash are stackwalked at
+    the same time and the results are merged in the same order as when they're
+    stackwalked one after another. If ``max_concurrent_stackwalks`` is greater
+    than 0, it's the most stackwalks that run at once across all the crashes being
+    processed. If ``stackwalk_slots_path`` is set too, the limit is shared by all
+    the processors on the node that use that directory. See
+    ``socorro.processor.stackwalk_slots``.
+
+    If ``cache_path`` is set, successful stackwalker results are kept in a
+    ``StackwalkCache`` there and reused when the same minidump and crash
+    annotations are stackwalked again with the same stackwalker and
+    ``symbols_generation``. Change ``symbols_generation`` to stop using results
+    from before symbols changed. Cached results include the processor notes and
+    symbols metrics of the stackwalk, which are replayed when they're used. If
+    the cache can't be read or written to, the stackwalker is run as if there
+    were no cache.
+
+    If ``modules_log_path`` is set, the modules the stackwalker loaded symbols for
+    are appended to that file for every crash. The symbols prefetcher uses it to
+    keep symbols for hot modules in the symbols cache. See
+    ``socorro.processor.symbol_prefetcher``.
+
+    If ``adaptive_kill_timeout`` is True, each minidump gets a kill timeout
+    based on how long recent minidumps of similar size took rather than
+    ``kill_timeout``. It's at least ``min_kill_timeout`` and at most
+    ``kill_timeout``. See ``socorro.processor.stackwalk_budget``.
+
+    If ``quarantine_path`` is set, minidumps that get killed are quarantined
+    there for ``quarantine_ttl`` seconds. Quarantined minidumps get
+    ``quarantine_kill_timeout`` seconds the next time they're stackwalked or
+    are skipped if that's 0.
+
     Emits:
 
     * processor.minidumpstackwalk.*
@@ -156,6 +305,20 @@ class MinidumpStackwalkRule(Rule):
         symbol_tmp_path="/tmp/symbols-tmp",
         symbol_cache_path="/tmp/symbols",
         tmp_path="/tmp/",
+        stream_output=False,
+        parallel_dumps=False,
+        max_concurrent_stackwalks=0,
+        stackwalk_slots_path="",
+        cache_path="",
+        cache_max_size=1024 * 1024 * 1024,
+        symbols_generation="",
+        modules_log_path="",
+        adaptive_kill_timeout=False,
+        min_kill_timeout=30,
+        kill_timeout_multiplier=4.0,
+        quarantine_path="",
+        quarantine_ttl=7 * 24 * 60 * 60,
+        quarantine_kill_timeout=0,
     ):
         super().__init__()
         self.dump_field = dump_field
@@ -166,10 +329,64 @@ class MinidumpStackwalkRule(Rule):
         self.symbol_tmp_path = symbol_tmp_path
         self.symbol_cache_path = symbol_cache_path
         self.tmp_path = tmp_path
+        self.stream_output = stream_output
+        self.parallel_dumps = parallel_dumps
+        self.max_concurrent_stackwalks = max_concurrent_stackwalks
+        self.stackwalk_slots_path = stackwalk_slots_path
+        self.cache_path = cache_path
+        self.cache_max_size = cache_max_size
+        self.symbols_generation = symbols_generation
+        self.modules_log_path = modules_log_path
+        self.adaptive_kill_timeout = adaptive_kill_timeout
+        self.min_kill_timeout = min_kill_timeout
+        self.kill_timeout_multiplier = kill_timeout_multiplier
+        self.quarantine_path = quarantine_path
+        self.quarantine_ttl = quarantine_ttl
+        self.quarantine_kill_timeout = quarantine_kill_timeout
+
+        # Bounds the number of stackwalks running at once across all the crashes
+        # the processors on this node are working on or, if there's no slots
+        # directory, across all the crashes this processor is working on
+        self.stackwalk_semaphore = None
+        self.stackwalk_slots = None
+        if self.max_concurrent_stackwalks > 0:
+            if self.stackwalk_slots_path:
+                self.stackwalk_slots = StackwalkSlots(
+                    self.stackwalk_slots_path, self.max_concurrent_stackwalks
+                )
+            else:
+                self.stackwalk_semaphore = threading.BoundedSemaphore(
+                    self.max_concurrent_stackwalks
+                )
+
+        self.executor = None
+        if self.parallel_dumps:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_stackwalks or None,
+                thread_name_prefix="stackwalk",
+            )
 
         self.stackwalk_version = self.get_version()
         self.build_directories()
 
+        self.cache = None
+        if self.cache_path:
+            self.cache = StackwalkCache(self.cache_path, self.cache_max_size)
+
+        self.budget = None
+        if self.adaptive_kill_timeout:
+            self.budget = StackwalkBudget(
+                max_kill_timeout=self.kill_timeout,
+                min_kill_timeout=self.min_kill_timeout,
+                multiplier=self.kill_timeout_multiplier,
+            )
+
+        self.quarantine = None
+        if self.quarantine_path:
+            self.quarantine = StackwalkQuarantine(
+                self.quarantine_path, self.quarantine_ttl
+            )
+
         self.metrics = markus.get_metrics("processor.minidumpstackwalk")
 
     def __repr__(self):
@@ -182,9 +399,27 @@ class MinidumpStackwalkRule(Rule):
             "symbol_tmp_path",
             "symbol_cache_path",
             "tmp_path",
+            "stream_output",
+            "parallel_dumps",
+            "max_concurrent_stackwalks",
+            "stackwalk_slots_path",
+            "cache_path",
+            "cache_max_size",
+            "symbols_generation",
+            "modules_log_path",
+            "adaptive_kill_timeout",
+            "min_kill_timeout",
+            "kill_timeout_multiplier",
+            "quarantine_path",
+            "quarantine_ttl",
+            "quarantine_kill_timeout",
         )
         return self.generate_repr(keys=keys)
 
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
     def get_version(self):
         command_line = f"{self.command_path} --version"
         ret = execute_process(command_line)
@@ -211,11 +446,13 @@ class MinidumpStackwalkRule(Rule):
         os.makedirs(self.symbol_tmp_path, exist_ok=True)
         os.makedirs(self.symbol_cache_path, exist_ok=True)
 
-    def expand_commandline(self, dump_file_path, raw_crash_path):
+    def expand_commandline(self, dump_file_path, raw_crash_path, kill_timeout=None):
         """Expands the command line parameters and returns the final command line
 
         :param dump_file_path: the absolute path to the dump file to parse
         :param raw_crash_path: the absolute path to the crash annotations file
+        :param kill_timeout: the kill timeout in seconds; defaults to the
+            configured kill timeout
 
         :returns: command line as a string
 
@@ -230,7 +467,7 @@ class MinidumpStackwalkRule(Rule):
 
         params = {
             # These come from config
-            "kill_timeout": self.kill_timeout,
+            "kill_timeout": kill_timeout or self.kill_timeout,
             "command_path": self.command_path,
             "symbol_cache_path": self.symbol_cache_path,
             "symbol_tmp_path": self.symbol_tmp_path,
@@ -241,12 +478,140 @@ class MinidumpStackwalkRule(Rule):
         }
         return self.command_line.format(**params)
 
-    def run_stackwalker(
-        self, crash_id, command_path, command_line, processor_meta_data
+    def parse_output(self, fp):
+        """Parses stackwalker output
+
+        Emits:
+
+        * ``processor.minidumpstackwalk.output_bytes``: histogram of the size of
+          the output
+        * ``processor.minidumpstackwalk.parse_timing``: time it took to parse the
+          output tagged with the parser; this doesn't include reading the output
+        * ``processor.minidumpstackwalk.read_timing``: time spent reading the
+          output; when streaming, this is mostly waiting on the stackwalker
+
+        If the output can't be parsed, the beginning of it is logged at debug
+        level.
+
+        :param fp: binary file object with the output
+
+        :returns: dict with "data" and "error" keys where "data" is the parsed
+            output or None and "error" is the exception if it couldn't be parsed
+
+        """
+        reader = CountingReader(fp)
+        start_time = time.perf_counter()
+        parser = "unknown"
+        try:
+            data, parser = parse_json_stream(reader, incremental=self.stream_output)
+            ret = {"data": data, "error": None}
+        except Exception as exc:
+            ret = {"data": None, "error": exc}
+            self.logger.debug(
+                "unparseable stackwalker output (first %s bytes): %r",
+                len(reader.prefix),
+                bytes(reader.prefix),
+            )
+
+        total_time = time.perf_counter() - start_time
+        self.metrics.timing(
+            "parse_timing",
+            value=(total_time - reader.read_time) * 1000,
+            tags=[f"parser:{parser}"],
+        )
+        self.metrics.timing("read_timing", value=reader.read_time * 1000)
+        self.metrics.histogram("output_bytes", value=reader.bytes_read)
+        return ret
+
+    def execute_stackwalker(
+        self, dump_file_path, raw_crash_path, stdout_handler, kill_timeout=None
     ):
+        """Runs the stackwalker on a minidump
+
+        :param dump_file_path: the absolute path to the dump file to parse
+        :param raw_crash_path: the absolute path to the crash annotations file
+        :param stdout_handler: function that takes a binary file object of the
+            stackwalker output and returns the parsed output
+        :param kill_timeout: the kill timeout in seconds; defaults to the
+            configured kill timeout
+
+        :returns: dict with "output", "stderr", and "returncode" keys where "output"
+            is what stdout_handler returned
+
+        """
+        command_line = self.expand_commandline(
+            dump_file_path=dump_file_path,
+            raw_crash_path=raw_crash_path,
+            kill_timeout=kill_timeout,
+        )
+        if self.stream_output:
+            return execute_process_streaming(command_line, stdout_handler)
         ret = execute_process(command_line)
+
+        stdout = ret.pop("stdout")
+        ret["output"] = stdout_handler(io.BytesIO(stdout)) if stdout else None
+        return ret
+
+    def emit_symbols_metrics(self, output):
+        """Emits metrics about the symbols the stackwalker used
+
+        The stackwalker says which modules' symbols came from the symbols cache
+        and which were downloaded.
+
+        Emits:
+
+        * ``processor.minidumpstackwalk.symbols_cache_hits``: histogram of modules
+          per stackwalk with symbols from the symbols cache
+        * ``processor.minidumpstackwalk.symbols_downloads``: histogram of modules
+          per stackwalk with symbols that were downloaded
+        * ``processor.minidumpstackwalk.symbols_missing``: histogram of modules
+          per stackwalk without symbols
+        * ``processor.minidumpstackwalk.symbols_fetch_time``: histogram of the
+          time spent fetching symbols per stackwalk in ms
+
+        :param output: the parsed stackwalker output
+
+        """
+        modules = output.get("modules")
+        if not modules or not isinstance(modules, list):
+            return
+
+        cache_hits = downloads = missing = 0
+        fetch_time = 0.0
+        for module in modules:
+            if not isinstance(module, Mapping):
+                continue
+            if module.get("missing_symbols"):
+                missing += 1
+            elif module.get("loaded_symbols"):
+                if module.get("symbol_disk_cache_hit"):
+                    cache_hits += 1
+                else:
+                    downloads += 1
+            fetch_time += module.get("symbol_fetch_time") or 0.0
+
+        self.metrics.histogram("symbols_cache_hits", value=cache_hits)
+        self.metrics.histogram("symbols_downloads", value=downloads)
+        self.metrics.histogram("symbols_missing", value=missing)
+        self.metrics.histogram("symbols_fetch_time", value=fetch_time)
+
+    def run_stackwalker(
+        self,
+        crash_id,
+        dump_file_path,
+        raw_crash_path,
+        processor_meta_data,
+        kill_timeout=None,
+    ):
+        command_path = self.command_path
+        ret = self.execute_stackwalker(
+            dump_file_path,
+            raw_crash_path,
+            stdout_handler=self.parse_output,
+            kill_timeout=kill_timeout,
+        )
         returncode = ret["returncode"]
-        stdout = ret["stdout"]
+        parsed = ret["output"] or {"data": None, "error": ValueError("no output")}
         stderr = ret["stderr"]
 
         # Decode stderr and truncate to 10 lines
@@ -256,17 +621,12 @@ class MinidumpStackwalkRule(Rule):
         output = {}
 
         if returncode == 0:
-            try:
-                output = json.loads(ret["stdout"])
-
-            except Exception as exc:
-                msg = f"{command_path}: non-json output: {exc}"
-                self.logger.debug(
-                    f"MinidumpStackwalkRule: {command_path}: non-json output: "
-                    f"{stdout[:1000]}"
-                )
+            if parsed["error"] is not None:
+                msg = f"{command_path}: non-json output: {parsed['error']}"
                 self.logger.error(msg)
                 processor_meta_data["processor_notes"].append(msg)
+            else:
+                output = parsed["data"] or {}
 
             if output and not isinstance(output, Mapping):
                 msg = (
@@ -277,6 +637,8 @@ class MinidumpStackwalkRule(Rule):
                 self.logger.warning(f"{msg} ({crash_id})")
                 output = {}
 
+        self.emit_symbols_metrics(output)
+
         # Add the stackwalk_version to the stackwalk output
         output["stackwalk_version"] = self.stackwalk_version
 
@@ -317,68 +679,276 @@ class MinidumpStackwalkRule(Rule):
 
         return stackwalker_data
 
-    def action(self, raw_crash, dumps, processed_crash, processor_meta_data):
-        crash_id = raw_crash["uuid"]
+    def stackwalk_slot(self):
+        """Returns a context manager that holds a slot for running a stackwalk"""
+        if self.stackwalk_slots is not None:
+            return self.stackwalk_slots.slot()
+        return self.stackwalk_semaphore or nullcontext()
 
-        processed_crash.setdefault("additional_minidumps", [])
+    def stackwalk_dump(
+        self,
+        crash_id,
+        dump_name,
+        dump_file_path,
+        raw_crash_path,
+        annotations_sha256=None,
+    ):
+        """Runs the stackwalker on one minidump
+
+        If there's a cache, this uses the cached result if there is one.
+
+        Emits:
+
+        * ``processor.minidumpstackwalk.cache``: a cache lookup tagged with
+          ``result:hit`` or ``result:miss``
+        * ``processor.minidumpstackwalk.cache_error``: an error using the cache
+          tagged with ``op:get`` or ``op:put``
+        * ``processor.minidumpstackwalk.kill_timeout``: histogram of the kill
+          timeout in seconds the stackwalk got
+        * ``processor.minidumpstackwalk.killed_time``: timing of stackwalks that
+          got killed
+        * ``processor.minidumpstackwalk.quarantine``: a quarantined minidump
+          tagged with ``result:skipped`` or ``result:slow_lane``, or a minidump
+          that was killed and quarantined tagged with ``result:added``
+
+        :param crash_id: the crash id
+        :param dump_name: the name of the minidump
+        :param dump_file_path: the absolute path to the minidump
+        :param raw_crash_path: the absolute path to the crash annotations file
+        :param annotations_sha256: hex sha256 of the crash annotations file; this
+            is required if there's a cache
 
-        with tmp_raw_crash_file(self.tmp_path, raw_crash, crash_id) as raw_crash_path:
-            for dump_name, dump_file_path in dumps.items():
-                # This rule only works on minidumps which the crash reporter prefixes
-                # with the value of dump_field (defaults to "upload_file_minidump")
-                if not dump_name.startswith(self.dump_field):
-                    continue
+        :returns: tuple of (stackwalker_data, processor notes)
+
+        """
+        processor_meta_data = {"processor_notes": []}
+
+        file_size = os.path.getsize(dump_file_path)
+        if file_size == 0:
+            # If the dump file is empty (0-bytes), then we don't want to bother
+            # running minidump-stackwalker.
+            #
+            # This is a bad case, so we want to add a note. However, since this
+            # is a shortcut, we also include some stackwalker_data.
+            stackwalker_data = {
+                "mdsw_status_string": "EmptyMinidump",
+                "mdsw_stderr": "Shortcut for 0-bytes minidump.",
+            }
 
-                file_size = os.path.getsize(dump_file_path)
-                if file_size == 0:
-                    # If the dump file is empty (0-bytes), then we don't want to bother
-                    # running minidump-stackwalker.
-                    #
-                    # This is a bad case, so we want to add a note. However, since this
-                    # is a shortcut, we also include some stackwalker_data.
+            processor_meta_data["processor_notes"].append(
+                f"MinidumpStackwalkRule: {dump_name} is empty--skipping "
+                + "minidump processing"
+            )
+            return stackwalker_data, processor_meta_data["processor_notes"]
+
+        minidump_sha256 = None
+        if self.cache is not None or self.quarantine is not None:
+            minidump_sha256 = sha256_file(dump_file_path)
+
+        cache_key = None
+        stackwalker_data = None
+        if self.cache is not None:
+            cache_key = StackwalkCache.build_key(
+                minidump_sha256=minidump_sha256,
+                annotations_sha256=annotations_sha256,
+                stackwalk_version=self.stackwalk_version,
+                symbols_generation=self.symbols_generation,
+            )
+            cached = self.get_cached_result(cache_key)
+            if cached is not None:
+                stackwalker_data = cached["stackwalker_data"]
+                processor_meta_data["processor_notes"].extend(cached["processor_notes"])
+                self.emit_symbols_metrics(stackwalker_data.get("json_dump") or {})
+
+        if stackwalker_data is None:
+            kill_timeout = self.kill_timeout
+            if self.quarantine is not None and minidump_sha256 in self.quarantine:
+                if self.quarantine_kill_timeout <= 0:
+                    self.metrics.incr("quarantine", tags=["result:skipped"])
                     stackwalker_data = {
-                        "mdsw_status_string": "EmptyMinidump",
-                        "mdsw_stderr": "Shortcut for 0-bytes minidump.",
+                        "mdsw_status_string": "Quarantined",
+                        "mdsw_stderr": "Shortcut for quarantined minidump.",
                     }
-
                     processor_meta_data["processor_notes"].append(
-                        f"MinidumpStackwalkRule: {dump_name} is empty--skipping "
-                        + "minidump processing"
+                        f"MinidumpStackwalkRule: {dump_name} was killed before "
+                        + "and is quarantined--skipping minidump processing"
                     )
+                    return stackwalker_data, processor_meta_data["processor_notes"]
+
+                self.metrics.incr("quarantine", tags=["result:slow_lane"])
+                kill_timeout = self.quarantine_kill_timeout
+
+            elif self.budget is not None:
+                kill_timeout = self.budget.get_kill_timeout(file_size)
+
+            self.metrics.histogram("kill_timeout", value=kill_timeout)
+            with self.stackwalk_slot():
+                start_time = time.perf_counter()
+                stackwalker_data = self.run_stackwalker(
+                    crash_id=crash_id,
+                    dump_file_path=dump_file_path,
+                    raw_crash_path=raw_crash_path,
+                    processor_meta_data=processor_meta_data,
+                    kill_timeout=kill_timeout,
+                )
+                duration = time.perf_counter() - start_time
+
+            # timeout exits with 124 when it kills the stackwalker
+            if stackwalker_data["mdsw_return_code"] == 124:
+                self.metrics.timing("killed_time", value=duration * 1000)
+                if self.quarantine is not None:
+                    try:
+                        self.quarantine.add(minidump_sha256)
+                        self.metrics.incr("quarantine", tags=["result:added"])
+                    except OSError:
+                        self.logger.exception("error quarantining %s", dump_name)
+            elif self.budget is not None and stackwalker_data["success"]:
+                self.budget.record(file_size, duration)
+
+            # Only cache results that worked; failures might be because of a
+            # timeout or some other problem that won't happen next time
+            if cache_key is not None and stackwalker_data["success"]:
+                self.put_cached_result(
+                    cache_key,
+                    {
+                        "stackwalker_data": stackwalker_data,
+                        "processor_notes": processor_meta_data["processor_notes"],
+                    },
+                )
 
-                else:
-                    command_line = self.expand_commandline(
-                        dump_file_path=dump_file_path,
-                        raw_crash_path=raw_crash_path,
-                    )
+        stderr = stackwalker_data.get("mdsw_stderr", "").strip()
+        if stderr:
+            if stderr.startswith("[ERROR]"):
+                indicator = stderr.split(" ")[1]
+            else:
+                indicator = ""
+
+            status_string = stackwalker_data.get("mdsw_status_string", "")
+            if indicator and status_string in ["OK", "unknown error"]:
+                stackwalker_data["mdsw_status_string"] = indicator
+                processor_meta_data["processor_notes"].append(
+                    f"MinidumpStackwalkRule: processing {dump_name} had error; "
+                    + "stomped on mdsw_status_string"
+                )
+
+        return stackwalker_data, processor_meta_data["processor_notes"]
+
+    def get_cached_result(self, cache_key):
+        """Returns the cached result for a stackwalk or None
+
+        :returns: dict with ``stackwalker_data`` and ``processor_notes`` or None
+
+        """
+        try:
+            cached = self.cache.get(cache_key)
+        except OSError:
+            self.logger.exception("error reading stackwalk cache")
+            self.metrics.incr("cache_error", tags=["op:get"])
+            return None
+
+        self.metrics.incr(
+            "cache", tags=["result:%s" % ("miss" if cached is None else "hit")]
+        )
+        return cached
+
+    def put_cached_result(self, cache_key, cached):
+        """Adds a stackwalk result to the cache"""
+        try:
+            self.cache.put(cache_key, cached)
+        except OSError:
+            self.logger.exception("error writing stackwalk cache")
+            self.metrics.incr("cache_error", tags=["op:put"])
+
+    def action(self, raw_crash, dumps, processed_crash, processor_meta_data):
+        crash_id = raw_crash["uuid"]
+
+        processed_crash.setdefault("additional_minidumps", [])
 
-                    stackwalker_data = self.run_stackwalker(
-                        crash_id=crash_id,
-                        command_path=self.command_path,
-                        command_line=command_line,
-                        processor_meta_data=processor_meta_data,
+        # This rule only works on minidumps which the crash reporter prefixes with
+        # the value of dump_field (defaults to "upload_file_minidump")
+        minidumps = [
+            (dump_name, dump_file_path)
+            for dump_name, dump_file_path in dumps.items()
+            if dump_name.startswith(self.dump_field)
+        ]
+
+        with tmp_raw_crash_file(self.tmp_path, raw_crash, crash_id) as raw_crash_path:
+            annotations_sha256 = None
+            if self.cache is not None:
+                annotations_sha256 = sha256_file(raw_crash_path)
+
+            if self.executor is not None and len(minidumps) > 1:
+                futures = [
+                    self.executor.submit(
+                        self.stackwalk_dump,
+                        crash_id,
+                        dump_name,
+                        dump_file_path,
+                        raw_crash_path,
+                        annotations_sha256,
                     )
+                    for dump_name, dump_file_path in minidumps
+                ]
+                # Results are merged in dumps order regardless of which
+                # stackwalk finished first
+                results = [future.result() for future in futures]
+            else:
+                results = [
+                    self.stackwalk_dump(
+                        crash_id,
+                        dump_name,
+                        dump_file_path,
+                        raw_crash_path,
+                        annotations_sha256,
+                    )
+                    for dump_name, dump_file_path in minidumps
+                ]
 
-                    stderr = stackwalker_data.get("mdsw_stderr", "").strip()
-                    if stderr:
-                        if stderr.startswith("[ERROR]"):
-                            indicator = stderr.split(" ")[1]
-                        else:
-                            indicator = ""
+        for (dump_name, _), (stackwalker_data, notes) in zip(minidumps, results):
+            processor_meta_data["processor_notes"].extend(notes)
 
-                        status_string = stackwalker_data.get("mdsw_status_string", "")
-                        if indicator and status_string in ["OK", "unknown error"]:
-                            stackwalker_data["mdsw_status_string"] = indicator
-                            processor_meta_data["processor_notes"].append(
-                                f"MinidumpStackwalkRule: processing {dump_name} had error; "
-                                + "stomped on mdsw_status_string"
-                            )
+            if dump_name == self.dump_field:
+                processed_crash.update(stackwalker_data)
 
-                if dump_name == self.dump_field:
-                    processed_crash.update(stackwalker_data)
+            else:
+                if dump_name not in processed_crash["additional_minidumps"]:
+                    processed_crash["additional_minidumps"].append(dump_name)
+                processed_crash.setdefault(dump_name, {})
+                processed_crash[dump_name].update(stackwalker_data)
 
-                else:
-                    if dump_name not in processed_crash["additional_minidumps"]:
-                        processed_crash["additional_minidumps"].append(dump_name)
-                    processed_crash.setdefault(dump_name, {})
-                    processed_crash[dump_name].update(stackwalker_data)
+        if self.modules_log_path:
+            self.log_modules(
+                [stackwalker_data.get("json_dump") for stackwalker_data, _ in results]
+            )
+
+    def log_modules(self, json_dumps):
+        """Appends the modules that had symbols loaded to the modules log
+
+        The log has a line for every crash. Each line is a ``;``-separated list
+        of ``debug_file/debug_id`` values.
+
+        :param json_dumps: list of stackwalker output for the crash's minidumps
+
+        """
+        modules = set()
+        for json_dump in json_dumps:
+            if not json_dump or not isinstance(json_dump.get("modules"), list):
+                continue
+            for module in json_dump["modules"]:
+                if not isinstance(module, Mapping) or not module.get("loaded_symbols"):
+                    continue
+                debug_file = module.get("debug_file")
+                debug_id = module.get("debug_id")
+                if debug_file and debug_id:
+                    modules.add(f"{debug_file}/{debug_id}")
+        if not modules:
+            return
+
+        # Processors on the node append to the same file; a single write to a
+        # file opened for appending doesn't get interleaved with other writes
+        line = ";".join(sorted(modules)) + "\n"
+        try:
+            with open(self.modules_log_path, "a") as fp:
+                fp.write(line)
+        except OSError:
+            self.logger.exception("error writing to modules log")
@@ -0,0 +1,152 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Time budgets for stackwalking minidumps.
+
+A handful of pathological minidumps take the stackwalker a very long time and
+get killed after ``kill_timeout`` seconds. While that's happening, the processor
+isn't processing anything else.
+
+``StackwalkBudget`` keeps track of how long the stackwalker took for recent
+minidumps of similar size and gives each minidump a kill timeout that's a
+multiple of that rather than the same ``kill_timeout`` for everything.
+
+``StackwalkQuarantine`` keeps track of minidumps that got killed so they can be
+skipped or given a different kill timeout the next time they're stackwalked.
+
+"""
+
+import collections
+import math
+import os
+import threading
+import time
+
+
+class StackwalkBudget:
+    """Computes kill timeouts for stackwalks from recent durations
+
+    Minidumps are grouped into size buckets by powers of 2 MiB. When a bucket has
+    at least ``min_samples`` recent durations, the kill timeout for a minidump in
+    that bucket is ``multiplier`` times the 99th percentile of them, but never
+    less than ``min_kill_timeout`` or more than ``max_kill_timeout``. Otherwise
+    it's ``max_kill_timeout``.
+
+    :arg max_kill_timeout: the most seconds a stackwalk gets
+    :arg min_kill_timeout: the fewest seconds a stackwalk gets
+    :arg multiplier: the multiple of historical durations a stackwalk gets
+    :arg history_size: the number of durations to keep per size bucket
+    :arg min_samples: the number of durations a size bucket needs before it's used
+
+    """
+
+    def __init__(
+        self,
+        max_kill_timeout,
+        min_kill_timeout,
+        multiplier,
+        history_size=200,
+        min_samples=20,
+    ):
+        self.max_kill_timeout = max_kill_timeout
+        self.min_kill_timeout = min(min_kill_timeout, max_kill_timeout)
+        self.multiplier = multiplier
+        self.history_size = history_size
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        # bucket -> deque of durations in seconds
+        self._durations = collections.defaultdict(
+            lambda: collections.deque(maxlen=self.history_size)
+        )
+
+    @staticmethod
+    def get_bucket(file_size):
+        """Returns the size bucket for a minidump file size in bytes"""
+        size_mib = file_size / (1024 * 1024)
+        if size_mib <= 1:
+            return 0
+        return math.ceil(math.log2(size_mib))
+
+    def record(self, file_size, duration):
+        """Records how long a successful stackwalk took
+
+        :arg file_size: the size of the minidump in bytes
+        :arg duration: the seconds the stackwalk took
+
+        """
+        with self._lock:
+            self._durations[self.get_bucket(file_size)].append(duration)
+
+    def get_kill_timeout(self, file_size):
+        """Returns the kill timeout for a minidump
+
+        :arg file_size: the size of the minidump in bytes
+
+        :returns: kill timeout in seconds as an int
+
+        """
+        with self._lock:
+            durations = sorted(self._durations.get(self.get_bucket(file_size), []))
+
+        if len(durations) < self.min_samples:
+            return self.max_kill_timeout
+
+        p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+        kill_timeout = math.ceil(p99 * self.multiplier)
+        return max(self.min_kill_timeout, min(self.max_kill_timeout, kill_timeout))
+
+
+class StackwalkQuarantine:
+    """Directory of minidump hashes that got killed
+
+    There's an empty file for every minidump named with the sha256 of the
+    minidump. Processors on a node can share the directory. Entries older than
+    ``ttl`` seconds are ignored and removed.
+
+    :arg path: the directory to keep entries in
+    :arg ttl: seconds an entry lasts
+
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(self.path, exist_ok=True)
+
+    def _filepath(self, minidump_sha256):
+        return os.path.join(self.path, minidump_sha256)
+
+    def __contains__(self, minidump_sha256):
+        filepath = self._filepath(minidump_sha256)
+        try:
+            mtime = os.path.getmtime(filepath)
+        except FileNotFoundError:
+            return False
+
+        if time.time() - mtime > self.ttl:
+            try:
+                os.unlink(filepath)
+            except FileNotFoundError:
+                pass
+            return False
+        return True
+
+    def add(self, minidump_sha256):
+        """Adds a minidump to the quarantine
+
+        :arg minidump_sha256: hex sha256 of the minidump
+
+        """
+        with open(self._filepath(minidump_sha256), "wb"):
+            pass
+
+    def __len__(self):
+        return len(
+            [
+                entry
+                for entry in os.scandir(self.path)
+                if entry.is_file() and time.time() - entry.stat().st_mtime <= self.ttl
+            ]
+        )
@@ -0,0 +1,121 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Cache of stackwalker results.
+
+Stackwalking a minidump gives the same result as long as the minidump, the crash
+annotations, the stackwalker, and the symbols are the same. When crashes get
+reprocessed, that's usually the case, so the processor can keep the stackwalker
+results in a cache and skip running the stackwalker.
+
+Results are keyed on:
+
+* the sha256 of the minidump
+* the sha256 of the crash annotations
+* the stackwalker version
+* the symbols generation--a value that's changed to throw out results when the
+  symbols change
+
+The cache is a directory of JSON files kept with a ``DiskObjectCache``. When the
+files add up to more than the maximum size, the least recently used files are
+removed. The size is figured by scanning the directory, so several processes on
+a node can share it.
+
+"""
+
+import hashlib
+import logging
+import os
+
+from socorro.external.boto.object_cache import DiskObjectCache, TMP_FILE_SUFFIX
+from socorro.lib.libjson import deserialize_json, serialize_json
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Returns the hex sha256 of the contents of a file"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class StackwalkCache:
+    """Disk cache of stackwalker results with LRU eviction
+
+    :arg path: the directory to keep results in
+    :arg max_size: the maximum size of the cache in bytes
+
+    """
+
+    def __init__(self, path, max_size):
+        self.logger = logging.getLogger(__name__ + "." + self.__class__.__name__)
+        self.path = path
+        self.max_size = max_size
+        self._cache = DiskObjectCache(path=path, max_size=max_size)
+
+    @staticmethod
+    def build_key(
+        minidump_sha256, annotations_sha256, stackwalk_version, symbols_generation
+    ):
+        """Returns the cache key for a stackwalk
+
+        :arg minidump_sha256: hex sha256 of the minidump
+        :arg annotations_sha256: hex sha256 of the crash annotations file
+        :arg stackwalk_version: the stackwalker version
+        :arg symbols_generation: the symbols generation
+
+        :returns: str
+
+        """
+        key = "\n".join(
+            [minidump_sha256, annotations_sha256, stackwalk_version, symbols_generation]
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached result for a key or None
+
+        :arg key: the cache key from ``build_key``
+
+        :returns: the result or None if there isn't one
+
+        :raises OSError: if the cache directory can't be read
+
+        """
+        payload = self._cache.get(key)
+        if payload is None:
+            return None
+
+        try:
+            return deserialize_json(payload)
+        except ValueError:
+            self.logger.warning("removing unparseable stackwalk cache file %s", key)
+            self._cache.remove(key)
+            return None
+
+    def put(self, key, data):
+        """Adds a result to the cache and evicts results if it's too big
+
+        :arg key: the cache key from ``build_key``
+        :arg data: the JSON-serializable result
+
+        :raises OSError: if the cache directory can't be written to
+
+        """
+        self._cache.put(key, serialize_json(data))
+
+    @property
+    def size(self):
+        """The size of the cache in bytes as of the last scan plus what's been added"""
+        return self._cache.size
+
+    def __len__(self):
+        return len(
+            [
+                entry
+                for entry in os.scandir(self.path)
+                if entry.is_file() and not entry.name.endswith(TMP_FILE_SUFFIX)
+            ]
+        )
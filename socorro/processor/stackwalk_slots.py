@@ -0,0 +1,90 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Node-wide limit on the number of stackwalkers running at once.
+
+A node runs several processors and each can stackwalk several minidumps at the
+same time. ``StackwalkSlots`` limits how many stackwalkers run at once across all
+of them so they don't fight over CPU and memory.
+
+There's a slot file for every stackwalk that can run at once. A stackwalk runs
+while holding an exclusive ``flock`` on one of them. Processors on a node share
+the directory. If a processor dies, the kernel releases its locks, so slots are
+never leaked.
+
+"""
+
+from contextlib import contextmanager
+import fcntl
+import os
+import random
+import threading
+import time
+
+
+class StackwalkSlots:
+    """Counting semaphore shared by processes on a node
+
+    :arg path: the directory to keep slot files in
+    :arg slots: the number of stackwalks that can run at once
+    :arg poll_interval: seconds to wait between tries when all slots are taken
+
+    """
+
+    def __init__(self, path, slots, poll_interval=0.1):
+        self.path = path
+        self.slots = slots
+        self.poll_interval = poll_interval
+        # Threads in this process wait here rather than polling for slots this
+        # process' other threads hold
+        self._local_semaphore = threading.BoundedSemaphore(slots)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _filepath(self, index):
+        return os.path.join(self.path, f"slot-{index}")
+
+    def _try_slot(self, index):
+        """Returns a file descriptor holding the slot or None if it's taken"""
+        fd = os.open(self._filepath(index), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def acquire(self):
+        """Waits for a free slot and takes it
+
+        :returns: a file descriptor to pass to ``release``
+
+        """
+        self._local_semaphore.acquire()
+        try:
+            while True:
+                # Start at a random slot so processes don't all try the same one
+                start = random.randrange(self.slots)
+                for offset in range(self.slots):
+                    fd = self._try_slot((start + offset) % self.slots)
+                    if fd is not None:
+                        return fd
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self._local_semaphore.release()
+            raise
+
+    def release(self, fd):
+        """Frees the slot held by a file descriptor from ``acquire``"""
+        # Closing the file descriptor releases the lock
+        os.close(fd)
+        self._local_semaphore.release()
+
+    @contextmanager
+    def slot(self):
+        """Context manager that holds a slot"""
+        fd = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(fd)
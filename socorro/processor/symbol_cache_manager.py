@@ -2,13 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
-from collections import OrderedDict
+from collections import deque, OrderedDict
+import fcntl
+import json
 import logging
 import os
 import sys
 import tempfile
+import threading
+import time
 
 from configman import Namespace, RequiredConfig
+import markus
 
 
 if os.uname()[0] != "Linux":
@@ -38,6 +43,14 @@ else:
     from pyinotify import ProcessEvent
 
 
+# The index and lock files are in the cache directory by default
+INDEX_FILENAME = ".symbol_cache_index.json"
+LOCK_FILENAME = ".symbol_cache_manager.lock"
+
+EVENT_UPDATE = "update"
+EVENT_REMOVE = "remove"
+
+
 class EventHandler(ProcessEvent):
     def __init__(self, monitor, verbosity=0):
         pyinotify.ProcessEvent.__init__(self)
@@ -119,7 +132,47 @@ def from_string_to_parse_size(size_as_string):
 
 
 class SymbolLRUCacheManager(RequiredConfig):
-    """for cleaning up the symbols cache"""
+    """for cleaning up the symbols cache
+
+    The manager keeps an index of the files in the cache with their sizes in
+    least recently used order. pyinotify event handlers only queue up events; a
+    manager thread applies the queued events to the index every
+    ``eviction_interval`` seconds. If the cache is bigger than
+    ``symbol_cache_size``, the manager removes least recently used files until
+    it's down to ``eviction_low_watermark`` of that.
+
+    The index is saved to ``index_path`` every ``index_save_interval`` seconds
+    and when the manager is closed, so a restart keeps the least recently used
+    order. inotify only watches single directories, so when the manager starts
+    managing the cache, the manager thread walks the cache once to watch every
+    directory. While it's walking, it reconciles the index with the files it
+    finds: files that aren't in the index are added as the least recently used
+    in modification time order, entries for files that are gone are dropped,
+    and sizes are updated. That happens while the processor starts up rather
+    than before.
+
+    Several processors on a node--in separate containers, for example--can share
+    one symbols cache directory. Each runs a manager, but only the manager that
+    holds an exclusive lock on ``lock_path`` watches and evicts files; the others
+    try to take over every ``eviction_interval`` seconds. inotify sees files
+    opened by every process on the node, so the owner's index covers all of the
+    processors. The lock is released when the owner exits, so another manager
+    takes over if the owner's processor goes away. The lock uses ``flock``, so
+    the directory must be on a local filesystem.
+
+    Emits:
+
+    * ``processor.symbol_cache.owner``: gauge of whether this manager is managing
+      the cache (1) or waiting for another manager to go away (0)
+    * ``processor.symbol_cache.size``: gauge of the size of the cache in bytes
+    * ``processor.symbol_cache.files``: gauge of the number of files in the cache
+    * ``processor.symbol_cache.evicted_files``: number of files evicted
+    * ``processor.symbol_cache.evicted_bytes``: number of bytes evicted
+    * ``processor.symbol_cache.evicted_recently_used``: number of evicted files
+      that were used within ``recently_used_window`` seconds; if this is high,
+      the cache is too small
+
+    """
 
     required_config = Namespace()
     required_config.add_option(
@@ -139,6 +192,52 @@ class SymbolLRUCacheManager(RequiredConfig):
         default=0,
         from_string_converter=int,
     )
+    required_config.add_option(
+        "index_path",
+        doc=(
+            "the file to save the cache index to so it survives restarts; defaults "
+            "to a file in symbol_cache_path"
+        ),
+        default="",
+    )
+    required_config.add_option(
+        "lock_path",
+        doc=(
+            "the file to lock so only one manager manages a symbol cache shared by "
+            "several processors; defaults to a file in symbol_cache_path"
+        ),
+        default="",
+    )
+    required_config.add_option(
+        "eviction_interval",
+        doc="seconds between applying file events and evicting files",
+        default=10.0,
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "eviction_low_watermark",
+        doc=(
+            "when the cache is bigger than symbol_cache_size, files are evicted until "
+            "it's this fraction of symbol_cache_size"
+        ),
+        default=0.9,
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "index_save_interval",
+        doc="seconds between saving the cache index",
+        default=300.0,
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "recently_used_window",
+        doc=(
+            "seconds; evicting a file that was used within this long is counted as "
+            "thrashing"
+        ),
+        default=600.0,
+        from_string_converter=float,
+    )
 
     def __init__(self, config):
         """constructor for a registration object that runs an LRU cache
@@ -148,15 +247,100 @@ class SymbolLRUCacheManager(RequiredConfig):
 
         self.directory = os.path.abspath(config.symbol_cache_path)
         self.max_size = config.symbol_cache_size
+        self.low_watermark_size = int(self.max_size * config.eviction_low_watermark)
         self.verbosity = config.verbosity
-        # Cache state
+        self.index_path = os.path.abspath(
+            config.index_path or os.path.join(self.directory, INDEX_FILENAME)
+        )
+        self.lock_path = os.path.abspath(
+            config.lock_path or os.path.join(self.directory, LOCK_FILENAME)
+        )
+        self.eviction_interval = config.eviction_interval
+        self.index_save_interval = config.index_save_interval
+        self.recently_used_window = config.recently_used_window
+        self.metrics = markus.get_metrics("processor.symbol_cache")
+
+        # Cache state; this is only changed by the manager thread
         self.total_size = 0
         self._lru = OrderedDict()
+        # path -> monotonic time the file was last used while the manager was
+        # running
+        self._last_used = {}
+        # Events queued by the event handler; deque appends and pops are
+        # thread-safe
+        self._events = deque()
+        # Set when the cache has been walked and the index reconciled
+        self._reconciled = threading.Event()
+        self._last_index_save = time.monotonic()
+        self._notifier = None
+        self.closed = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fp = open(self.lock_path, "a")
+        self.is_owner = False
+        if self._acquire_lock():
+            self._start_managing()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="SymbolLRUCacheManager", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def num_files(self):
+        return len(self._lru)
+
+    def _rm_empty_dirs(self, path):
+        """
+        Attempt to remove any empty directories that are parents of path
+        and children of self.directory.
+        """
+        path = os.path.dirname(path)
+        try:
+            while not os.path.samefile(path, self.directory):
+                if not os.listdir(path):
+                    os.rmdir(path)
+                path = os.path.dirname(path)
+        except OSError:
+            # Something else created or removed files in the meantime
+            pass
+
+    def _is_index_file(self, path):
+        return (
+            path == self.index_path
+            or path.startswith(self.index_path + ".")
+            or path == self.lock_path
+        )
+
+    def _acquire_lock(self):
+        """Tries to become the manager that manages the cache
+
+        :returns: True if this manager got the lock
+
+        """
+        try:
+            fcntl.flock(self._lock_fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _start_managing(self):
+        """Loads the index and starts watching the cache"""
+        self.is_owner = True
+        self.logger.info("managing symbol cache %s", self.directory)
+        # Events from before this manager was the owner aren't in the index
+        self._events.clear()
+        self._load_index()
+        self._last_index_save = time.monotonic()
+
         # pyinotify bits
         self._wm = pyinotify.WatchManager()
-        self._handler = EventHandler(self, verbosity=config.verbosity)
+        self._handler = EventHandler(self, verbosity=self.verbosity)
         self._notifier = pyinotify.ThreadedNotifier(self._wm, self._handler)
-        mask = (
+        # Don't keep the process alive if the manager isn't closed
+        self._notifier.daemon = True
+        self._mask = (
             pyinotify.IN_DELETE
             | pyinotify.IN_CREATE
             | pyinotify.IN_OPEN
@@ -164,67 +348,248 @@ class SymbolLRUCacheManager(RequiredConfig):
             | pyinotify.IN_MOVED_TO
             | pyinotify.IN_MODIFY
         )
-        self._wdd = self._wm.add_watch(self.directory, mask, rec=True, auto_add=True)
-        # Load existing files into the cache.
-        self._get_existing_files(self.directory)
+        # Directories are watched by _watch_and_reconcile in the manager thread
         self._notifier.start()
 
-    @property
-    def num_files(self):
-        return len(self._lru)
+    def _update_cache(self, path, update_size=False):
+        """Queues a file that was created, opened, or modified"""
+        self._events.append((EVENT_UPDATE, path, update_size))
+
+    def _remove_cached(self, path):
+        """Queues a file that was removed"""
+        self._events.append((EVENT_REMOVE, path, False))
+
+    def process_events(self):
+        """Applies the queued file events to the index
+
+        :returns: the number of events applied
 
-    def _rm_empty_dirs(self, path):
-        """
-        Attempt to remove any empty directories that are parents of path
-        and children of self.directory.
         """
-        path = os.path.dirname(path)
-        while not os.path.samefile(path, self.directory):
-            if not os.listdir(path):
-                os.rmdir(path)
-            path = os.path.dirname(path)
+        count = 0
+        while True:
+            try:
+                event, path, update_size = self._events.popleft()
+            except IndexError:
+                break
+            count += 1
+            if self._is_index_file(path):
+                continue
+
+            if event == EVENT_REMOVE:
+                # We might have already removed this file when evicting
+                if path in self._lru:
+                    self.total_size -= self._lru.pop(path)
+                    self._last_used.pop(path, None)
+                continue
+
+            self._last_used[path] = time.monotonic()
+            if path in self._lru:
+                self._lru.move_to_end(path)
+                if not update_size:
+                    continue
+                self.total_size -= self._lru.pop(path)
 
-    def _update_cache(self, path, update_size=False):
-        if path in self._lru:
-            size = self._lru.pop(path)
-            if update_size:
-                self.total_size -= size
-        else:
-            update_size = True
-
-        if update_size:
             try:
                 size = os.stat(path).st_size
             except OSError:
                 self.logger.warning("file was not found while cleaning cache: %s", path)
-                return
-
+                self._last_used.pop(path, None)
+                continue
             self.total_size += size
-            # If we're out of space, remove items from the cache until
-            # we fit again.
-            while self.total_size > self.max_size and self._lru:
-                rm_path, rm_size = self._lru.popitem(last=False)
-                self.total_size -= rm_size
+            self._lru[path] = size
+        return count
+
+    def get_protected_paths(self):
+        """Returns the set of paths that shouldn't be evicted
+
+        Subclasses can override this to keep files in the cache.
+
+        """
+        return set()
+
+    def evict(self):
+        """Evicts least recently used files if the cache is over the maximum size
+
+        Protected files are skipped and become the most recently used.
+
+        :returns: list of (path, size) tuples for the evicted files
+
+        """
+        evicted = []
+        if self.total_size <= self.max_size:
+            return evicted
+
+        protected_paths = self.get_protected_paths()
+        skipped = []
+        recently_used_cutoff = time.monotonic() - self.recently_used_window
+        recently_used = 0
+        while self.total_size > self.low_watermark_size and self._lru:
+            rm_path, rm_size = self._lru.popitem(last=False)
+            if rm_path in protected_paths:
+                skipped.append((rm_path, rm_size))
+                continue
+            self.total_size -= rm_size
+            last_used = self._last_used.pop(rm_path, None)
+            if last_used is not None and last_used >= recently_used_cutoff:
+                recently_used += 1
+            try:
                 os.unlink(rm_path)
-                self._rm_empty_dirs(rm_path)
-                if self.verbosity >= 2:
-                    self.logger.debug("RM %s", rm_path)
-        self._lru[path] = size
+            except FileNotFoundError:
+                pass
+            self._rm_empty_dirs(rm_path)
+            evicted.append((rm_path, rm_size))
+            if self.verbosity >= 2:
+                self.logger.debug("RM %s", rm_path)
 
-    def _remove_cached(self, path):
-        # We might have already removed this file in _update_cache.
-        if path in self._lru:
-            size = self._lru.pop(path)
-            self.total_size -= size
+        for path, size in skipped:
+            self._lru[path] = size
 
-    def _get_existing_files(self, path):
-        for base, dirs, files in os.walk(path):
-            for f in files:
-                f = os.path.join(base, f)
-                self._update_cache(f)
+        self.metrics.incr("evicted_files", value=len(evicted))
+        self.metrics.incr("evicted_bytes", value=sum(size for _, size in evicted))
+        if recently_used:
+            self.metrics.incr("evicted_recently_used", value=recently_used)
+        return evicted
+
+    def _load_index(self):
+        """Loads the saved index
+
+        :returns: True if there was an index to load
+
+        """
+        try:
+            with open(self.index_path, "r") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            self.logger.warning("symbol cache index is corrupt: %s", self.index_path)
+            return False
+
+        for relpath, size in data["entries"]:
+            self._lru[os.path.join(self.directory, relpath)] = size
+            self.total_size += size
+        self.logger.info(
+            "loaded symbol cache index: %s files, %s bytes",
+            len(self._lru),
+            self.total_size,
+        )
+        return True
+
+    def save_index(self):
+        """Saves the index in least recently used order"""
+        data = {
+            "entries": [
+                [os.path.relpath(path, self.directory), size]
+                for path, size in self._lru.items()
+            ]
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(data, fp)
+        os.replace(tmp_path, self.index_path)
+        self._last_index_save = time.monotonic()
+
+    def _watch_and_reconcile(self):
+        """Watches every directory in the cache and reconciles the index with the
+        files in it
+
+        Each directory is watched before it's listed, so files that change while
+        this is walking the cache have events queued for them.
+
+        """
+        found = {}
+        dirs = [self.directory]
+        while dirs:
+            path = dirs.pop()
+            self._wm.add_watch(path, self._mask, auto_add=True)
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                # The directory was removed
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif not self._is_index_file(entry.path):
+                        stat = entry.stat(follow_symlinks=False)
+                        found[entry.path] = (stat.st_size, stat.st_mtime)
+                except OSError:
+                    continue
+
+        # Drop entries for files that are gone and update sizes
+        for path, size in list(self._lru.items()):
+            if path not in found:
+                self.total_size -= self._lru.pop(path)
+                self._last_used.pop(path, None)
+            else:
+                found_size, _ = found.pop(path)
+                self.total_size += found_size - size
+                self._lru[path] = found_size
+
+        # Add files that aren't in the index as the least recently used with the
+        # least recently modified first
+        new_files = sorted(
+            found.items(), key=lambda item: (item[1][1], item[0]), reverse=True
+        )
+        for path, (size, _) in new_files:
+            self._lru[path] = size
+            self._lru.move_to_end(path, last=False)
+            self.total_size += size
+
+        self.logger.info(
+            "reconciled symbol cache index: %s files, %s bytes",
+            len(self._lru),
+            self.total_size,
+        )
+        self._reconciled.set()
+
+    def run_once(self):
+        """Applies queued events, evicts files, and saves the index if it's time
+
+        If another manager is managing the cache, this tries to take over.
+
+        """
+        if not self.is_owner:
+            if not self._acquire_lock():
+                self.metrics.gauge("owner", value=0)
+                return
+            self._start_managing()
+            self._watch_and_reconcile()
+
+        self.metrics.gauge("owner", value=1)
+        self.process_events()
+        self.evict()
+        self.metrics.gauge("size", value=self.total_size)
+        self.metrics.gauge("files", value=self.num_files)
+        if time.monotonic() - self._last_index_save >= self.index_save_interval:
+            self.save_index()
+
+    def _run(self):
+        if self.is_owner:
+            try:
+                self._watch_and_reconcile()
+            except Exception:
+                self.logger.exception("error walking symbol cache")
+        while not self._stop.wait(self.eviction_interval):
+            try:
+                self.run_once()
+            except Exception:
+                self.logger.exception("error managing symbol cache")
 
     def close(self):
-        self._notifier.stop()
+        if self.closed:
+            return
+        self.closed = True
+        self._stop.set()
+        self._thread.join()
+        if self.is_owner:
+            self._notifier.stop()
+            self.process_events()
+            self.evict()
+            self.save_index()
+        # Closing the file releases the lock
+        self._lock_fp.close()
 
 
 class NoOpCacheManager(RequiredConfig):
@@ -0,0 +1,295 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Symbols cache manager that prefetches symbols for hot modules.
+
+When there's a new release, the first crashes for it all need symbols for the
+same modules (xul.dll, libxul.so, XUL, etc) and every processor downloads them.
+The ``SymbolPrefetchingCacheManager`` runs as the processor's companion process.
+It keeps track of which modules crashes needed symbols for, downloads symbols
+for the hottest modules into the symbols cache if they're not already there, and
+keeps those files from being evicted.
+
+``MinidumpStackwalkRule`` writes the modules log when its ``modules_log_path``
+is set. Every line is a ``;``-separated list of ``debug_file/debug_id`` values
+for the modules that had symbols loaded when stackwalking a crash. Set the same
+path in ``modules_log_path`` here.
+
+Prefetched files are in the symbols cache layout the stackwalker uses::
+
+    SYMBOL_CACHE_PATH/DEBUG_FILE/DEBUG_ID/SYM_FILE
+
+"""
+
+from collections import Counter, deque
+import os
+import re
+import tempfile
+import time
+from urllib.parse import quote
+
+from configman import Namespace
+from configman.converters import str_to_list
+
+from socorro.lib.librequests import session_with_retries
+from socorro.processor.symbol_cache_manager import (
+    from_string_to_parse_size,
+    SymbolLRUCacheManager,
+)
+
+
+# debug_file and debug_id values are used in paths, so they're limited to
+# characters that can't be used to get out of the symbols cache
+SAFE_PATH_PART_RE = re.compile(r"^[A-Za-z0-9_.+@ -]+$")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def get_sym_filename(debug_file):
+    """Returns the SYM filename for a debug file
+
+    >>> get_sym_filename("xul.pdb")
+    'xul.sym'
+    >>> get_sym_filename("libxul.so")
+    'libxul.so.sym'
+
+    """
+    if debug_file.lower().endswith(".pdb"):
+        return debug_file[:-4] + ".sym"
+    return debug_file + ".sym"
+
+
+def parse_module(module):
+    """Parses a modules log item into (debug_file, debug_id)
+
+    :returns: (debug_file, debug_id) or None if it's not valid
+
+    """
+    debug_file, _, debug_id = module.partition("/")
+    for part in (debug_file, debug_id):
+        if not SAFE_PATH_PART_RE.match(part) or part in (".", ".."):
+            return None
+    return debug_file, debug_id
+
+
+class SymbolPrefetchingCacheManager(SymbolLRUCacheManager):
+    """SymbolLRUCacheManager that prefetches and keeps symbols for hot modules
+
+    Every ``eviction_interval`` seconds, this reads new lines from the modules log
+    and counts how many crashes needed each module in the last ``hot_window``
+    seconds. The ``hot_modules_count`` most needed modules are hot. Symbols for
+    hot modules are downloaded if they're not in the cache and hot modules'
+    files are never evicted.
+
+    Downloading happens in the manager thread, so a big download delays
+    eviction until it's done.
+
+    Emits:
+
+    * ``processor.symbol_cache.prefetch``: a prefetch tagged with ``result:``
+      ``downloaded``, ``not_found``, or ``error``
+    * ``processor.symbol_cache.hot_modules``: gauge of the number of hot modules
+
+    """
+
+    required_config = Namespace()
+    required_config.add_option(
+        "modules_log_path",
+        doc="the modules log the stackwalker rule writes to",
+        default=os.path.join(tempfile.gettempdir(), "symbols-modules.log"),
+    )
+    required_config.add_option(
+        "symbols_urls",
+        doc="comma-delimited ordered list of urls to download symbols from",
+        default="https://symbols.mozilla.org/",
+        from_string_converter=str_to_list,
+    )
+    required_config.add_option(
+        "hot_modules_count",
+        doc="the number of most needed modules to prefetch and keep",
+        default=20,
+        from_string_converter=int,
+    )
+    required_config.add_option(
+        "hot_window",
+        doc="seconds of crashes to count modules over",
+        default=3600.0,
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "prefetch_retry_interval",
+        doc="seconds to wait before trying to download symbols that failed again",
+        default=600.0,
+        from_string_converter=float,
+    )
+    required_config.add_option(
+        "modules_log_max_size",
+        doc="the size the modules log can get to before it's started over",
+        default="100M",
+        from_string_converter=from_string_to_parse_size,
+    )
+
+    def __init__(self, config):
+        self.modules_log_path = config.modules_log_path
+        self.symbols_urls = config.symbols_urls
+        self.hot_modules_count = config.hot_modules_count
+        self.hot_window = config.hot_window
+        self.prefetch_retry_interval = config.prefetch_retry_interval
+        self.modules_log_max_size = config.modules_log_max_size
+
+        self._modules_log_offset = 0
+        # (monotonic time, modules) for every crash in the hot window
+        self._recent_crashes = deque()
+        self._module_counts = Counter()
+        # module -> monotonic time of the last failed download
+        self._failed_modules = {}
+        self.session = session_with_retries(default_timeout=(5.0, 60.0))
+
+        super().__init__(config)
+
+    def read_modules_log(self):
+        """Reads lines added to the modules log since the last time
+
+        If the log is bigger than ``modules_log_max_size``, it's moved aside so
+        the stackwalker rule starts a new one.
+
+        :returns: list of lists of modules--one list for each crash
+
+        """
+        try:
+            size = os.path.getsize(self.modules_log_path)
+        except FileNotFoundError:
+            return []
+
+        path = self.modules_log_path
+        rotated = False
+        if size > self.modules_log_max_size:
+            path = self.modules_log_path + ".old"
+            os.replace(self.modules_log_path, path)
+            rotated = True
+        elif size < self._modules_log_offset:
+            # Something else started a new log
+            self._modules_log_offset = 0
+
+        with open(path, "rb") as fp:
+            fp.seek(self._modules_log_offset)
+            data = fp.read()
+
+        if rotated:
+            os.unlink(path)
+            self._modules_log_offset = 0
+        else:
+            # Leave a partially written line for next time
+            data = data[: data.rfind(b"\n") + 1]
+            self._modules_log_offset += len(data)
+
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        return [line.split(";") for line in lines if line.strip()]
+
+    def update_hot_modules(self):
+        """Counts modules from the modules log and forgets old crashes"""
+        now = time.monotonic()
+        for modules in self.read_modules_log():
+            modules = [module for module in modules if parse_module(module)]
+            self._recent_crashes.append((now, modules))
+            self._module_counts.update(modules)
+
+        cutoff = now - self.hot_window
+        while self._recent_crashes and self._recent_crashes[0][0] <= cutoff:
+            _, modules = self._recent_crashes.popleft()
+            self._module_counts.subtract(modules)
+        # Drop modules that aren't in any crash in the window
+        self._module_counts += Counter()
+
+    def get_hot_modules(self):
+        """Returns the hot modules from most needed to least needed"""
+        return [
+            module
+            for module, _ in self._module_counts.most_common(self.hot_modules_count)
+        ]
+
+    def get_sym_path(self, module):
+        debug_file, debug_id = parse_module(module)
+        return os.path.join(
+            self.directory, debug_file, debug_id, get_sym_filename(debug_file)
+        )
+
+    def get_protected_paths(self):
+        return {self.get_sym_path(module) for module in self.get_hot_modules()}
+
+    def download_symbols(self, module, path):
+        """Downloads the SYM file for a module to the cache
+
+        :returns: True if the file was downloaded and False if no symbols server
+            has it
+
+        :raises requests.exceptions.RequestException: for HTTP errors
+
+        """
+        debug_file, debug_id = parse_module(module)
+        sym_filename = get_sym_filename(debug_file)
+        for symbols_url in self.symbols_urls:
+            url = "/".join(
+                [
+                    symbols_url.rstrip("/"),
+                    quote(debug_file),
+                    quote(debug_id),
+                    quote(sym_filename),
+                ]
+            )
+            with self.session.get(url, stream=True) as resp:
+                if resp.status_code == 404:
+                    continue
+                resp.raise_for_status()
+
+                # Download to a temp file and move it into place so the
+                # stackwalker never sees a partial file
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(path), prefix=".", suffix=".tmp"
+                )
+                try:
+                    with os.fdopen(fd, "wb") as fp:
+                        for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            fp.write(chunk)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                    raise
+            return True
+        return False
+
+    def prefetch(self):
+        """Downloads symbols for hot modules that aren't in the cache"""
+        now = time.monotonic()
+        for module in self.get_hot_modules():
+            path = self.get_sym_path(module)
+            if os.path.exists(path):
+                continue
+            failed_at = self._failed_modules.get(module)
+            if failed_at is not None and now - failed_at < self.prefetch_retry_interval:
+                continue
+
+            try:
+                downloaded = self.download_symbols(module, path)
+            except Exception:
+                self.logger.exception("error prefetching symbols for %s", module)
+                result = "error"
+            else:
+                result = "downloaded" if downloaded else "not_found"
+
+            if result == "downloaded":
+                self._failed_modules.pop(module, None)
+            else:
+                self._failed_modules[module] = now
+            self.metrics.incr("prefetch", tags=[f"result:{result}"])
+
+    def run_once(self):
+        super().run_once()
+        if not self.is_owner:
+            return
+        self.update_hot_modules()
+        self.metrics.gauge("hot_modules", value=len(self.get_hot_modules()))
+        self.prefetch()
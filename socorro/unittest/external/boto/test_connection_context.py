@@ -2,9 +2,20 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import io
+import os
+import time
+from unittest import mock
+
+from boto3.s3.transfer import TransferConfig
+from markus.testing import MetricsMock
 import pytest
 
-from socorro.external.boto.connection_context import S3Connection, KeyNotFound
+from socorro.external.boto.connection_context import (
+    CachingS3Connection,
+    KeyNotFound,
+    S3Connection,
+)
 from socorro.unittest.external.boto import get_config
 
 
@@ -30,6 +41,54 @@ class TestS3ConnectionContext:
         conn.save_file(path, file_data2)
         assert boto_helper.download_fileobj(bucket, path) == file_data2
 
+    def test_build_client(self):
+        """Test the client gets the connection pool and timeout configuration."""
+        config = get_config(
+            cls=S3Connection,
+            values_source={
+                "max_pool_connections": 50,
+                "connect_timeout": 2.5,
+                "read_timeout": 30.0,
+            },
+        )
+        conn = S3Connection(config)
+
+        client_config = conn.client.meta.config
+        assert client_config.max_pool_connections == 50
+        assert client_config.connect_timeout == 2.5
+        assert client_config.read_timeout == 30.0
+
+    def test_save_file_small_and_large(self):
+        """Test small files are put and large files go through the transfer manager."""
+        config = get_config(
+            cls=S3Connection,
+            values_source={
+                "multipart_threshold": 100,
+                "multipart_chunksize": 50,
+                "max_transfer_concurrency": 2,
+            },
+        )
+        conn = S3Connection(config)
+        conn.client = mock.Mock()
+
+        conn.save_file("/test/small.txt", b"x" * 99)
+        conn.client.put_object.assert_called_once_with(
+            Body=b"x" * 99, Bucket=conn.bucket, Key="/test/small.txt"
+        )
+        assert not conn.client.upload_fileobj.called
+
+        conn.client.reset_mock()
+        conn.save_file("/test/large.txt", b"x" * 100)
+        assert not conn.client.put_object.called
+        kwargs = conn.client.upload_fileobj.call_args[1]
+        assert kwargs["Fileobj"].read() == b"x" * 100
+        assert kwargs["Key"] == "/test/large.txt"
+        transfer_config = kwargs["Config"]
+        assert isinstance(transfer_config, TransferConfig)
+        assert transfer_config.multipart_threshold == 100
+        assert transfer_config.multipart_chunksize == 50
+        assert transfer_config.max_concurrency == 2
+
     def test_load_file_doesnt_exist(self, boto_helper):
         """Test loading a file that isn't there."""
         config = get_config(cls=S3Connection)
@@ -55,3 +114,139 @@ class TestS3ConnectionContext:
         boto_helper.upload_fileobj(bucket, path, file_data)
         data = conn.load_file(path)
         assert data == file_data
+
+    def test_download_file(self, boto_helper, tmp_path):
+        """Test downloading a file to the filesystem."""
+        config = get_config(cls=S3Connection)
+        conn = S3Connection(config)
+
+        bucket = conn.config.bucket_name
+        path = "/test/testfile.txt"
+        file_data = b"test file contents"
+
+        boto_helper.create_bucket(bucket)
+        boto_helper.upload_fileobj(bucket, path, file_data)
+        filepath = str(tmp_path / "testfile.txt")
+        conn.download_file(path, filepath)
+        with open(filepath, "rb") as fp:
+            assert fp.read() == file_data
+
+    def test_download_file_doesnt_exist(self, boto_helper, tmp_path):
+        """Test downloading a file that isn't there."""
+        config = get_config(cls=S3Connection)
+        conn = S3Connection(config)
+
+        bucket = conn.config.bucket_name
+        path = "/test/testfile.txt"
+
+        boto_helper.create_bucket(bucket)
+        filepath = str(tmp_path / "testfile.txt")
+        with pytest.raises(KeyNotFound):
+            conn.download_file(path, filepath)
+        assert not os.path.exists(filepath)
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class TestCachingS3Connection:
+    def get_conn(self, tmp_path, **values):
+        values.setdefault("cache_path", str(tmp_path / "cache"))
+        config = get_config(cls=CachingS3Connection, values_source=values)
+        conn = CachingS3Connection(config)
+        conn.client = mock.Mock()
+        conn.client.exceptions.NoSuchKey = NoSuchKey
+        return conn
+
+    def test_load_file(self, tmp_path):
+        """Test objects are loaded from S3 once and then from the cache."""
+        conn = self.get_conn(tmp_path)
+        conn.client.get_object.return_value = {"Body": io.BytesIO(b"data")}
+
+        with MetricsMock() as mm:
+            assert conn.load_file("v1/dump/abc") == b"data"
+            assert conn.load_file("v1/dump/abc") == b"data"
+            mm.assert_incr("socorro.s3_cache.get", tags=["result:miss"])
+            mm.assert_incr("socorro.s3_cache.get", tags=["result:hit"])
+
+        conn.client.get_object.assert_called_once_with(
+            Bucket=conn.bucket, Key="v1/dump/abc"
+        )
+
+    def test_load_file_doesnt_exist(self, tmp_path):
+        """Test missing objects aren't cached."""
+        conn = self.get_conn(tmp_path)
+        conn.client.get_object.side_effect = NoSuchKey()
+
+        for _ in range(2):
+            with pytest.raises(KeyNotFound):
+                conn.load_file("v1/dump/abc")
+        assert conn.client.get_object.call_count == 2
+
+    def test_download_file(self, tmp_path):
+        """Test downloaded objects are cached and copied from the cache."""
+        conn = self.get_conn(tmp_path)
+        conn.client.get_object.return_value = {"Body": io.BytesIO(b"dump data")}
+
+        filepath = str(tmp_path / "dump1")
+        conn.download_file("v1/dump/abc", filepath)
+        with open(filepath, "rb") as fp:
+            assert fp.read() == b"dump data"
+
+        filepath = str(tmp_path / "dump2")
+        conn.download_file("v1/dump/abc", filepath)
+        with open(filepath, "rb") as fp:
+            assert fp.read() == b"dump data"
+
+        assert conn.client.get_object.call_count == 1
+        # Loads and downloads share cached objects
+        assert conn.load_file("v1/dump/abc") == b"dump data"
+        assert conn.client.get_object.call_count == 1
+
+    def test_save_file(self, tmp_path):
+        """Test saved objects replace cached objects."""
+        conn = self.get_conn(tmp_path)
+        conn.client.get_object.return_value = {"Body": io.BytesIO(b"old")}
+        assert conn.load_file("v2/raw_crash/abc") == b"old"
+
+        conn.save_file("v2/raw_crash/abc", b"new")
+        conn.client.put_object.assert_called_once_with(
+            Body=b"new", Bucket=conn.bucket, Key="v2/raw_crash/abc"
+        )
+        assert conn.load_file("v2/raw_crash/abc") == b"new"
+        assert conn.client.get_object.call_count == 1
+
+    def test_mutable_objects_expire(self, tmp_path):
+        """Test cached objects that can change are only used for a while."""
+        conn = self.get_conn(tmp_path, cache_mutable_ttl=60.0)
+        conn.client.get_object.side_effect = lambda **kwargs: {
+            "Body": io.BytesIO(b"data")
+        }
+        conn.load_file("v1/processed_crash/abc")
+        conn.load_file("v1/dump/abc")
+
+        # Make the cached objects old
+        old = time.time() - 120
+        for entry in os.scandir(conn.cache.path):
+            os.utime(entry.path, (old, old))
+
+        conn.load_file("v1/processed_crash/abc")
+        conn.load_file("v1/dump/abc")
+        assert [call[1]["Key"] for call in conn.client.get_object.call_args_list] == [
+            "v1/processed_crash/abc",
+            "v1/dump/abc",
+            "v1/processed_crash/abc",
+        ]
+
+    def test_cache_error(self, tmp_path):
+        """Test errors with the cache directory fall back to S3."""
+        conn = self.get_conn(tmp_path)
+        conn.client.get_object.side_effect = lambda **kwargs: {
+            "Body": io.BytesIO(b"data")
+        }
+        with mock.patch.object(conn.cache, "get", side_effect=PermissionError()):
+            with mock.patch.object(conn.cache, "put", side_effect=PermissionError()):
+                with MetricsMock() as mm:
+                    assert conn.load_file("v1/dump/abc") == b"data"
+                    mm.assert_incr("socorro.s3_cache.error")
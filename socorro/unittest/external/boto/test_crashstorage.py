@@ -2,6 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import gzip
 import json
 import os.path
 
@@ -11,15 +12,31 @@ import pytest
 from socorro.external.boto.crashstorage import (
     BotoS3CrashStorage,
     TelemetryBotoS3CrashStorage,
+    compress_data,
+    decompress_data,
     dict_to_str,
 )
 from socorro.external.crashstorage_base import CrashIDNotFound, MemoryDumpsMapping
 from socorro.unittest.external.boto import get_config
 
 
+def test_compress_data():
+    data = b'{"uuid": "936ce666-ff3b-4c7a-9674-367fe2120408"}'
+    compressed = compress_data(data)
+    assert compressed != data
+    assert gzip.decompress(compressed) == data
+    # Compressing is deterministic
+    assert compress_data(data) == compressed
+
+    assert decompress_data(compressed) == data
+    # Uncompressed data is returned as is
+    assert decompress_data(data) == data
+    assert decompress_data(b"") == b""
+
+
 class TestBotoS3CrashStorage:
-    def get_s3_store(self, tmpdir=None):
-        values_source = {}
+    def get_s3_store(self, tmpdir=None, compress_crash_data=False):
+        values_source = {"compress_crash_data": compress_crash_data}
         if tmpdir is not None:
             values_source["temporary_file_system_storage_path"] = tmpdir
         return BotoS3CrashStorage(config=get_config(BotoS3CrashStorage, values_source))
@@ -146,6 +163,51 @@ class TestBotoS3CrashStorage:
         result = boto_s3_store.get_raw_crash("936ce666-ff3b-4c7a-9674-367fe2120408")
         assert result == raw_crash
 
+    def test_compressed_crash_data(self, boto_helper):
+        boto_s3_store = self.get_s3_store(compress_crash_data=True)
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        crash_id = "936ce666-ff3b-4c7a-9674-367fe2120408"
+        raw_crash = {"submitted_timestamp": "2013-01-09T22:21:18.646733+00:00"}
+        processed_crash = {"uuid": crash_id, "signature": "now_this_is_a_signature"}
+        boto_s3_store.save_raw_crash(raw_crash, MemoryDumpsMapping(), crash_id)
+        boto_s3_store.save_processed_crash(raw_crash, processed_crash)
+
+        # Crash data is compressed in S3
+        data = boto_helper.download_fileobj(
+            bucket_name=bucket, key="v2/raw_crash/936/20120408/" + crash_id
+        )
+        assert json.loads(gzip.decompress(data)) == raw_crash
+        data = boto_helper.download_fileobj(
+            bucket_name=bucket, key="v1/processed_crash/" + crash_id
+        )
+        assert json.loads(gzip.decompress(data)) == processed_crash
+
+        assert boto_s3_store.get_raw_crash(crash_id) == raw_crash
+        assert boto_s3_store.get_unredacted_processed(crash_id) == processed_crash
+
+        # Storage that doesn't compress crash data can load it, too
+        boto_s3_store = self.get_s3_store()
+        assert boto_s3_store.get_raw_crash(crash_id) == raw_crash
+        assert boto_s3_store.get_unredacted_processed(crash_id) == processed_crash
+
+    def test_compressed_crash_data_loads_uncompressed(self, boto_helper):
+        boto_s3_store = self.get_s3_store()
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        crash_id = "936ce666-ff3b-4c7a-9674-367fe2120408"
+        raw_crash = {"submitted_timestamp": "2013-01-09T22:21:18.646733+00:00"}
+        processed_crash = {"uuid": crash_id, "signature": "now_this_is_a_signature"}
+        boto_s3_store.save_raw_crash(raw_crash, MemoryDumpsMapping(), crash_id)
+        boto_s3_store.save_processed_crash(raw_crash, processed_crash)
+
+        # Crash data saved before compression was turned on is still loaded
+        boto_s3_store = self.get_s3_store(compress_crash_data=True)
+        assert boto_s3_store.get_raw_crash(crash_id) == raw_crash
+        assert boto_s3_store.get_unredacted_processed(crash_id) == processed_crash
+
     def test_get_raw_crash_not_found(self, boto_helper):
         boto_s3_store = self.get_s3_store()
         bucket = boto_s3_store.conn.bucket
@@ -299,6 +361,117 @@ class TestBotoS3CrashStorage:
             ),
         }
         assert result == expected
+        with open(expected["flash_dump"], "rb") as fp:
+            assert fp.read() == b'this is "flash_dump", the second one'
+
+    def test_get_dumps_as_files_missing_dump(self, boto_helper, tmpdir):
+        boto_s3_store = self.get_s3_store(tmpdir=tmpdir)
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump_names/936ce666-ff3b-4c7a-9674-367fe2120408",
+            data=b'["dump", "flash_dump"]',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump/936ce666-ff3b-4c7a-9674-367fe2120408",
+            data=b'this is "dump", the first one',
+        )
+
+        with pytest.raises(CrashIDNotFound):
+            boto_s3_store.get_dumps_as_files("936ce666-ff3b-4c7a-9674-367fe2120408")
+
+        # The dump that was downloaded was cleaned up
+        assert os.listdir(str(tmpdir)) == []
+
+    def test_get_crash_bundle(self, boto_helper, tmpdir):
+        boto_s3_store = self.get_s3_store(tmpdir=tmpdir)
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        crash_id = "936ce666-ff3b-4c7a-9674-367fe2120408"
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v2/raw_crash/936/20120408/" + crash_id,
+            data=b'{"submitted_timestamp": "2013-05-04T15:10:00"}',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump_names/" + crash_id,
+            data=b'["dump", "content_dump"]',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump/" + crash_id,
+            data=b'this is "dump"',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/content_dump/" + crash_id,
+            data=b'this is "content_dump"',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/processed_crash/" + crash_id,
+            data=b'{"signature": "OOM | small"}',
+        )
+
+        raw_crash, dumps, processed_crash = boto_s3_store.get_crash_bundle(crash_id)
+        assert raw_crash == {"submitted_timestamp": "2013-05-04T15:10:00"}
+        assert processed_crash == {"signature": "OOM | small"}
+        assert sorted(dumps.keys()) == ["content_dump", "upload_file_minidump"]
+        with open(dumps["upload_file_minidump"], "rb") as fp:
+            assert fp.read() == b'this is "dump"'
+        with open(dumps["content_dump"], "rb") as fp:
+            assert fp.read() == b'this is "content_dump"'
+
+    def test_get_crash_bundle_not_processed(self, boto_helper, tmpdir):
+        boto_s3_store = self.get_s3_store(tmpdir=tmpdir)
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        crash_id = "936ce666-ff3b-4c7a-9674-367fe2120408"
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v2/raw_crash/936/20120408/" + crash_id,
+            data=b'{"submitted_timestamp": "2013-05-04T15:10:00"}',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump_names/" + crash_id,
+            data=b"[]",
+        )
+
+        raw_crash, dumps, processed_crash = boto_s3_store.get_crash_bundle(crash_id)
+        assert raw_crash == {"submitted_timestamp": "2013-05-04T15:10:00"}
+        assert dumps == {}
+        assert processed_crash is None
+
+    def test_get_crash_bundle_not_found(self, boto_helper, tmpdir):
+        boto_s3_store = self.get_s3_store(tmpdir=tmpdir)
+        bucket = boto_s3_store.conn.bucket
+        boto_helper.create_bucket(bucket)
+
+        crash_id = "936ce666-ff3b-4c7a-9674-367fe2120408"
+        # There are dumps, but no raw crash
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump_names/" + crash_id,
+            data=b'["dump"]',
+        )
+        boto_helper.upload_fileobj(
+            bucket_name=bucket,
+            key="v1/dump/" + crash_id,
+            data=b'this is "dump"',
+        )
+
+        with pytest.raises(CrashIDNotFound):
+            boto_s3_store.get_crash_bundle(crash_id)
+
+        # The dump that was downloaded was cleaned up
+        assert os.listdir(str(tmpdir)) == []
 
     def test_get_unredacted_processed(self, boto_helper):
         boto_s3_store = self.get_s3_store()
@@ -0,0 +1,105 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import os
+import time
+
+from socorro.external.boto.object_cache import DiskObjectCache
+
+
+def set_used(cache, key, used):
+    """Sets when a cached object was last used"""
+    filepath = cache._filepath(key)
+    os.utime(filepath, (used, os.stat(filepath).st_mtime))
+
+
+class TestDiskObjectCache:
+    def test_get_and_put(self, tmp_path):
+        cache = DiskObjectCache(path=str(tmp_path), max_size=1000)
+        assert cache.get("bucket/key") is None
+
+        cache.put("bucket/key", b"data")
+        assert cache.get("bucket/key") == b"data"
+        assert cache.size == 4
+
+        cache.put("bucket/key", b"new data")
+        assert cache.get("bucket/key") == b"new data"
+
+    def test_put_file_and_copy_to(self, tmp_path):
+        cache = DiskObjectCache(path=str(tmp_path / "cache"), max_size=1000)
+        src = tmp_path / "src"
+        src.write_bytes(b"dump data")
+        dest = tmp_path / "dest"
+
+        assert cache.copy_to("bucket/key", str(dest)) is False
+        assert not dest.exists()
+
+        cache.put_file("bucket/key", str(src))
+        assert cache.copy_to("bucket/key", str(dest)) is True
+        assert dest.read_bytes() == b"dump data"
+
+    def test_max_age(self, tmp_path):
+        cache = DiskObjectCache(path=str(tmp_path), max_size=1000)
+        cache.put("bucket/key", b"data")
+        assert cache.get("bucket/key", max_age=60) == b"data"
+
+        old = time.time() - 120
+        os.utime(cache._filepath("bucket/key"), (old, old))
+        assert cache.get("bucket/key", max_age=60) is None
+        assert cache.get("bucket/key") == b"data"
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = DiskObjectCache(path=str(tmp_path), max_size=25)
+        now = time.time()
+        cache.put("bucket/a", b"a" * 10)
+        set_used(cache, "bucket/a", now - 30)
+        cache.put("bucket/b", b"b" * 10)
+        set_used(cache, "bucket/b", now - 20)
+
+        # Using a makes b the least recently used
+        assert cache.get("bucket/a") is not None
+
+        cache.put("bucket/c", b"c" * 10)
+        assert cache.get("bucket/b") is None
+        assert cache.get("bucket/a") is not None
+        assert cache.get("bucket/c") is not None
+        assert cache.size == 20
+
+    def test_too_big(self, tmp_path):
+        cache = DiskObjectCache(path=str(tmp_path), max_size=10)
+        cache.put("bucket/a", b"a" * 5)
+        cache.put("bucket/a", b"a" * 11)
+        assert cache.get("bucket/a") is None
+        assert os.listdir(tmp_path) == []
+
+    def test_shared_directory(self, tmp_path):
+        """Test processes sharing the directory evict what the others added"""
+        cache1 = DiskObjectCache(path=str(tmp_path), max_size=25)
+        cache2 = DiskObjectCache(path=str(tmp_path), max_size=25, scan_interval=0)
+
+        cache1.put("bucket/a", b"a" * 10)
+        set_used(cache1, "bucket/a", time.time() - 30)
+        assert cache2.get("bucket/a") == b"a" * 10
+        cache1.put("bucket/b", b"b" * 10)
+        set_used(cache1, "bucket/b", time.time() - 20)
+
+        # cache2 didn't add a or b, but it scans the directory and evicts them
+        cache2.put("bucket/c", b"c" * 20)
+        assert cache2.size == 20
+        assert cache1.get("bucket/a") is None
+        assert cache1.get("bucket/b") is None
+        assert cache1.get("bucket/c") == b"c" * 20
+
+    def test_removes_stale_temp_files(self, tmp_path):
+        stale = tmp_path / "abc.tmp"
+        stale.write_bytes(b"partial")
+        old = time.time() - 120
+        os.utime(stale, (old, old))
+        fresh = tmp_path / "def.tmp"
+        fresh.write_bytes(b"partial")
+
+        cache = DiskObjectCache(path=str(tmp_path), max_size=1000, scan_interval=60)
+        assert not stale.exists()
+        assert fresh.exists()
+        assert cache.size == 0
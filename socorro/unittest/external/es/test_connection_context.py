@@ -3,7 +3,12 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import datetime
+from decimal import Decimal
 
+from elasticsearch.exceptions import SerializationError
+import pytest
+
+from socorro.external.es.connection_context import JSONSerializer
 from socorro.lib.libdatetime import utc_now
 
 # Uncomment these lines to decrease verbosity of the elasticsearch library
@@ -13,6 +18,34 @@ from socorro.lib.libdatetime import utc_now
 # logging.getLogger('requests').setLevel(logging.ERROR)
 
 
+class TestJSONSerializer:
+    def test_dumps(self):
+        serializer = JSONSerializer()
+        data = {
+            "date": datetime.datetime(2022, 8, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            "decimal": Decimal("1.5"),
+        }
+        assert (
+            serializer.dumps(data)
+            == '{"date":"2022-08-01T12:30:00+00:00","decimal":1.5}'
+        )
+
+    def test_dumps_passes_strings_through(self):
+        serializer = JSONSerializer()
+        assert serializer.dumps('{"a": 1}') == '{"a": 1}'
+
+    def test_dumps_error(self):
+        serializer = JSONSerializer()
+        with pytest.raises(SerializationError):
+            serializer.dumps({"a": object()})
+
+    def test_loads(self):
+        serializer = JSONSerializer()
+        assert serializer.loads('{"a":[1,2]}') == {"a": [1, 2]}
+        with pytest.raises(SerializationError):
+            serializer.loads('{"a":')
+
+
 class TestConnectionContext:
     def test_create_index(self, es_conn):
         # Delete any existing indices first
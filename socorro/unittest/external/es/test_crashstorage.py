@@ -16,11 +16,15 @@ from socorro.external.es.crashstorage import (
     ESCrashStorage,
     ESCrashStorageRedactedJsonDump,
     ESCrashStorageRedactedSave,
+    build_document,
+    build_document_plan,
+    execute_document_plan,
     fix_boolean,
     fix_integer,
     fix_keyword,
     fix_long,
     fix_string,
+    get_source_accessor,
     is_valid_key,
     RawCrashRedactor,
 )
@@ -773,8 +777,8 @@ class TestESCrashStorage(ElasticsearchTestCase):
             )
 
             mm.assert_histogram("processor.es.raw_crash_size", value=2)
-            mm.assert_histogram("processor.es.processed_crash_size", value=96)
-            mm.assert_histogram("processor.es.crash_document_size", value=186)
+            mm.assert_histogram("processor.es.processed_crash_size", value=99)
+            mm.assert_histogram("processor.es.crash_document_size", value=184)
 
     def test_index_data_capture(self):
         """Verify we capture index data in ES crashstorage"""
@@ -897,3 +901,123 @@ def test_fix_integer(value, expected):
 def test_fix_long(value, expected):
     new_value = fix_long(value)
     assert new_value == expected
+
+
+@pytest.mark.parametrize(
+    "src_key, expected",
+    [
+        ("processed_crash.product", "Firefox"),
+        ("processed_crash.json_dump.system_info.cpu_count", 4),
+        # Missing keys
+        ("processed_crash.version", None),
+        ("processed_crash.json_dump.crash_info.type", None),
+        # Walking into values that aren't dicts
+        ("processed_crash.product.name", None),
+        ("processed_crash.json_dump.threads.frames", None),
+    ],
+)
+def test_get_source_accessor(src_key, expected):
+    src = {
+        "processed_crash": {
+            "product": "Firefox",
+            "json_dump": {"system_info": {"cpu_count": 4}, "threads": [{}]},
+        }
+    }
+    assert get_source_accessor(src_key)(src) == expected
+
+
+def test_build_document_does_not_change_source():
+    fields = {
+        "product": {
+            "namespace": "processed_crash",
+            "in_database_name": "product",
+            "storage_mapping": {"type": "keyword"},
+        },
+        "cpu_count": {
+            "source_key": "processed_crash.json_dump.system_info.cpu_count",
+            "destination_keys": ["processed_crash.cpu_count"],
+            "storage_mapping": {"type": "integer"},
+        },
+        "modules": {
+            "namespace": "processed_crash",
+            "in_database_name": "modules",
+            "storage_mapping": {"type": "object"},
+        },
+    }
+    src = {
+        "raw_crash": {},
+        "processed_crash": {
+            "product": "Firefox",
+            "json_dump": {"system_info": {"cpu_count": "4"}},
+            "modules": [{"filename": "libxul.so"}],
+        },
+    }
+    original_src = deepcopy(src)
+    crash_document = {"crash_id": "id", "raw_crash": {}, "processed_crash": {}}
+    all_keys = {
+        "processed_crash.product",
+        "processed_crash.cpu_count",
+        "processed_crash.modules",
+    }
+    build_document(src, crash_document, fields=fields, all_keys=all_keys)
+
+    assert crash_document == {
+        "crash_id": "id",
+        "raw_crash": {},
+        "processed_crash": {
+            "product": "Firefox",
+            "cpu_count": 4,
+            "modules": [{"filename": "libxul.so"}],
+        },
+    }
+
+    # Changing the crash document doesn't change the source document
+    crash_document["processed_crash"]["modules"][0]["filename"] = "bad"
+    assert src == original_src
+
+
+def test_build_document_plan():
+    fields = {
+        "product": {
+            "namespace": "processed_crash",
+            "in_database_name": "product",
+            "storage_mapping": {"type": "keyword"},
+        },
+        "uptime": {
+            "namespace": "processed_crash",
+            "in_database_name": "uptime",
+            "storage_mapping": {"type": "long"},
+        },
+        # Not indexable
+        "not_indexable": {
+            "namespace": "processed_crash",
+            "in_database_name": "not_indexable",
+            "storage_mapping": None,
+        },
+        # Not in the valid keys
+        "not_valid": {
+            "namespace": "processed_crash",
+            "in_database_name": "not_valid",
+            "storage_mapping": {"type": "keyword"},
+        },
+    }
+    all_keys = {"processed_crash.product", "processed_crash.uptime"}
+    plan = build_document_plan(fields, all_keys)
+    assert len(plan) == 2
+
+    # The plan can be executed for many crashes
+    for product, uptime in [("Firefox", "10"), ("Fenix", "bad")]:
+        src = {
+            "processed_crash": {
+                "product": product,
+                "uptime": uptime,
+                "not_indexable": "abc",
+                "not_valid": "abc",
+            }
+        }
+        crash_document = {"processed_crash": {}}
+        execute_document_plan(plan, src, crash_document)
+        expected = {"product": product}
+        if uptime.isdigit():
+            expected["uptime"] = int(uptime)
+        assert crash_document == {"processed_crash": expected}
@@ -64,6 +64,14 @@ class TestSQSCrashQueue:
         new_crashes = list(crash_queue.new_crashes())
         assert new_crashes == []
 
+    def test_get_backlog(self, sqs_helper):
+        crash_queue = SQSCrashQueue(get_sqs_config())
+        assert crash_queue.get_backlog() == 0
+
+        sqs_helper.publish("standard", create_new_ooid())
+        sqs_helper.publish("priority", create_new_ooid())
+        assert crash_queue.get_backlog() == 2
+
     @pytest.mark.parametrize("queue", ["standard", "priority", "reprocessing"])
     def test_publish_one(self, sqs_helper, queue):
         crash_id = create_new_ooid()
@@ -2,6 +2,10 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from unittest import mock
 
 from configman import Namespace, ConfigurationManager
@@ -9,6 +13,7 @@ from configman.dotdict import DotDict
 import pytest
 
 from socorro.external.crashstorage_base import (
+    CrashIDNotFound,
     CrashStorageBase,
     PolyStorageError,
     PolyCrashStorage,
@@ -77,6 +82,48 @@ class TestCrashStorageBase:
 
             crashstorage.close()
 
+    def test_async_variants(self):
+        config = DotDict({"redactor_class": Redactor, "forbidden_keys": ""})
+        crashstorage = CrashStorageBase(config)
+        crashstorage.get_raw_crash = mock.Mock(return_value={"uuid": "ooid"})
+        crashstorage.get_dumps_as_files = mock.Mock(return_value={})
+        crashstorage.get_unredacted_processed = mock.Mock(return_value={})
+        crashstorage.save_processed_crash = mock.Mock()
+
+        async def run():
+            assert await crashstorage.get_raw_crash_async("ooid") == {"uuid": "ooid"}
+            assert await crashstorage.get_dumps_as_files_async("ooid") == {}
+            assert await crashstorage.get_unredacted_processed_async("ooid") == {}
+            await crashstorage.save_processed_crash_async({}, {"uuid": "ooid"})
+
+        asyncio.run(run())
+        crashstorage.get_raw_crash.assert_called_once_with("ooid")
+        crashstorage.get_dumps_as_files.assert_called_once_with("ooid")
+        crashstorage.get_unredacted_processed.assert_called_once_with("ooid")
+        crashstorage.save_processed_crash.assert_called_once_with({}, {"uuid": "ooid"})
+
+    def test_get_crash_bundle(self):
+        config = DotDict({"redactor_class": Redactor, "forbidden_keys": ""})
+        crashstorage = CrashStorageBase(config)
+        crashstorage.get_raw_crash = mock.Mock(return_value={"uuid": "ooid"})
+        crashstorage.get_dumps_as_files = mock.Mock(
+            return_value={"upload_file_minidump": "/tmp/ooid.dump"}
+        )
+        crashstorage.get_unredacted_processed = mock.Mock(
+            return_value={"uuid": "ooid", "signature": "OOM"}
+        )
+
+        assert crashstorage.get_crash_bundle("ooid") == (
+            {"uuid": "ooid"},
+            {"upload_file_minidump": "/tmp/ooid.dump"},
+            {"uuid": "ooid", "signature": "OOM"},
+        )
+
+        # Crashes that haven't been processed have no processed crash
+        crashstorage.get_unredacted_processed.side_effect = CrashIDNotFound("ooid")
+        raw_crash, dumps, processed_crash = crashstorage.get_crash_bundle("ooid")
+        assert processed_crash is None
+
     def test_polyerror(self):
         p = PolyStorageError("hell")
         try:
@@ -204,6 +251,150 @@ class TestCrashStorageBase:
             for v in poly_store.stores.values():
                 v.close.assert_called_with()
 
+    def test_poly_crash_storage_save_concurrently(self):
+        n = Namespace()
+        n.add_option("storage", default=PolyCrashStorage)
+        n.add_option("logger", default=mock.Mock())
+        value = {
+            "storage_namespaces": "A,A2,B",
+            "save_concurrently": True,
+            "save_timeout": 5.0,
+            "A.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.A",
+            "A2.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.A",
+            "B.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.B",
+            "B.save_timeout": 0.1,
+        }
+        cm = ConfigurationManager(n, values_source_list=[value])
+        with cm.context() as config:
+            poly_store = config.storage(config)
+            assert poly_store.save_timeouts == {"A": 5.0, "A2": 5.0, "B": 0.1}
+
+            # All the saves run at the same time: each store waits for the others
+            # to start before returning
+            barrier = threading.Barrier(3, timeout=5)
+            for v in poly_store.stores.values():
+                v.save_processed_crash = mock.Mock(
+                    side_effect=lambda *args: barrier.wait()
+                )
+
+            raw_crash = {"ooid": ""}
+            processed_crash = {"ooid": "", "product": 17}
+            poly_store.save_processed_crash(raw_crash, processed_crash)
+            for v in poly_store.stores.values():
+                v.save_processed_crash.assert_called_once_with(
+                    raw_crash, processed_crash
+                )
+
+            # Errors and timeouts are gathered into a PolyStorageError
+            release = threading.Event()
+            poly_store.stores["A"].save_processed_crash = mock.Mock()
+            poly_store.stores["A2"].save_processed_crash = mock.Mock(
+                side_effect=Exception("this is messed up")
+            )
+            poly_store.stores["B"].save_processed_crash = mock.Mock(
+                side_effect=lambda *args: release.wait(5)
+            )
+            with pytest.raises(PolyStorageError) as excinfo:
+                poly_store.save_processed_crash(raw_crash, processed_crash)
+            release.set()
+
+            errors = [exc_info[1] for exc_info in excinfo.value]
+            assert len(errors) == 2
+            assert str(errors[0]) == "this is messed up"
+            assert isinstance(errors[1], TimeoutError)
+
+            poly_store.close()
+            for save_executor in poly_store.save_executors.values():
+                assert save_executor._shutdown
+
+    def test_poly_crash_storage_save_concurrently_busy(self):
+        n = Namespace()
+        n.add_option("storage", default=PolyCrashStorage)
+        n.add_option("logger", default=mock.Mock())
+        value = {
+            "storage_namespaces": "A,B",
+            "save_concurrently": True,
+            "save_threads": 1,
+            "save_timeout": 0.2,
+            "A.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.A",
+            "B.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.B",
+        }
+        cm = ConfigurationManager(n, values_source_list=[value])
+        with cm.context() as config:
+            poly_store = config.storage(config)
+            raw_crash = {"ooid": ""}
+            processed_crash = {"ooid": "", "product": 17}
+
+            release = threading.Event()
+            poly_store.stores["A"].save_processed_crash = mock.Mock()
+            poly_store.stores["B"].save_processed_crash = mock.Mock(
+                side_effect=lambda *args: release.wait(5)
+            )
+
+            # B hangs and times out
+            with pytest.raises(PolyStorageError) as excinfo:
+                poly_store.save_processed_crash(raw_crash, processed_crash)
+            errors = [exc_info[1] for exc_info in excinfo.value]
+            assert len(errors) == 1
+            assert "timed out" in str(errors[0])
+            assert len(poly_store.timed_out_saves["B"]) == 1
+
+            # B is still busy, so saving to it fails right away without queuing
+            # another save; A is saved to like usual
+            start_time = time.monotonic()
+            with pytest.raises(PolyStorageError) as excinfo:
+                poly_store.save_processed_crash(raw_crash, processed_crash)
+            assert time.monotonic() - start_time < 0.2
+            errors = [exc_info[1] for exc_info in excinfo.value]
+            assert len(errors) == 1
+            assert "still running 1 save(s)" in str(errors[0])
+            assert poly_store.stores["A"].save_processed_crash.call_count == 2
+            assert poly_store.stores["B"].save_processed_crash.call_count == 1
+
+            # Once B finishes, it's saved to again
+            release.set()
+            poly_store.save_executors["B"].submit(lambda: None).result()
+            assert len(poly_store.timed_out_saves["B"]) == 0
+            poly_store.save_processed_crash(raw_crash, processed_crash)
+            assert poly_store.stores["B"].save_processed_crash.call_count == 2
+
+            poly_store.close()
+
+    def test_poly_crash_storage_save_concurrently_queued_time(self):
+        n = Namespace()
+        n.add_option("storage", default=PolyCrashStorage)
+        n.add_option("logger", default=mock.Mock())
+        value = {
+            "storage_namespaces": "A",
+            "save_concurrently": True,
+            "save_threads": 1,
+            "save_timeout": 0.5,
+            "A.crashstorage_class": "socorro.unittest.external.test_crashstorage_base.A",
+        }
+        cm = ConfigurationManager(n, values_source_list=[value])
+        with cm.context() as config:
+            poly_store = config.storage(config)
+            poly_store.stores["A"].save_processed_crash = mock.Mock(
+                side_effect=lambda *args: time.sleep(0.3)
+            )
+
+            # The saves queue up behind each other in the one thread; waiting in
+            # the queue doesn't count against the timeout
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(
+                        poly_store.save_processed_crash,
+                        {"ooid": ""},
+                        {"ooid": "", "product": 17},
+                    )
+                    for i in range(2)
+                ]
+                for future in futures:
+                    future.result()
+
+            assert poly_store.stores["A"].save_processed_crash.call_count == 2
+            poly_store.close()
+
 
 class TestRedactor:
     def test_redact(self):
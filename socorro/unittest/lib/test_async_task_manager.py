@@ -0,0 +1,90 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import asyncio
+import threading
+from unittest import mock
+
+from configman.dotdict import DotDict
+
+from socorro.lib.async_task_manager import AsyncTaskManager
+
+
+def build_config(max_concurrent_tasks=10):
+    config = DotDict()
+    config.idle_delay = 1
+    config.quit_on_empty_queue = True
+    config.max_concurrent_tasks = max_concurrent_tasks
+    config.number_of_io_threads = 4
+    config.number_of_threads = 2
+    return config
+
+
+class TestAsyncTaskManager:
+    def test_sync_task_func(self):
+        task_func = mock.Mock()
+        tm = AsyncTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert task_func.call_count == 10
+        assert tm.quit
+
+    def test_tasks_run_concurrently(self):
+        config = build_config(max_concurrent_tasks=5)
+        running = []
+        max_running = []
+
+        async def task_func(index):
+            running.append(index)
+            max_running.append(len(running))
+            await asyncio.sleep(0.1)
+            running.remove(index)
+
+        tm = AsyncTaskManager(config, task_func=task_func)
+        tm.blocking_start()
+        assert len(max_running) == 10
+        assert max(max_running) == 5
+        assert running == []
+
+    def test_run_in_cpu_executor(self):
+        thread_names = []
+
+        def cpu_bound(index):
+            thread_names.append(threading.current_thread().name)
+            return index * 2
+
+        results = []
+
+        async def task_func(index):
+            results.append(await tm.run_in_cpu_executor(cpu_bound, index))
+
+        tm = AsyncTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert sorted(results) == [x * 2 for x in range(10)]
+        assert all(name.startswith("CPUThread") for name in thread_names)
+
+    def test_task_errors_are_logged(self, caplogpp):
+        async def task_func(index):
+            if index == 3:
+                raise ValueError("simulated error")
+
+        tm = AsyncTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert "Error in processing a job" in [rec.message for rec in caplogpp.records]
+
+    def test_waits_for_running_tasks_on_quit(self):
+        started = []
+        completed = []
+
+        async def task_func(index):
+            # Set quit while tasks are running; no more tasks should start, but the
+            # running ones should complete
+            started.append(index)
+            tm.quit = True
+            await asyncio.sleep(0.1)
+            completed.append(index)
+
+        tm = AsyncTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert len(started) < 10
+        assert sorted(completed) == sorted(started)
@@ -0,0 +1,147 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import time
+from unittest import mock
+
+from configman.dotdict import DotDict
+
+from socorro.lib.autoscaling_task_manager import AutoscalingThreadedTaskManager
+
+
+def build_config(**kwargs):
+    config = DotDict()
+    config.idle_delay = 1
+    config.quit_on_empty_queue = True
+    config.number_of_threads = 2
+    config.maximum_queue_size = 4
+    config.min_threads = 1
+    config.max_threads = 4
+    config.scale_interval = 30
+    config.target_task_latency = 0.0
+    config.idle_samples = 3
+    config.metrics_prefix = "processor"
+    config.update(kwargs)
+    return config
+
+
+def count_workers(tm):
+    return len([t for t in tm.thread_list if t.is_alive()])
+
+
+class TestAutoscalingThreadedTaskManager:
+    def test_constructor(self):
+        tm = AutoscalingThreadedTaskManager(build_config(number_of_threads=10))
+        # number_of_threads is bounded by max_threads
+        assert tm.number_of_threads == 4
+        assert tm.task_queue.maxsize == 4
+        assert tm.task_func == tm._timed_task
+
+    def test_runs_tasks(self):
+        task_func = mock.Mock()
+        tm = AutoscalingThreadedTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert task_func.call_count == 10
+        assert len(tm.task_durations) == 10
+
+    def test_scale_up_and_down(self, metricsmock):
+        backlog = [100]
+
+        def job_source_iterator():
+            # Keep running until the test stops the task manager
+            while not tm.quit:
+                yield None
+
+        tm = AutoscalingThreadedTaskManager(
+            build_config(quit_on_empty_queue=False),
+            job_source_iterator=job_source_iterator,
+            backlog_func=lambda: backlog[0],
+        )
+        tm.start()
+        try:
+            with metricsmock as mm:
+                # There's a backlog, so it adds workers up to max_threads
+                for i in range(3):
+                    tm.scale()
+                assert tm.number_of_threads == 4
+                assert count_workers(tm) == 4
+                assert tm.task_queue.maxsize == 8
+
+                # The backlog is gone, so it retires workers down to min_threads
+                backlog[0] = 0
+                for i in range(4):
+                    tm.scale()
+                    # Wait for a worker to pick up the death token
+                    while not tm.task_queue.empty():
+                        time.sleep(0.01)
+                assert tm.number_of_threads == 1
+                assert tm.task_queue.maxsize == 2
+
+            assert mm.filter_records("gauge", stat="processor.worker_count", value=4)
+            assert mm.filter_records("gauge", stat="processor.worker_count", value=1)
+        finally:
+            tm.stop()
+
+        assert count_workers(tm) == 0
+
+    def test_scale_down_when_tasks_are_slow(self):
+        tm = AutoscalingThreadedTaskManager(
+            build_config(target_task_latency=0.5), backlog_func=lambda: 100
+        )
+        tm.task_durations.extend([1.0, 2.0])
+        # There's a backlog, but tasks are too slow, so it retires a worker
+        tm.scale()
+        assert tm.number_of_threads == 1
+
+        # Tasks are fast enough now, so it adds a worker
+        tm.task_durations.extend([0.1] * 100)
+        tm.scale()
+        assert tm.number_of_threads == 2
+
+        # The new worker picks up the death token from the retired worker
+        tm.thread_list[-1].join(5)
+
+    def test_backlog_error(self):
+        def backlog_func():
+            raise Exception("simulated error")
+
+        tm = AutoscalingThreadedTaskManager(build_config(), backlog_func=backlog_func)
+        assert tm.get_backlog() is None
+
+    def test_scale_down_without_backlog_needs_idle_samples(self):
+        tm = AutoscalingThreadedTaskManager(build_config())
+        # There's no backlog_func, so an empty queue has to be seen idle_samples
+        # times in a row
+        tm.scale()
+        tm.scale()
+        assert tm.number_of_threads == 2
+
+        # A job in the queue resets the count
+        tm.task_queue.put(("job", ((), {})))
+        tm.scale()
+        tm.task_queue.get_nowait()
+        tm.scale()
+        tm.scale()
+        assert tm.number_of_threads == 2
+
+        tm.scale()
+        assert tm.number_of_threads == 1
+
+    def test_retire_worker_when_queue_is_full(self):
+        tm = AutoscalingThreadedTaskManager(
+            build_config(target_task_latency=0.5), backlog_func=lambda: 100
+        )
+        tm.task_durations.extend([1.0, 2.0])
+        for i in range(tm.task_queue.maxsize):
+            tm.task_queue.put(("job", ((), {})))
+
+        # Tasks are too slow, but there's no room for the death token, so it
+        # doesn't wait and tries again next time
+        tm.scale()
+        assert tm.number_of_threads == 2
+
+        tm.task_queue.get_nowait()
+        tm.scale()
+        assert tm.number_of_threads == 1
+        assert tm.task_queue.queue[-1] == (None, None)
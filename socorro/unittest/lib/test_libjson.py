@@ -2,10 +2,92 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import datetime
+
+from configman.dotdict import DotDict
 import jsonschema
 import pytest
 
-from socorro.lib.libjson import schema_reduce, InvalidDocumentError, InvalidSchemaError
+from socorro.lib import libjson
+from socorro.lib.libjson import (
+    deserialize_json,
+    schema_reduce,
+    serialize_json,
+    InvalidDocumentError,
+    InvalidSchemaError,
+)
+
+
+@pytest.fixture(params=["orjson", "json"])
+def json_backend(request, monkeypatch):
+    """Runs the test with orjson and with the json module"""
+    if request.param == "json":
+        monkeypatch.setattr(libjson, "orjson", None)
+    elif libjson.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+class Test_serialize_json:
+    def test_compact(self, json_backend):
+        assert serialize_json({"a": [1, 2.5, None, True]}) == (
+            b'{"a":[1,2.5,null,true]}'
+        )
+
+    def test_unicode(self, json_backend):
+        assert serialize_json({"a": "\u00e9"}).decode("utf-8") == '{"a":"\u00e9"}'
+
+    def test_datetimes(self, json_backend):
+        data = {
+            "date": datetime.date(2022, 8, 1),
+            "naive": datetime.datetime(2022, 8, 1, 12, 30, 15, 123),
+            "aware": datetime.datetime(
+                2022, 8, 1, 12, 30, 15, tzinfo=datetime.timezone.utc
+            ),
+        }
+        assert serialize_json(data) == (
+            b'{"date":"2022-08-01",'
+            + b'"naive":"2022-08-01T12:30:15.000123",'
+            + b'"aware":"2022-08-01T12:30:15+00:00"}'
+        )
+
+    def test_lone_surrogate(self, json_backend):
+        assert serialize_json({"a": "\ud800"}) == b'{"a":"\\ud800"}'
+
+    def test_big_int(self, json_backend):
+        assert serialize_json({"a": 2**70}) == b'{"a":1180591620717411303424}'
+
+    def test_unserializable(self, json_backend):
+        with pytest.raises(TypeError):
+            serialize_json({"a": object()})
+
+    def test_default(self, json_backend):
+        assert serialize_json({"a": {1, 2}}, default=sorted) == b'{"a":[1,2]}'
+
+
+class Test_deserialize_json:
+    def test_bytes_and_str(self, json_backend):
+        assert deserialize_json(b'{"a":[1,2]}') == {"a": [1, 2]}
+        assert deserialize_json('{"a":[1,2]}') == {"a": [1, 2]}
+
+    def test_object_hook(self, json_backend):
+        data = deserialize_json(b'{"a":{"b":[{"c":1}]}}', object_hook=DotDict)
+        assert isinstance(data, DotDict)
+        assert isinstance(data.a, DotDict)
+        assert isinstance(data.a.b[0], DotDict)
+        assert data.a.b[0].c == 1
+
+    def test_nan(self, json_backend):
+        data = deserialize_json(b'{"a":NaN}')
+        assert data["a"] != data["a"]
+
+    def test_invalid(self, json_backend):
+        with pytest.raises(ValueError):
+            deserialize_json(b'{"a":')
+
+    def test_roundtrip(self, json_backend):
+        data = {"a": "\u00e9", "b": [1, 2.5, None, {"c": False}]}
+        assert deserialize_json(serialize_json(data)) == data
 
 
 class Test_schema_reduce:
@@ -0,0 +1,144 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from concurrent.futures.process import BrokenProcessPool
+import os
+import signal
+import time
+from unittest import mock
+
+from configman.dotdict import DotDict
+import pytest
+
+from socorro.lib.process_pool_task_manager import ProcessPoolTaskManager
+
+
+def build_config(number_of_processes=2):
+    config = DotDict()
+    config.idle_delay = 1
+    config.number_of_threads = 1
+    config.number_of_processes = number_of_processes
+    config.maximum_queue_size = 2
+    config.quit_on_empty_queue = True
+    return config
+
+
+class TestProcessPoolTaskManager:
+    def test_constructor(self):
+        config = build_config(number_of_processes=3)
+        tm = ProcessPoolTaskManager(config)
+        assert tm.number_of_processes == 3
+        assert tm.number_of_threads == 3
+        assert tm.task_func == tm._dispatch
+        assert not tm.quit
+
+    def test_tasks_run_in_worker_processes(self, tmp_path):
+        parent_pid = os.getpid()
+
+        def worker_init():
+            (tmp_path / f"init_{os.getpid()}").write_text("")
+
+        def task_func(index):
+            (tmp_path / f"task_{index}").write_text(str(os.getpid()))
+
+        tm = ProcessPoolTaskManager(
+            build_config(), task_func=task_func, worker_init_func=worker_init
+        )
+        tm.blocking_start()
+
+        task_pids = {
+            int((tmp_path / f"task_{index}").read_text()) for index in range(10)
+        }
+        assert parent_pid not in task_pids
+        init_pids = {int(path.name.split("_")[1]) for path in tmp_path.glob("init_*")}
+        assert task_pids <= init_pids
+
+    def test_finished_func_called_in_main_process(self):
+        parent_pid = os.getpid()
+        finished_pids = []
+
+        def finished_func():
+            finished_pids.append(os.getpid())
+
+        def task_func(index, finished_func=None):
+            # finished_func never goes to the worker process
+            assert finished_func is None
+            if index % 2:
+                raise ValueError("simulated error")
+
+        jobs = [((x,), {"finished_func": finished_func}) for x in range(6)]
+        tm = ProcessPoolTaskManager(
+            build_config(), job_source_iterator=jobs, task_func=task_func
+        )
+        tm.blocking_start()
+
+        assert finished_pids == [parent_pid] * 6
+
+    def test_signal_workers(self, tmp_path):
+        def handle_signal(signal_number, frame):
+            (tmp_path / f"signaled_{os.getpid()}").write_text("")
+
+        def worker_init():
+            signal.signal(signal.SIGUSR1, handle_signal)
+
+        tm = ProcessPoolTaskManager(build_config(), worker_init_func=worker_init)
+        # Nothing happens before the workers are started
+        tm.signal_workers(signal.SIGUSR1)
+
+        tm.start_workers()
+        try:
+            tm.signal_workers(signal.SIGUSR1)
+            for _ in range(50):
+                if len(list(tmp_path.glob("signaled_*"))) == 2:
+                    break
+                time.sleep(0.1)
+        finally:
+            tm._executor.shutdown(wait=True)
+
+        signaled_pids = {
+            int(path.name.split("_")[1]) for path in tmp_path.glob("signaled_*")
+        }
+        assert len(signaled_pids) == 2
+        assert os.getpid() not in signaled_pids
+
+    def test_number_of_threads_warning(self, caplog):
+        config = build_config(number_of_processes=3)
+        ProcessPoolTaskManager(config)
+        assert "number_of_threads (1) is ignored" in caplog.text
+
+    def test_start_workers_init_error(self):
+        def worker_init():
+            raise ValueError("simulated error")
+
+        tm = ProcessPoolTaskManager(build_config(), worker_init_func=worker_init)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                tm.start_workers()
+        finally:
+            tm._executor.shutdown(wait=True)
+
+    def test_broken_pool_stops(self, tmp_path):
+        config = build_config(number_of_processes=1)
+        config.quit_on_empty_queue = False
+
+        def task_func(index):
+            if index == 1:
+                # Simulate the OOM killer taking out the worker process
+                os._exit(1)
+            (tmp_path / f"task_{index}").write_text("")
+
+        finished_func = mock.Mock()
+        jobs = [((x,), {"finished_func": finished_func}) for x in range(10)]
+        tm = ProcessPoolTaskManager(
+            config, job_source_iterator=jobs, task_func=task_func
+        )
+        with pytest.raises(BrokenProcessPool):
+            tm.blocking_start()
+
+        # The job that was running when the pool broke is finished, but the jobs
+        # after it aren't run or finished
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["task_0"]
+        assert finished_func.call_count == 2
+        assert tm.quit
+        assert tm._executor is None
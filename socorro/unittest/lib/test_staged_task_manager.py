@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import threading
+import time
+from unittest import mock
+
+from configman.dotdict import DotDict
+
+from socorro.lib.staged_task_manager import (
+    StagedTaskManager,
+    StageQueue,
+    str_to_stage_threads,
+)
+
+
+def build_config(stage_threads=""):
+    config = DotDict()
+    config.idle_delay = 1
+    config.number_of_threads = 2
+    config.maximum_queue_size = 2
+    config.quit_on_empty_queue = True
+    config.stage_threads = stage_threads
+    config.metrics_prefix = "processor"
+    return config
+
+
+def test_str_to_stage_threads():
+    assert str_to_stage_threads("") == {}
+    assert str_to_stage_threads("fetch:8, stackwalk: 2") == {
+        "fetch": 8,
+        "stackwalk": 2,
+    }
+
+
+class TestStageQueue:
+    def test_enqueued_at_is_when_put(self):
+        stage_queue = StageQueue(1)
+        stage_queue.put((mock.Mock(), ((1,), {})))
+
+        # The queue is full, so this put blocks until the first item is taken
+        second = mock.Mock()
+        put_thread = threading.Thread(
+            target=stage_queue.put, args=((second, ((2,), {})),)
+        )
+        put_thread.start()
+        time.sleep(0.1)
+        taken_at = time.time()
+        stage_queue.get()
+        put_thread.join()
+
+        function, arguments = stage_queue.get()
+        assert arguments == ((2,), {})
+        function(2)
+        enqueued_at = second.call_args.kwargs["enqueued_at"]
+        assert enqueued_at >= taken_at
+
+    def test_death_token(self):
+        stage_queue = StageQueue(1)
+        stage_queue.put((None, None))
+        assert stage_queue.get() == (None, None)
+
+
+class TestStagedTaskManager:
+    def test_constructor(self):
+        stages = [("fetch", mock.Mock()), ("save", mock.Mock())]
+        tm = StagedTaskManager(build_config(stage_threads="fetch:5"), stages=stages)
+        assert tm.stage_number_of_threads == [5, 2]
+        assert len(tm.stage_queues) == 2
+        assert tm.task_queue is tm.stage_queues[0]
+        assert tm.task_func == tm._start_job
+
+    def test_default_single_stage(self):
+        task_func = mock.Mock()
+        tm = StagedTaskManager(build_config(), task_func=task_func)
+        tm.blocking_start()
+        assert task_func.call_count == 10
+
+    def test_jobs_go_through_stages(self, metricsmock):
+        saved = []
+        lock = threading.Lock()
+        stage_threads = {}
+
+        def record_thread(name):
+            with lock:
+                stage_threads.setdefault(name, set()).add(threading.current_thread())
+
+        def fetch(index):
+            record_thread("fetch")
+            return index * 10
+
+        def transform(value):
+            record_thread("transform")
+            if value == 30:
+                # Returning None ends the job
+                return None
+            return value + 1
+
+        def save(value):
+            record_thread("save")
+            time.sleep(0.01)
+            with lock:
+                saved.append(value)
+
+        finished_func = mock.Mock()
+        jobs = [((x,), {"finished_func": finished_func}) for x in range(6)]
+        tm = StagedTaskManager(
+            build_config(stage_threads="save:1"),
+            job_source_iterator=jobs,
+            stages=[("fetch", fetch), ("transform", transform), ("save", save)],
+        )
+        with metricsmock as mm:
+            tm.blocking_start()
+
+        assert sorted(saved) == [1, 11, 21, 41, 51]
+        assert finished_func.call_count == 6
+        # Each stage runs in its own threads
+        assert len(stage_threads["save"]) == 1
+        assert not stage_threads["fetch"] & stage_threads["transform"]
+        assert not stage_threads["transform"] & stage_threads["save"]
+
+        for stage in ("fetch", "transform", "save"):
+            assert mm.filter_records(
+                "timing", stat="processor.stage.timing", tags=[f"stage:{stage}"]
+            )
+            assert mm.filter_records(
+                "timing", stat="processor.stage.wait_timing", tags=[f"stage:{stage}"]
+            )
+        assert mm.filter_records("gauge", stat="processor.stage.queue_depth")
+
+    def test_stage_error_finishes_job(self):
+        def fetch(index):
+            return index
+
+        def save(value):
+            if value % 2:
+                raise ValueError("simulated error")
+
+        finished_func = mock.Mock()
+        jobs = [((x,), {"finished_func": finished_func}) for x in range(4)]
+        tm = StagedTaskManager(
+            build_config(),
+            job_source_iterator=jobs,
+            stages=[("fetch", fetch), ("save", save)],
+        )
+        tm.blocking_start()
+
+        assert finished_func.call_count == 4
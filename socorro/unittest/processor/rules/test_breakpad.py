@@ -3,13 +3,20 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import copy
+import io
 import json
+import logging
+import shlex
+import sys
 from unittest import mock
 
 from markus.testing import MetricsMock
+import pytest
 
 from socorro.processor.processor_pipeline import ProcessorPipeline
 from socorro.processor.rules.breakpad import (
+    execute_process_streaming,
+    parse_json_stream,
     CrashingThreadInfoRule,
     MinidumpSha256Rule,
     MinidumpStackwalkRule,
@@ -350,19 +357,21 @@ MINIMAL_STACKWALKER_OUTPUT_STR = json.dumps(MINIMAL_STACKWALKER_OUTPUT)
 class TestMinidumpStackwalkRule:
     # NOTE(willkg): this tests the mechanics of the rule that runs minidump-stackwalk,
     # but doesn't test minidump-stackwalk itself
-    def build_rule(self):
+    def build_rule(self, **kwargs):
         config = ProcessorPipeline.required_config.minidumpstackwalk
 
-        return MinidumpStackwalkRule(
-            dump_field="upload_file_minidump",
-            symbols_urls=config.symbols_urls.default,
-            command_path=config.command_path.default,
-            command_line=config.command_line.default,
-            kill_timeout=5,
-            symbol_tmp_path="/tmp/symbols/tmp",
-            symbol_cache_path="/tmp/symbols/cache",
-            tmp_path="/tmp",
-        )
+        params = {
+            "dump_field": "upload_file_minidump",
+            "symbols_urls": config.symbols_urls.default,
+            "command_path": config.command_path.default,
+            "command_line": config.command_line.default,
+            "kill_timeout": 5,
+            "symbol_tmp_path": "/tmp/symbols/tmp",
+            "symbol_cache_path": "/tmp/symbols/cache",
+            "tmp_path": "/tmp",
+        }
+        params.update(kwargs)
+        return MinidumpStackwalkRule(**params)
 
     def test_everything_we_hoped_for(self, tmp_path):
         rule = self.build_rule()
@@ -484,3 +493,405 @@ class TestMinidumpStackwalkRule:
 
         assert processed_crash["mdsw_status_string"] == "EmptyMinidump"
         assert processed_crash["mdsw_stderr"] == "Shortcut for 0-bytes minidump."
+
+    def test_parse_output_logs_prefix(self, caplog):
+        rule = self.build_rule()
+
+        output = b"not json " + b"x" * 2000
+        with caplog.at_level(logging.DEBUG, logger="socorro.processor.rules"):
+            ret = rule.parse_output(io.BytesIO(output))
+
+        assert ret["data"] is None
+        assert isinstance(ret["error"], ValueError)
+        # Only the beginning of the output is logged
+        assert repr(output[:1000]) in caplog.text
+        assert repr(output[:1001]) not in caplog.text
+
+    def test_stream_output(self, tmp_path):
+        rule = self.build_rule(
+            command_line="cat {dump_file_path}",
+            stream_output=True,
+        )
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text(MINIMAL_STACKWALKER_OUTPUT_STR)
+
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+        processed_crash = {}
+        processor_meta = get_basic_processor_meta_data()
+
+        with MetricsMock() as mm:
+            rule.act(raw_crash, dumps, processed_crash, processor_meta)
+
+            mm.assert_histogram(
+                "processor.minidumpstackwalk.output_bytes",
+                value=len(MINIMAL_STACKWALKER_OUTPUT_STR),
+            )
+            mm.assert_timing(
+                "processor.minidumpstackwalk.parse_timing", tags=["parser:ijson"]
+            )
+            mm.assert_timing("processor.minidumpstackwalk.read_timing")
+
+        expected_output = copy.deepcopy(MINIMAL_STACKWALKER_OUTPUT)
+        expected_output["stackwalk_version"] = rule.stackwalk_version
+
+        assert processed_crash["mdsw_return_code"] == 0
+        assert processed_crash["success"] is True
+        assert processed_crash["json_dump"] == expected_output
+
+    @pytest.mark.parametrize("use_slots", [False, True])
+    def test_parallel_dumps(self, tmp_path, use_slots):
+        # The fake stackwalker sleeps for as long as the dump says so the first
+        # dump finishes last
+        script_path = tmp_path / "fake_stackwalker.py"
+        script_path.write_text(
+            "import json, sys, time\n"
+            "data = json.load(open(sys.argv[1]))\n"
+            "time.sleep(data['sleep'])\n"
+            "json.dump(data, sys.stdout)\n"
+        )
+        rule = self.build_rule(
+            command_line=f"{shlex.quote(sys.executable)} {script_path} {{dump_file_path}}",
+            parallel_dumps=True,
+            max_concurrent_stackwalks=2,
+            stackwalk_slots_path=str(tmp_path / "slots") if use_slots else "",
+        )
+        if use_slots:
+            assert rule.stackwalk_slots is not None
+            assert rule.stackwalk_semaphore is None
+
+        dumps = {}
+        for dump_name, sleep in [
+            ("upload_file_minidump", 0.5),
+            ("upload_file_minidump_browser", 0),
+            ("upload_file_minidump_content", 0),
+        ]:
+            dumppath = tmp_path / dump_name
+            dumppath.write_text(json.dumps({"status": dump_name, "sleep": sleep}))
+            dumps[dump_name] = str(dumppath)
+
+        raw_crash = {"uuid": example_uuid}
+        processed_crash = {}
+        processor_meta = get_basic_processor_meta_data()
+
+        try:
+            rule.act(raw_crash, dumps, processed_crash, processor_meta)
+        finally:
+            rule.close()
+
+        assert processed_crash["mdsw_status_string"] == "upload_file_minidump"
+        assert processed_crash["additional_minidumps"] == [
+            "upload_file_minidump_browser",
+            "upload_file_minidump_content",
+        ]
+        for dump_name in processed_crash["additional_minidumps"]:
+            assert processed_crash[dump_name]["mdsw_status_string"] == dump_name
+        # Notes are in dumps order and not in the order the stackwalks finished
+        assert processor_meta["processor_notes"] == [
+            "MinidumpStackwalkRule: minidump-stackwalk: failed with 0: "
+            + "upload_file_minidump",
+            "MinidumpStackwalkRule: minidump-stackwalk: failed with 0: "
+            + "upload_file_minidump_browser",
+            "MinidumpStackwalkRule: minidump-stackwalk: failed with 0: "
+            + "upload_file_minidump_content",
+        ]
+
+    def test_cache(self, tmp_path):
+        cache_path = str(tmp_path / "cache")
+        rule = self.build_rule(
+            command_line="cat {dump_file_path}", cache_path=cache_path
+        )
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text(MINIMAL_STACKWALKER_OUTPUT_STR)
+
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+
+        with MetricsMock() as mm:
+            processed_crash = {}
+            rule.act(raw_crash, dumps, processed_crash, {"processor_notes": []})
+            assert processed_crash["success"] is True
+            mm.assert_incr("processor.minidumpstackwalk.cache", tags=["result:miss"])
+            mm.assert_incr("processor.minidumpstackwalk.run")
+            mm.clear_records()
+
+            # The second time, the result comes from the cache and the stackwalker
+            # isn't run
+            cached_processed_crash = {}
+            rule.act(raw_crash, dumps, cached_processed_crash, {"processor_notes": []})
+            assert cached_processed_crash == processed_crash
+            mm.assert_incr("processor.minidumpstackwalk.cache", tags=["result:hit"])
+            mm.assert_not_incr("processor.minidumpstackwalk.run")
+            # Symbols metrics are emitted for cached results, too
+            mm.assert_histogram("processor.minidumpstackwalk.symbols_cache_hits")
+            mm.clear_records()
+
+            # A new symbols generation doesn't use results from the old one
+            rule = self.build_rule(
+                command_line="cat {dump_file_path}",
+                cache_path=cache_path,
+                symbols_generation="2",
+            )
+            rule.act(raw_crash, dumps, {}, {"processor_notes": []})
+            mm.assert_incr("processor.minidumpstackwalk.cache", tags=["result:miss"])
+
+    def test_cache_replays_notes(self, tmp_path):
+        rule = self.build_rule(
+            command_line="cat {dump_file_path}", cache_path=str(tmp_path / "cache")
+        )
+        run_stackwalker = rule.run_stackwalker
+
+        def run_stackwalker_with_note(*args, processor_meta_data, **kwargs):
+            processor_meta_data["processor_notes"].append("stackwalker note")
+            return run_stackwalker(
+                *args, processor_meta_data=processor_meta_data, **kwargs
+            )
+
+        rule.run_stackwalker = run_stackwalker_with_note
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text(MINIMAL_STACKWALKER_OUTPUT_STR)
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+
+        for _ in range(2):
+            processor_meta_data = {"processor_notes": []}
+            rule.act(raw_crash, dumps, {}, processor_meta_data)
+            assert processor_meta_data["processor_notes"] == ["stackwalker note"]
+
+    def test_cache_errors(self, tmp_path):
+        cache_path = tmp_path / "cache"
+        rule = self.build_rule(
+            command_line="cat {dump_file_path}", cache_path=str(cache_path)
+        )
+        # Replace the cache directory with a file so using it fails
+        cache_path.rmdir()
+        cache_path.write_text("")
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text(MINIMAL_STACKWALKER_OUTPUT_STR)
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+
+        with MetricsMock() as mm:
+            processed_crash = {}
+            rule.act(raw_crash, dumps, processed_crash, {"processor_notes": []})
+            assert processed_crash["success"] is True
+            mm.assert_incr("processor.minidumpstackwalk.cache_error", tags=["op:get"])
+            mm.assert_incr("processor.minidumpstackwalk.cache_error", tags=["op:put"])
+            mm.assert_incr("processor.minidumpstackwalk.run")
+
+    def test_quarantine(self, tmp_path):
+        quarantine_path = str(tmp_path / "quarantine")
+        # timeout exits with 124 when it kills the stackwalker
+        rule = self.build_rule(
+            command_line='sh -c "exit 124"', quarantine_path=quarantine_path
+        )
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text("abcde")
+
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+
+        with MetricsMock() as mm:
+            processor_meta_data = {"processor_notes": []}
+            rule.act(raw_crash, dumps, {}, processor_meta_data)
+            assert processor_meta_data["processor_notes"] == [
+                "MinidumpStackwalkRule: minidump-stackwalk: timeout (SIGKILL)"
+            ]
+            mm.assert_histogram("processor.minidumpstackwalk.kill_timeout", value=5)
+            mm.assert_timing("processor.minidumpstackwalk.killed_time")
+            mm.assert_incr(
+                "processor.minidumpstackwalk.quarantine", tags=["result:added"]
+            )
+            assert len(rule.quarantine) == 1
+            mm.clear_records()
+
+            # The second time, the minidump is skipped
+            processed_crash = {}
+            processor_meta_data = {"processor_notes": []}
+            rule.act(raw_crash, dumps, processed_crash, processor_meta_data)
+            assert processed_crash["mdsw_status_string"] == "Quarantined"
+            assert processor_meta_data["processor_notes"] == [
+                "MinidumpStackwalkRule: upload_file_minidump was killed before and "
+                + "is quarantined--skipping minidump processing"
+            ]
+            mm.assert_incr(
+                "processor.minidumpstackwalk.quarantine", tags=["result:skipped"]
+            )
+            mm.assert_not_incr("processor.minidumpstackwalk.run")
+            mm.clear_records()
+
+            # With a quarantine kill timeout, it's run with that kill timeout
+            rule = self.build_rule(
+                command_line="cat {dump_file_path}",
+                quarantine_path=quarantine_path,
+                quarantine_kill_timeout=2,
+            )
+            rule.act(raw_crash, dumps, {}, {"processor_notes": []})
+            mm.assert_incr(
+                "processor.minidumpstackwalk.quarantine", tags=["result:slow_lane"]
+            )
+            mm.assert_histogram("processor.minidumpstackwalk.kill_timeout", value=2)
+            mm.assert_incr("processor.minidumpstackwalk.run")
+
+    def test_adaptive_kill_timeout(self, tmp_path):
+        rule = self.build_rule(
+            command_line="cat {dump_file_path}",
+            adaptive_kill_timeout=True,
+            kill_timeout=600,
+            min_kill_timeout=1,
+        )
+
+        dumppath = tmp_path / "dumpfile.dmp"
+        dumppath.write_text(MINIMAL_STACKWALKER_OUTPUT_STR)
+
+        raw_crash = {"uuid": example_uuid}
+        dumps = {rule.dump_field: str(dumppath)}
+
+        with MetricsMock() as mm:
+            # Until there are enough durations, minidumps get the kill timeout
+            for _ in range(rule.budget.min_samples):
+                rule.act(raw_crash, dumps, {}, {"processor_notes": []})
+            records = mm.filter_records(
+                "histogram", stat="processor.minidumpstackwalk.kill_timeout"
+            )
+            assert [record.value for record in records] == [600] * 20
+            mm.clear_records()
+
+            # After that, they get a multiple of how long they took
+            rule.act(raw_crash, dumps, {}, {"processor_notes": []})
+            records = mm.filter_records(
+                "histogram", stat="processor.minidumpstackwalk.kill_timeout"
+            )
+            assert len(records) == 1
+            assert 1 <= records[0].value < 600
+
+    def test_symbols_metrics(self):
+        rule = self.build_rule()
+        output = {
+            "modules": [
+                {"loaded_symbols": True, "symbol_disk_cache_hit": True},
+                {"loaded_symbols": True, "symbol_disk_cache_hit": True},
+                {
+                    "loaded_symbols": True,
+                    "symbol_disk_cache_hit": False,
+                    "symbol_fetch_time": 52.5,
+                },
+                {"missing_symbols": True, "symbol_fetch_time": 10.0},
+                {"filename": "no symbols info"},
+            ]
+        }
+        with MetricsMock() as mm:
+            rule.emit_symbols_metrics(output)
+
+            mm.assert_histogram(
+                "processor.minidumpstackwalk.symbols_cache_hits", value=2
+            )
+            mm.assert_histogram(
+                "processor.minidumpstackwalk.symbols_downloads", value=1
+            )
+            mm.assert_histogram("processor.minidumpstackwalk.symbols_missing", value=1)
+            mm.assert_histogram(
+                "processor.minidumpstackwalk.symbols_fetch_time", value=62.5
+            )
+
+    def test_log_modules(self, tmp_path):
+        modules_log_path = tmp_path / "modules.log"
+        rule = self.build_rule(modules_log_path=str(modules_log_path))
+        json_dumps = [
+            {
+                "modules": [
+                    {
+                        "debug_file": "xul.pdb",
+                        "debug_id": "44E4EC8C2F41492B9369D6B9A059577C2",
+                        "loaded_symbols": True,
+                    },
+                    {
+                        "debug_file": "ntdll.pdb",
+                        "debug_id": "1EB9FACB04EA273BB24BA52C8B8A7B7A1",
+                        "missing_symbols": True,
+                    },
+                ]
+            },
+            {
+                "modules": [
+                    {
+                        "debug_file": "xul.pdb",
+                        "debug_id": "44E4EC8C2F41492B9369D6B9A059577C2",
+                        "loaded_symbols": True,
+                    },
+                    {
+                        "debug_file": "mozglue.pdb",
+                        "debug_id": "9C2A3F0B8E1D4C5A8B7E6D5C4B3A2F1E1",
+                        "loaded_symbols": True,
+                    },
+                ]
+            },
+            # Stackwalker failures have no output
+            {},
+        ]
+        rule.log_modules(json_dumps)
+        rule.log_modules([{"modules": []}])
+        rule.log_modules(json_dumps[:1])
+
+        assert modules_log_path.read_text() == (
+            "mozglue.pdb/9C2A3F0B8E1D4C5A8B7E6D5C4B3A2F1E1;"
+            + "xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2\n"
+            + "xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2\n"
+        )
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_parse_json_stream(incremental):
+    data, parser = parse_json_stream(
+        io.BytesIO(MINIMAL_STACKWALKER_OUTPUT_STR.encode()), incremental=incremental
+    )
+    assert data == MINIMAL_STACKWALKER_OUTPUT
+    assert parser == ("ijson" if incremental else "orjson")
+
+    with pytest.raises(ValueError):
+        parse_json_stream(io.BytesIO(b"{ff"), incremental=incremental)
+
+
+def test_parse_json_stream_incremental():
+    """Test the document is parsed as it's read and not read all at once"""
+
+    class SlowReader:
+        """Hands out at most 64 bytes at a time like a pipe from a slow process"""
+
+        def __init__(self, data):
+            self.fp = io.BytesIO(data)
+
+        def read(self, size=-1):
+            assert size >= 0, "tried to read everything at once"
+            return self.fp.read(min(size, 64))
+
+    document = {"status": "OK", "frames": [{"frame": i} for i in range(1000)]}
+    document_bytes = json.dumps(document).encode("utf-8")
+    # The document is followed by a lot of whitespace that's never read
+    reader = SlowReader(document_bytes + b" " * 1000000)
+
+    data, parser = parse_json_stream(reader)
+    assert parser == "ijson"
+    assert data == document
+    assert reader.fp.tell() < len(document_bytes) + 1000
+
+
+def test_execute_process_streaming(tmp_path):
+    path = tmp_path / "output.json"
+    path.write_text('{"status": "OK"}')
+
+    def stdout_handler(fp):
+        # Read part of the output; the rest gets drained
+        return fp.read(3)
+
+    command_line = f"{shlex.quote(sys.executable)} -c " + shlex.quote(
+        "import sys; sys.stderr.write('oops'); "
+        + f"sys.stdout.write(open({str(path)!r}).read() * 100000); sys.exit(2)"
+    )
+    ret = execute_process_streaming(command_line, stdout_handler)
+    assert ret == {"output": b'{"s', "stderr": b"oops", "returncode": 2}
@@ -0,0 +1,105 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import json
+
+from socorro.processor.benchmark import (
+    BenchmarkPipeline,
+    DEFAULT_CORPUS,
+    format_results,
+    get_config,
+    is_regression,
+    load_corpus,
+    main,
+    run_benchmark,
+    StubbedBetaVersionRule,
+    StubbedMinidumpStackwalkRule,
+)
+
+
+def test_load_corpus(tmp_path):
+    corpus = load_corpus(DEFAULT_CORPUS, str(tmp_path))
+    assert len(corpus) == 3
+    for raw_crash, dumps in corpus:
+        assert list(dumps.keys()) == ["upload_file_minidump"]
+        with open(dumps["upload_file_minidump"], "r") as fp:
+            assert json.load(fp)["status"] == "OK"
+
+
+def test_stubbed_rules(tmp_path):
+    pipeline = BenchmarkPipeline(get_config(str(tmp_path)))
+    rule_classes = [rule.__class__ for rule in pipeline.rulesets["default"]]
+    assert StubbedMinidumpStackwalkRule in rule_classes
+    assert StubbedBetaVersionRule in rule_classes
+
+
+def test_run_benchmark(tmp_path):
+    corpus = load_corpus(DEFAULT_CORPUS, str(tmp_path))
+    pipeline = BenchmarkPipeline(get_config(str(tmp_path)))
+    results = run_benchmark(pipeline, corpus, iterations=2, warmup=1)
+
+    assert results["crashes"] == 6
+    assert results["crashes_per_sec"] > 0
+    assert results["peak_rss_mb"] > 0
+    stackwalk_results = results["rules"][StubbedMinidumpStackwalkRule().name]
+    # Warmup runs aren't counted
+    assert stackwalk_results["count"] == 6
+    assert set(stackwalk_results.keys()) == {
+        "count",
+        "total_ms",
+        "p50_ms",
+        "p90_ms",
+        "p99_ms",
+    }
+
+    # The stackwalker output made it into the processed crash
+    raw_crash, dumps = corpus[0]
+    processed_crash = {}
+    pipeline.process_crash("default", dict(raw_crash), dumps, processed_crash)
+    assert processed_crash["mdsw_status_string"] == "OK"
+    assert processed_crash["json_dump"]["stackwalk_version"] == "stubbed"
+    assert processed_crash["signature"] != "EMPTY: no crashing thread identified"
+
+
+def test_compare_with_baseline():
+    baseline = {
+        "crashes_per_sec": 100.0,
+        "peak_rss_mb": 50.0,
+        "rules": {"rule": {"p50_ms": 1.0}},
+    }
+    results = {
+        "crashes": 10,
+        "crashes_per_sec": 80.0,
+        "peak_rss_mb": 50.0,
+        "rules": {
+            "rule": {
+                "count": 10,
+                "total_ms": 20.0,
+                "p50_ms": 2.0,
+                "p90_ms": 2.0,
+                "p99_ms": 2.0,
+            }
+        },
+    }
+    text = format_results(results, baseline)
+    assert "80.00 (-20.0%)" in text
+    assert "(+100.0%)" in text
+
+    assert is_regression(baseline, results, max_regression=10.0)
+    assert not is_regression(baseline, results, max_regression=25.0)
+
+
+def test_main_baseline(tmp_path, capsys):
+    baseline_path = str(tmp_path / "baseline.json")
+    assert main(["--iterations=1", f"--save-baseline={baseline_path}"]) == 0
+    with open(baseline_path, "r") as fp:
+        baseline = json.load(fp)
+    assert baseline["crashes"] == 3
+
+    # Compare against a baseline that's impossible to beat
+    baseline["crashes_per_sec"] = 1_000_000_000
+    with open(baseline_path, "w") as fp:
+        json.dump(baseline, fp)
+    assert main(["--iterations=1", f"--baseline={baseline_path}"]) == 1
+    assert "dropped more than" in capsys.readouterr().out
@@ -2,9 +2,12 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+import functools
 import json
 import os
 from pathlib import Path
+import signal
 from unittest import mock
 from unittest.mock import ANY
 
@@ -12,8 +15,17 @@ from configman.dotdict import DotDict
 from markus.testing import MetricsMock
 import pytest
 
-from socorro.external.crashstorage_base import CrashIDNotFound, PolyStorageError
-from socorro.processor.processor_app import ProcessorApp, count_sentry_scrub_error
+from socorro.external.crashstorage_base import (
+    CrashIDNotFound,
+    CrashStorageBase,
+    PolyStorageError,
+)
+from socorro.lib.process_pool_task_manager import ProcessPoolTaskManager
+from socorro.processor.processor_app import (
+    as_dict,
+    count_sentry_scrub_error,
+    ProcessorApp,
+)
 
 
 def sequencer(*args):
@@ -39,6 +51,10 @@ def get_standard_config():
     config.source = DotDict()
     mocked_source_crashstorage = mock.Mock()
     mocked_source_crashstorage.id = "mocked_source_crashstorage"
+    # Fetch crash bundles with the other mocked get methods
+    mocked_source_crashstorage.get_crash_bundle.side_effect = functools.partial(
+        CrashStorageBase.get_crash_bundle, mocked_source_crashstorage
+    )
     config.source.crashstorage_class = mock.Mock(
         return_value=mocked_source_crashstorage
     )
@@ -53,6 +69,7 @@ def get_standard_config():
     config.processor = DotDict()
     mocked_processor = mock.Mock()
     mocked_processor.id = "mocked_processor"
+    mocked_processor.profiler = None
     config.processor.processor_class = mock.Mock(return_value=mocked_processor)
 
     config.queue = DotDict()
@@ -114,6 +131,227 @@ class TestProcessorApp:
         )
         assert finished_func.call_count == 1
 
+    def test_transform_async_success(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+
+        async def run_in_cpu_executor(func, *args, **kwargs):
+            return func(*args, **kwargs)
+
+        pa.task_manager = mock.Mock()
+        pa.task_manager.run_in_cpu_executor = run_in_cpu_executor
+
+        fake_raw_crash = DotDict({"raw": "1"})
+        pa.source.get_raw_crash_async = mock.AsyncMock(return_value=fake_raw_crash)
+
+        fake_dumps = {"upload_file_minidump": "fake_dump_TEMPORARY.dump"}
+        pa.source.get_dumps_as_files_async = mock.AsyncMock(return_value=fake_dumps)
+
+        fake_processed_crash = DotDict({"uuid": "9d8e7127-9d98-4d92-8ab1-065982200317"})
+        pa.source.get_unredacted_processed_async = mock.AsyncMock(
+            return_value=fake_processed_crash
+        )
+
+        mocked_process_crash = mock.Mock(return_value=DotDict({"processed": "1"}))
+        pa.processor.process_crash = mocked_process_crash
+        pa.destination.save_processed_crash_async = mock.AsyncMock()
+        finished_func = mock.Mock()
+        patch_path = "socorro.processor.processor_app.os.unlink"
+        with mock.patch(patch_path) as mocked_unlink:
+            # the call being tested
+            asyncio.run(pa.transform_async("17", finished_func))
+        # test results
+        mocked_unlink.assert_called_with("fake_dump_TEMPORARY.dump")
+        pa.source.get_raw_crash_async.assert_called_with("17")
+        pa.processor.process_crash.assert_called_with(
+            "default", fake_raw_crash, fake_dumps, fake_processed_crash
+        )
+        pa.destination.save_processed_crash_async.assert_called_with(
+            {"raw": "1"}, {"processed": "1"}
+        )
+        assert finished_func.call_count == 1
+
+    def test_transform_async_default_executor(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+
+        # Task managers without a cpu executor use the event loop's
+        pa.task_manager = mock.Mock(spec=[])
+
+        pa.source.get_raw_crash_async = mock.AsyncMock(return_value={"raw": "1"})
+        pa.source.get_dumps_as_files_async = mock.AsyncMock(return_value={})
+        pa.source.get_unredacted_processed_async = mock.AsyncMock(
+            side_effect=CrashIDNotFound("17")
+        )
+        pa.processor.process_crash = mock.Mock(return_value={"processed": "1"})
+        pa.destination.save_processed_crash_async = mock.AsyncMock()
+        finished_func = mock.Mock()
+
+        asyncio.run(pa.transform_async("17", finished_func))
+
+        pa.processor.process_crash.assert_called_with("default", {"raw": "1"}, {}, {})
+        pa.destination.save_processed_crash_async.assert_called_with(
+            {"raw": "1"}, {"processed": "1"}
+        )
+        assert finished_func.call_count == 1
+
+    def test_transform_async_crash_id_missing(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.task_manager = mock.Mock(spec=[])
+
+        pa.source.get_raw_crash_async = mock.AsyncMock(
+            side_effect=CrashIDNotFound("17")
+        )
+        pa.processor.reject_raw_crash = mock.Mock()
+        pa.destination.save_processed_crash_async = mock.AsyncMock()
+        finished_func = mock.Mock()
+
+        asyncio.run(pa.transform_async("17", finished_func))
+
+        pa.processor.reject_raw_crash.assert_called_with(
+            "17", "crash cannot be found in raw crash storage"
+        )
+        pa.destination.save_processed_crash_async.assert_not_called()
+        assert finished_func.call_count == 1
+
+    def test_dump_profile_report(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.processor.profiler = mock.Mock()
+
+        pa._dump_profile_report()
+        pa.processor.profiler.dump_report.assert_called_once_with()
+
+    def test_dump_profile_report_process_pool(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.processor.profiler = mock.Mock()
+        tm_config = DotDict(
+            {
+                "idle_delay": 1,
+                "number_of_threads": 2,
+                "number_of_processes": 2,
+                "maximum_queue_size": 2,
+                "quit_on_empty_queue": True,
+            }
+        )
+        pa.task_manager = ProcessPoolTaskManager(tm_config)
+        pa.task_manager.signal_workers = mock.Mock()
+
+        # The main process passes the signal on to the worker processes
+        pa._dump_profile_report()
+        pa.task_manager.signal_workers.assert_called_once_with(signal.SIGUSR1)
+        pa.processor.profiler.dump_report.assert_not_called()
+
+        # Worker processes dump their own report
+        pa.task_manager.signal_workers.reset_mock()
+        pa.is_worker_process = True
+        pa._dump_profile_report()
+        pa.task_manager.signal_workers.assert_not_called()
+        pa.processor.profiler.dump_report.assert_called_once_with()
+
+    def test_stages_success(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+
+        fake_raw_crash = DotDict({"raw": "1"})
+        pa.source.get_raw_crash = mock.Mock(return_value=fake_raw_crash)
+
+        fake_dumps = {"upload_file_minidump": "fake_dump_TEMPORARY.dump"}
+        pa.source.get_dumps_as_files = mock.Mock(return_value=fake_dumps)
+
+        fake_processed_crash = DotDict({"uuid": "9d8e7127-9d98-4d92-8ab1-065982200317"})
+        pa.source.get_unredacted_processed = mock.Mock(
+            return_value=fake_processed_crash
+        )
+
+        stackwalk_rules = [mock.Mock()]
+        rest_of_rules = [mock.Mock()]
+        pa.processor.split_ruleset = mock.Mock(
+            return_value=(stackwalk_rules, rest_of_rules)
+        )
+        processor_meta_data = DotDict()
+        pa.processor.start_crash = mock.Mock(return_value=processor_meta_data)
+        pa.processor.finish_crash = mock.Mock(return_value=DotDict({"processed": "1"}))
+        pa.destination.save_processed_crash = mock.Mock()
+
+        stages = pa.get_stages()
+        assert [name for name, _ in stages] == ["fetch", "stackwalk", "rules", "save"]
+
+        patch_path = "socorro.processor.processor_app.os.unlink"
+        with mock.patch(patch_path) as mocked_unlink:
+            result = "17"
+            for name, stage_func in stages:
+                result = stage_func(result)
+                if name != "save":
+                    # Dumps are only removed at the end
+                    assert not mocked_unlink.called
+
+        mocked_unlink.assert_called_with("fake_dump_TEMPORARY.dump")
+        pa.source.get_raw_crash.assert_called_with("17")
+        pa.processor.start_crash.assert_called_with(
+            "default", fake_raw_crash, fake_processed_crash
+        )
+        assert pa.processor.apply_rules.call_args_list == [
+            mock.call(
+                stackwalk_rules,
+                "default",
+                fake_raw_crash,
+                fake_dumps,
+                fake_processed_crash,
+                processor_meta_data,
+            ),
+            mock.call(
+                rest_of_rules,
+                "default",
+                fake_raw_crash,
+                fake_dumps,
+                fake_processed_crash,
+                processor_meta_data,
+            ),
+        ]
+        pa.destination.save_processed_crash.assert_called_with(
+            {"raw": "1"}, {"processed": "1"}
+        )
+
+    def test_stages_crash_id_missing(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.source.get_raw_crash.side_effect = CrashIDNotFound(17)
+
+        fetch_stage = pa.get_stages()[0][1]
+        assert fetch_stage("17") is None
+        pa.processor.reject_raw_crash.assert_called_with(
+            "17", "crash cannot be found in raw crash storage"
+        )
+
+    def test_stages_error_removes_dumps(self):
+        config = get_standard_config()
+        pa = ProcessorApp(config)
+        pa._setup_source_and_destination()
+        pa.source.get_raw_crash.return_value = DotDict({"raw": "1"})
+        pa.source.get_dumps_as_files.return_value = {
+            "upload_file_minidump": "fake_dump_TEMPORARY.dump"
+        }
+        pa.processor.split_ruleset.return_value = ([], [])
+        pa.processor.apply_rules.side_effect = Exception("simulated error")
+
+        stages = dict(pa.get_stages())
+        state = stages["fetch"]("17")
+        patch_path = "socorro.processor.processor_app.os.unlink"
+        with mock.patch(patch_path) as mocked_unlink:
+            with pytest.raises(Exception, match="simulated error"):
+                stages["stackwalk"](state)
+        mocked_unlink.assert_called_with("fake_dump_TEMPORARY.dump")
+
     def test_transform_crash_id_missing(self):
         config = get_standard_config()
         pa = ProcessorApp(config)
@@ -278,6 +516,17 @@ def test_transform_get_error(sentry_helper, caplogpp):
         )
 
 
+def test_as_dict():
+    data = {"a": {"b": [1, 2]}}
+    # dicts are returned as is without copying
+    assert as_dict(data) is data
+
+    converted = as_dict(DotDict({"a": DotDict({"b": [1, 2]})}))
+    assert type(converted) is dict
+    assert type(converted["a"]) is dict
+    assert converted == data
+
+
 def test_count_sentry_scrub_error():
     with MetricsMock() as metricsmock:
         metricsmock.clear_records()
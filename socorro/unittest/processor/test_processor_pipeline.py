@@ -5,6 +5,7 @@
 import json
 import os
 from pathlib import Path
+from unittest import mock
 from unittest.mock import ANY
 
 from configman import ConfigurationManager
@@ -14,6 +15,7 @@ import freezegun
 from socorro.lib.libdatetime import utc_now
 from socorro.processor.processor_app import ProcessorApp
 from socorro.processor.processor_pipeline import ProcessorPipeline
+from socorro.processor.rules.breakpad import MinidumpStackwalkRule
 from socorro.processor.rules.general import CPUInfoRule, OSInfoRule
 from socorro.processor.rules.base import Rule
 
@@ -23,6 +25,12 @@ class BadRule(Rule):
         raise KeyError("pii")
 
 
+class FakeStackwalkRule(MinidumpStackwalkRule):
+    def __init__(self):
+        # Skip running the stackwalker to get the version
+        pass
+
+
 def set_up_sentry():
     """Sets up sentry using SENTRY_DSN"""
     # FIXME(willkg): SENTRY_DSN is where we're putting the SENTRY_DSN even if there
@@ -66,7 +74,7 @@ RULE_ERROR_EVENT = {
                             "abs_path": "/app/socorro/processor/processor_pipeline.py",
                             "context_line": ANY,
                             "filename": "socorro/processor/processor_pipeline.py",
-                            "function": "process_crash",
+                            "function": "apply_rules",
                             "in_app": True,
                             "lineno": ANY,
                             "module": "socorro.processor.processor_pipeline",
@@ -197,3 +205,96 @@ class TestProcessorPipeline:
         notes = processed_crash["processor_notes"].split("\n")
         assert ">>> Start processing" in notes[0]
         assert "previousnotes" in notes
+
+    def test_split_ruleset(self):
+        stackwalk_rule = FakeStackwalkRule()
+        cpu_info_rule = CPUInfoRule()
+        os_info_rule = OSInfoRule()
+        pipeline = ProcessorPipeline(
+            self.get_config(),
+            rules={
+                "default": [cpu_info_rule, stackwalk_rule, os_info_rule],
+                "nostackwalk": [cpu_info_rule, os_info_rule],
+            },
+        )
+
+        assert pipeline.split_ruleset("default") == (
+            [cpu_info_rule, stackwalk_rule],
+            [os_info_rule],
+        )
+        assert pipeline.split_ruleset("nostackwalk") == (
+            [],
+            [cpu_info_rule, os_info_rule],
+        )
+        assert pipeline.split_ruleset("missing") == ([], [])
+
+    def test_process_crash_in_steps(self):
+        """Running start_crash, apply_rules, finish_crash is the same as
+        process_crash"""
+        raw_crash = {"uuid": "1"}
+        processed_crash = {}
+        rules = [CPUInfoRule(), OSInfoRule()]
+        pipeline = ProcessorPipeline(self.get_config(), rules={"default": rules})
+
+        processor_meta_data = pipeline.start_crash(
+            "default", raw_crash, processed_crash
+        )
+        pipeline.apply_rules(
+            rules[:1], "default", raw_crash, {}, processed_crash, processor_meta_data
+        )
+        pipeline.apply_rules(
+            rules[1:], "default", raw_crash, {}, processed_crash, processor_meta_data
+        )
+        processed_crash = pipeline.finish_crash(
+            raw_crash, processed_crash, processor_meta_data
+        )
+
+        assert processed_crash["success"]
+        notes = processed_crash["processor_notes"].split("\n")
+        assert ">>> Start processing" in notes[0]
+
+    def test_start_crash_missing_ruleset(self):
+        pipeline = ProcessorPipeline(self.get_config(), rules={"default": []})
+        assert pipeline.start_crash("missing", {"uuid": "1"}, {}) is None
+
+    def test_close(self):
+        rule = CPUInfoRule()
+        rule.close = mock.Mock()
+        other_rule = OSInfoRule()
+        other_rule.close = mock.Mock()
+        pipeline = ProcessorPipeline(
+            self.get_config(),
+            rules={"default": [rule, other_rule], "other": [rule]},
+        )
+
+        pipeline.close()
+        rule.close.assert_called_once_with()
+        other_rule.close.assert_called_once_with()
+
+    def test_profiling(self):
+        config = self.get_config()
+        config.profiling.enabled = True
+        config.profiling.slowest_crashes = 1
+
+        pipeline = ProcessorPipeline(
+            config, rules={"default": [CPUInfoRule(), BadRule()]}
+        )
+        for crash_id in ["1", "2"]:
+            pipeline.process_crash(
+                ruleset_name="default",
+                raw_crash=DotDict({"uuid": crash_id}),
+                dumps={},
+                processed_crash=DotDict(),
+            )
+
+        stats = pipeline.profiler.rule_stats
+        assert sorted(stats.keys()) == [
+            "socorro.processor.rules.general.CPUInfoRule",
+            "socorro.unittest.processor.test_processor_pipeline.BadRule",
+        ]
+        # Rules that raise an error are profiled, too
+        assert (
+            stats["socorro.unittest.processor.test_processor_pipeline.BadRule"].count
+            == 2
+        )
+        assert len(pipeline.profiler.get_slowest_crashes()) == 1
@@ -0,0 +1,96 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pstats
+import time
+import tracemalloc
+
+import pytest
+
+from socorro.processor.rule_profiler import percentile, RuleProfiler
+
+
+@pytest.mark.parametrize(
+    "values, pct, expected",
+    [
+        ([], 50, 0),
+        ([1], 99, 1),
+        ([1, 2, 3, 4], 50, 2),
+        (list(range(1, 101)), 90, 90),
+        (list(range(1, 101)), 99, 99),
+    ],
+)
+def test_percentile(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+class TestRuleProfiler:
+    def test_profile_rule(self):
+        profiler = RuleProfiler(window_size=2)
+        for i in range(3):
+            with profiler.profile_rule("rule1"):
+                time.sleep(0.01)
+
+        with pytest.raises(ValueError):
+            with profiler.profile_rule("rule2"):
+                raise ValueError("simulated error")
+
+        stats = profiler.rule_stats["rule1"]
+        assert stats.count == 3
+        # Only window_size samples are kept
+        assert len(stats.wall_times) == 2
+        assert len(stats.cpu_times) == 2
+        assert all(wall_time >= 0.01 for wall_time in stats.wall_times)
+        # Sleeping doesn't use CPU
+        assert all(cpu_time < 0.01 for cpu_time in stats.cpu_times)
+        assert len(stats.memory) == 0
+
+        assert profiler.rule_stats["rule2"].count == 1
+
+        report = profiler.report().splitlines()
+        # rule1 took the most time, so it's first
+        assert report[1].startswith("rule1 ")
+        assert report[2].startswith("rule2 ")
+
+    def test_trace_memory(self):
+        profiler = RuleProfiler(trace_memory=True)
+        try:
+            with profiler.profile_rule("rule1"):
+                data = [bytearray(1000) for i in range(100)]
+        finally:
+            tracemalloc.stop()
+
+        assert profiler.rule_stats["rule1"].memory[0] >= 100 * 1000
+        del data
+
+    def test_slowest_crashes(self, tmp_path):
+        profiler = RuleProfiler(slowest_crashes=2, report_dir=str(tmp_path))
+        for crash_id, delay in [("a", 0.01), ("b", 0.05), ("c", 0.0), ("d", 0.03)]:
+            with profiler.profile_crash(crash_id):
+                time.sleep(delay)
+
+        slowest = profiler.get_slowest_crashes()
+        assert [crash_id for _, crash_id, _ in slowest] == ["b", "d"]
+
+        profiler.dump_report()
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "b.prof",
+            "d.prof",
+            "rule_profile.txt",
+        ]
+        stats = pstats.Stats(str(tmp_path / "b.prof"))
+        assert stats.total_calls > 0
+        assert "slowest crashes:" in (tmp_path / "rule_profile.txt").read_text()
+
+    def test_dump_report_logs(self, caplogpp):
+        caplogpp.set_level("INFO")
+        profiler = RuleProfiler(slowest_crashes=1)
+        with profiler.profile_rule("rule1"):
+            pass
+        with profiler.profile_crash("a"):
+            time.sleep(0.001)
+
+        profiler.dump_report()
+        messages = [record.getMessage() for record in caplogpp.records]
+        assert any("rule1" in message and "a:" in message for message in messages)
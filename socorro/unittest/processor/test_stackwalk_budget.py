@@ -0,0 +1,102 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import os
+import time
+
+import pytest
+
+from socorro.processor.stackwalk_budget import StackwalkBudget, StackwalkQuarantine
+
+
+MB = 1024 * 1024
+
+
+@pytest.mark.parametrize(
+    "file_size, expected",
+    [
+        (0, 0),
+        (100, 0),
+        (MB, 0),
+        (MB + 1, 1),
+        (2 * MB, 1),
+        (3 * MB, 2),
+        (100 * MB, 7),
+    ],
+)
+def test_get_bucket(file_size, expected):
+    assert StackwalkBudget.get_bucket(file_size) == expected
+
+
+class TestStackwalkBudget:
+    def test_not_enough_samples(self):
+        budget = StackwalkBudget(
+            max_kill_timeout=600, min_kill_timeout=30, multiplier=4.0, min_samples=5
+        )
+        assert budget.get_kill_timeout(MB) == 600
+        for _ in range(4):
+            budget.record(MB, 2.0)
+        assert budget.get_kill_timeout(MB) == 600
+        budget.record(MB, 20.0)
+        assert budget.get_kill_timeout(MB) == 80
+
+    def test_buckets(self):
+        budget = StackwalkBudget(
+            max_kill_timeout=600, min_kill_timeout=1, multiplier=2.0, min_samples=1
+        )
+        budget.record(MB, 2.0)
+        budget.record(50 * MB, 40.0)
+        assert budget.get_kill_timeout(100) == 4
+        assert budget.get_kill_timeout(60 * MB) == 80
+        # Buckets without durations get the maximum
+        assert budget.get_kill_timeout(10 * MB) == 600
+
+    def test_clamped(self):
+        budget = StackwalkBudget(
+            max_kill_timeout=600, min_kill_timeout=30, multiplier=4.0, min_samples=1
+        )
+        budget.record(MB, 0.5)
+        assert budget.get_kill_timeout(MB) == 30
+        budget.record(MB, 500.0)
+        assert budget.get_kill_timeout(MB) == 600
+
+    def test_history_size(self):
+        budget = StackwalkBudget(
+            max_kill_timeout=600,
+            min_kill_timeout=1,
+            multiplier=1.0,
+            history_size=10,
+            min_samples=1,
+        )
+        budget.record(MB, 300.0)
+        for _ in range(10):
+            budget.record(MB, 10.0)
+        # The old long duration is forgotten
+        assert budget.get_kill_timeout(MB) == 10
+
+
+class TestStackwalkQuarantine:
+    def test_add(self, tmp_path):
+        quarantine = StackwalkQuarantine(str(tmp_path / "quarantine"), ttl=100)
+        assert "abcd" not in quarantine
+        assert len(quarantine) == 0
+
+        quarantine.add("abcd")
+        assert "abcd" in quarantine
+        assert len(quarantine) == 1
+
+        # Another quarantine using the same directory sees it
+        other = StackwalkQuarantine(str(tmp_path / "quarantine"), ttl=100)
+        assert "abcd" in other
+
+    def test_ttl(self, tmp_path):
+        quarantine = StackwalkQuarantine(str(tmp_path), ttl=100)
+        quarantine.add("abcd")
+
+        old = time.time() - 200
+        os.utime(tmp_path / "abcd", (old, old))
+        assert len(quarantine) == 0
+        assert "abcd" not in quarantine
+        # Expired entries are removed
+        assert not (tmp_path / "abcd").exists()
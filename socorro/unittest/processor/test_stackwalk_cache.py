@@ -0,0 +1,99 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import hashlib
+import os
+
+from socorro.processor.stackwalk_cache import sha256_file, StackwalkCache
+
+
+def build_key(minidump_sha256="abc", symbols_generation=""):
+    return StackwalkCache.build_key(
+        minidump_sha256=minidump_sha256,
+        annotations_sha256="def",
+        stackwalk_version="1.0",
+        symbols_generation=symbols_generation,
+    )
+
+
+def test_sha256_file(tmp_path):
+    path = tmp_path / "dump"
+    path.write_bytes(b"abcde" * 1000)
+    assert sha256_file(str(path), chunk_size=7) == (
+        hashlib.sha256(b"abcde" * 1000).hexdigest()
+    )
+
+
+def test_build_key():
+    assert build_key() == build_key()
+    assert build_key() != build_key(minidump_sha256="xyz")
+    assert build_key() != build_key(symbols_generation="2")
+
+
+class TestStackwalkCache:
+    def test_get_and_put(self, tmp_path):
+        cache = StackwalkCache(str(tmp_path), max_size=1000)
+        key = build_key()
+        assert cache.get(key) is None
+
+        cache.put(key, {"json_dump": {"status": "OK"}})
+        assert cache.get(key) == {"json_dump": {"status": "OK"}}
+        assert len(cache) == 1
+        # No temp files are left behind
+        assert len(os.listdir(str(tmp_path))) == 1
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        data = {"data": "x" * 100}
+        cache = StackwalkCache(str(tmp_path), max_size=250)
+        key1 = build_key(minidump_sha256="1")
+        key2 = build_key(minidump_sha256="2")
+        key3 = build_key(minidump_sha256="3")
+        cache.put(key1, data)
+        cache.put(key2, data)
+        # Using key1 makes key2 the least recently used
+        assert cache.get(key1) == data
+        cache.put(key3, data)
+
+        assert len(cache) == 2
+        assert cache.size <= 250
+        assert cache.get(key2) is None
+        assert cache.get(key1) == data
+        assert cache.get(key3) == data
+        assert len(os.listdir(str(tmp_path))) == 2
+
+    def test_loads_existing_entries(self, tmp_path):
+        cache = StackwalkCache(str(tmp_path), max_size=1000)
+        key = build_key()
+        cache.put(key, {"status": "OK"})
+
+        cache = StackwalkCache(str(tmp_path), max_size=1000)
+        assert len(cache) == 1
+        assert cache.size > 0
+        assert cache.get(key) == {"status": "OK"}
+
+    def test_bad_file(self, tmp_path):
+        cache = StackwalkCache(str(tmp_path), max_size=1000)
+        key = build_key()
+        cache.put(key, {"status": "OK"})
+        with open(os.path.join(str(tmp_path), os.listdir(str(tmp_path))[0]), "w") as fp:
+            fp.write("{bad")
+
+        assert cache.get(key) is None
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_shared_directory(self, tmp_path):
+        """Test processes sharing the directory evict what the others added"""
+        data = {"data": "x" * 100}
+        cache1 = StackwalkCache(str(tmp_path), max_size=250)
+        key1 = build_key(minidump_sha256="1")
+        key2 = build_key(minidump_sha256="2")
+        key3 = build_key(minidump_sha256="3")
+        cache1.put(key1, data)
+        cache1.put(key2, data)
+
+        # cache2 didn't add key1 or key2, but the size comes from the directory
+        cache2 = StackwalkCache(str(tmp_path), max_size=250)
+        cache2.put(key3, data)
+        assert len(cache1) == 2
+        assert cache1.get(key3) == data
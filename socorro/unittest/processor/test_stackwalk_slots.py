@@ -0,0 +1,74 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import multiprocessing
+import threading
+import time
+
+from socorro.processor.stackwalk_slots import StackwalkSlots
+
+
+def hold_slot(path, held, done):
+    slots = StackwalkSlots(path, slots=1)
+    with slots.slot():
+        held.set()
+        done.wait(10)
+
+
+class TestStackwalkSlots:
+    def test_slots(self, tmp_path):
+        slots = StackwalkSlots(str(tmp_path), slots=2)
+        fd1 = slots.acquire()
+        fd2 = slots.acquire()
+        # Both slots are taken
+        assert slots._try_slot(0) is None
+        assert slots._try_slot(1) is None
+
+        slots.release(fd1)
+        fd3 = slots.acquire()
+        slots.release(fd2)
+        slots.release(fd3)
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "slot-0",
+            "slot-1",
+        ]
+
+    def test_shared_across_instances(self, tmp_path):
+        """Test instances sharing a directory share the slots"""
+        slots1 = StackwalkSlots(str(tmp_path), slots=1, poll_interval=0.01)
+        slots2 = StackwalkSlots(str(tmp_path), slots=1, poll_interval=0.01)
+
+        acquired = threading.Event()
+
+        def use_slot():
+            with slots2.slot():
+                acquired.set()
+
+        with slots1.slot():
+            thread = threading.Thread(target=use_slot)
+            thread.start()
+            time.sleep(0.1)
+            # slots2 waits for slots1 to release the slot
+            assert not acquired.is_set()
+
+        thread.join(5)
+        assert acquired.is_set()
+
+    def test_shared_across_processes(self, tmp_path):
+        context = multiprocessing.get_context("fork")
+        held = context.Event()
+        done = context.Event()
+        process = context.Process(target=hold_slot, args=(str(tmp_path), held, done))
+        process.start()
+        try:
+            assert held.wait(5)
+            slots = StackwalkSlots(str(tmp_path), slots=1)
+            assert slots._try_slot(0) is None
+        finally:
+            done.set()
+            process.join(5)
+
+        # The slot is free once the other process lets go of it
+        fd = slots.acquire()
+        slots.release(fd)
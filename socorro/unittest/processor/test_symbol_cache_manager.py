@@ -3,13 +3,18 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import os
+import time
 from unittest import mock
 
+from configman.dotdict import DotDict
+from markus.testing import MetricsMock
 import pytest
 
 from socorro.processor.symbol_cache_manager import (
     EventHandler,
     from_string_to_parse_size,
+    INDEX_FILENAME,
+    SymbolLRUCacheManager,
 )
 
 
@@ -180,3 +185,196 @@ class Test_from_string_to_parse_size:
         assert from_string_to_parse_size("1k") == 1024
         assert from_string_to_parse_size("1M") == 1048576
         assert from_string_to_parse_size("1G") == 1073741824
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(b"x" * size)
+    return str(path)
+
+
+def wait_for(condition, timeout=5):
+    end_time = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end_time:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+@pytest.mark.skipif(os.uname()[0] != "Linux", reason="only run if on Linux")
+class TestSymbolLRUCacheManager:
+    def build_manager(self, cache_path, **kwargs):
+        config = DotDict()
+        config.symbol_cache_path = str(cache_path)
+        config.symbol_cache_size = 100
+        config.verbosity = 0
+        config.index_path = ""
+        config.lock_path = ""
+        # Tests run events and eviction by hand
+        config.eviction_interval = 1000.0
+        config.eviction_low_watermark = 0.5
+        config.index_save_interval = 1000.0
+        config.recently_used_window = 600.0
+        config.update(kwargs)
+        manager = SymbolLRUCacheManager(config)
+        if manager.is_owner:
+            # Wait for the manager thread to walk the cache
+            wait_for(manager._reconciled.is_set)
+        return manager
+
+    def test_evicts_to_low_watermark(self, tmp_path):
+        paths = [
+            write_file(tmp_path / "xul.pdb" / str(i) / "xul.sym", 30) for i in range(3)
+        ]
+        manager = self.build_manager(tmp_path)
+        try:
+            # Without an index, the manager walks the cache to build one
+            wait_for(lambda: manager.num_files == 3)
+            assert manager.total_size == 90
+
+            # Using the first file makes it the most recently used
+            manager._update_cache(paths[0])
+            new_path = write_file(tmp_path / "libxul.so" / "1" / "libxul.so.sym", 30)
+            manager._update_cache(new_path)
+            manager.process_events()
+            assert manager.total_size == 120
+
+            # The cache is over 100 bytes, so files are evicted until it's 50 or
+            # less
+            evicted = manager.evict()
+            assert [path for path, size in evicted] == [paths[1], paths[2], paths[0]]
+            assert manager.total_size == 30
+            assert not os.path.exists(paths[1])
+            # Empty directories are removed
+            assert not os.path.exists(os.path.dirname(paths[1]))
+            assert os.path.exists(new_path)
+        finally:
+            manager.close()
+
+    def test_metrics(self, tmp_path):
+        manager = self.build_manager(tmp_path, recently_used_window=60.0)
+        try:
+            old_path = write_file(tmp_path / "a" / "a.sym", 40)
+            recent_path = write_file(tmp_path / "b" / "b.sym", 40)
+            manager._update_cache(old_path)
+            manager._update_cache(recent_path)
+            manager.process_events()
+            # a.sym was last used longer ago than the window
+            manager._last_used[old_path] -= 120
+
+            with MetricsMock() as mm:
+                manager._update_cache(write_file(tmp_path / "c" / "c.sym", 40))
+                manager.run_once()
+
+                mm.assert_incr("processor.symbol_cache.evicted_files", value=2)
+                mm.assert_incr("processor.symbol_cache.evicted_bytes", value=80)
+                mm.assert_incr("processor.symbol_cache.evicted_recently_used", value=1)
+                mm.assert_gauge("processor.symbol_cache.size", value=40)
+                mm.assert_gauge("processor.symbol_cache.files", value=1)
+        finally:
+            manager.close()
+
+    def test_under_max_size_evicts_nothing(self, tmp_path):
+        manager = self.build_manager(tmp_path)
+        try:
+            manager._update_cache(write_file(tmp_path / "a" / "a.sym", 60))
+            manager.process_events()
+            assert manager.evict() == []
+        finally:
+            manager.close()
+
+    def test_index_survives_restarts(self, tmp_path):
+        paths = [
+            write_file(tmp_path / "mod" / str(i) / "mod.sym", 10) for i in range(3)
+        ]
+        manager = self.build_manager(tmp_path)
+        wait_for(lambda: manager.num_files == 3)
+        # Using the first file makes it the most recently used
+        manager._update_cache(paths[0])
+        manager.close()
+        assert os.path.exists(os.path.join(str(tmp_path), INDEX_FILENAME))
+
+        manager = self.build_manager(tmp_path)
+        try:
+            # The least recently used order is kept
+            assert list(manager._lru) == [paths[1], paths[2], paths[0]]
+            assert manager.total_size == 30
+        finally:
+            manager.close()
+
+    def test_reconciles_index(self, tmp_path):
+        paths = [
+            write_file(tmp_path / "mod" / str(i) / "mod.sym", 10) for i in range(3)
+        ]
+        manager = self.build_manager(tmp_path)
+        wait_for(lambda: manager.num_files == 3)
+        manager.close()
+
+        # Change the cache while no manager is running
+        os.unlink(paths[1])
+        write_file(paths[2], 20)
+        new_path = write_file(tmp_path / "new" / "1" / "new.sym", 5)
+
+        manager = self.build_manager(tmp_path)
+        try:
+            # Files that aren't in the index are the least recently used
+            assert list(manager._lru.items()) == [
+                (new_path, 5),
+                (paths[0], 10),
+                (paths[2], 20),
+            ]
+            assert manager.total_size == 35
+
+            # New directories are watched
+            newer_path = write_file(tmp_path / "new" / "1" / "newer.sym", 5)
+            wait_for(lambda: len(manager._events) > 0)
+            manager.process_events()
+            assert newer_path in manager._lru
+        finally:
+            manager.close()
+
+    def test_shared_cache(self, tmp_path):
+        path = write_file(tmp_path / "mod" / "1" / "mod.sym", 30)
+        owner = self.build_manager(tmp_path)
+        other = self.build_manager(tmp_path)
+        try:
+            wait_for(lambda: owner.num_files == 1)
+            assert owner.is_owner
+            assert not other.is_owner
+
+            # Only the owner manages the cache
+            with MetricsMock() as mm:
+                other.run_once()
+                mm.assert_gauge("processor.symbol_cache.owner", value=0)
+            assert other.num_files == 0
+
+            # When the owner goes away, the other manager takes over and picks
+            # up where the owner left off
+            owner.close()
+            with MetricsMock() as mm:
+                other.run_once()
+                mm.assert_gauge("processor.symbol_cache.owner", value=1)
+            assert other.is_owner
+            assert list(other._lru.items()) == [(path, 30)]
+        finally:
+            if not owner.closed:
+                owner.close()
+            other.close()
+
+    def test_close_twice(self, tmp_path):
+        manager = self.build_manager(tmp_path)
+        manager.close()
+        manager.close()
+        assert manager.closed
+
+    def test_corrupt_index(self, tmp_path):
+        write_file(tmp_path / "mod" / "1" / "mod.sym", 10)
+        with open(os.path.join(str(tmp_path), INDEX_FILENAME), "w") as fp:
+            fp.write("{bad")
+
+        manager = self.build_manager(tmp_path)
+        try:
+            wait_for(lambda: manager.num_files == 1)
+        finally:
+            manager.close()
@@ -0,0 +1,210 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import os
+
+from configman.dotdict import DotDict
+from markus.testing import MetricsMock
+import pytest
+import requests_mock
+
+from socorro.processor.symbol_prefetcher import (
+    get_sym_filename,
+    parse_module,
+    SymbolPrefetchingCacheManager,
+)
+
+
+XUL = "xul.pdb/44E4EC8C2F41492B9369D6B9A059577C2"
+LIBXUL = "libxul.so/0F5A1D3D2C6D4D1F9E4F0C2D8B8A5E1B0"
+NTDLL = "ntdll.pdb/1EB9FACB04EA273BB24BA52C8B8A7B7A1"
+
+
+def test_get_sym_filename():
+    assert get_sym_filename("xul.pdb") == "xul.sym"
+    assert get_sym_filename("XUL.PDB") == "XUL.sym"
+    assert get_sym_filename("libxul.so") == "libxul.so.sym"
+    assert get_sym_filename("XUL") == "XUL.sym"
+
+
+@pytest.mark.parametrize(
+    "module, expected",
+    [
+        (XUL, ("xul.pdb", "44E4EC8C2F41492B9369D6B9A059577C2")),
+        ("xul.pdb/", None),
+        ("/44E4EC8C2F41492B9369D6B9A059577C2", None),
+        ("../44E4EC8C2F41492B9369D6B9A059577C2", None),
+        ("xul.pdb/../..", None),
+        ("xul.pdb/abc/def", None),
+    ],
+)
+def test_parse_module(module, expected):
+    assert parse_module(module) == expected
+
+
+@pytest.mark.skipif(os.uname()[0] != "Linux", reason="only run if on Linux")
+class TestSymbolPrefetchingCacheManager:
+    def build_manager(self, tmp_path, **kwargs):
+        config = DotDict()
+        config.symbol_cache_path = str(tmp_path / "cache")
+        config.symbol_cache_size = 100
+        config.verbosity = 0
+        config.index_path = ""
+        config.lock_path = ""
+        # Tests run events and eviction by hand
+        config.eviction_interval = 1000.0
+        config.eviction_low_watermark = 0.5
+        config.index_save_interval = 1000.0
+        config.recently_used_window = 600.0
+        config.modules_log_path = str(tmp_path / "modules.log")
+        config.symbols_urls = [
+            "https://symbols.example.com/",
+            "https://other.example.com",
+        ]
+        config.hot_modules_count = 2
+        config.hot_window = 3600.0
+        config.prefetch_retry_interval = 600.0
+        config.modules_log_max_size = 10000
+        config.update(kwargs)
+        return SymbolPrefetchingCacheManager(config)
+
+    def write_log(self, manager, *lines):
+        with open(manager.modules_log_path, "a") as fp:
+            for line in lines:
+                fp.write(line)
+
+    def test_hot_modules(self, tmp_path):
+        manager = self.build_manager(tmp_path)
+        try:
+            self.write_log(
+                manager,
+                f"{XUL};{NTDLL}\n",
+                f"{XUL};{LIBXUL}\n",
+                f"{XUL};{NTDLL};../bad\n",
+                # A partially written line is left for later
+                f"{LIBXUL}",
+            )
+            manager.update_hot_modules()
+            assert manager.get_hot_modules() == [XUL, NTDLL]
+
+            self.write_log(manager, f";{XUL}\n", f"{LIBXUL}\n", f"{LIBXUL}\n")
+            manager.update_hot_modules()
+            assert manager.get_hot_modules() == [XUL, LIBXUL]
+        finally:
+            manager.close()
+
+    def test_hot_window(self, tmp_path):
+        manager = self.build_manager(tmp_path, hot_window=0.0)
+        try:
+            self.write_log(manager, f"{XUL}\n")
+            manager.update_hot_modules()
+            # Crashes older than the window are forgotten
+            assert manager.get_hot_modules() == []
+        finally:
+            manager.close()
+
+    def test_modules_log_rotation(self, tmp_path):
+        manager = self.build_manager(tmp_path, modules_log_max_size=10)
+        try:
+            self.write_log(manager, f"{XUL}\n")
+            manager.update_hot_modules()
+            assert manager.get_hot_modules() == [XUL]
+            # The log was too big, so it was removed and is started over
+            assert not os.path.exists(manager.modules_log_path)
+
+            self.write_log(manager, f"{XUL}\n")
+            manager.update_hot_modules()
+            assert manager._module_counts[XUL] == 2
+        finally:
+            manager.close()
+
+    def test_prefetch(self, tmp_path):
+        manager = self.build_manager(tmp_path)
+        try:
+            self.write_log(manager, f"{XUL};{LIBXUL}\n")
+            manager.update_hot_modules()
+
+            with requests_mock.Mocker() as req_mock:
+                req_mock.get(
+                    "https://symbols.example.com/xul.pdb/"
+                    + "44E4EC8C2F41492B9369D6B9A059577C2/xul.sym",
+                    content=b"MODULE windows x86_64 xul.pdb",
+                )
+                # libxul.so symbols are only on the second symbols server
+                req_mock.get(
+                    "https://symbols.example.com/libxul.so/"
+                    + "0F5A1D3D2C6D4D1F9E4F0C2D8B8A5E1B0/libxul.so.sym",
+                    status_code=404,
+                )
+                req_mock.get(
+                    "https://other.example.com/libxul.so/"
+                    + "0F5A1D3D2C6D4D1F9E4F0C2D8B8A5E1B0/libxul.so.sym",
+                    content=b"MODULE Linux x86_64 libxul.so",
+                )
+                with MetricsMock() as mm:
+                    manager.prefetch()
+                    records = mm.filter_records(
+                        "incr",
+                        stat="processor.symbol_cache.prefetch",
+                        tags=["result:downloaded"],
+                    )
+                    assert len(records) == 2
+
+                # Files that are in the cache aren't downloaded again
+                req_mock.reset_mock()
+                manager.prefetch()
+                assert req_mock.call_count == 0
+
+            with open(manager.get_sym_path(XUL), "rb") as fp:
+                assert fp.read() == b"MODULE windows x86_64 xul.pdb"
+            assert os.path.exists(manager.get_sym_path(LIBXUL))
+        finally:
+            manager.close()
+
+    def test_prefetch_not_found(self, tmp_path):
+        manager = self.build_manager(tmp_path)
+        try:
+            self.write_log(manager, f"{XUL}\n")
+            manager.update_hot_modules()
+
+            with requests_mock.Mocker() as req_mock:
+                req_mock.get(requests_mock.ANY, status_code=404)
+                with MetricsMock() as mm:
+                    manager.prefetch()
+                    mm.assert_incr(
+                        "processor.symbol_cache.prefetch", tags=["result:not_found"]
+                    )
+                assert req_mock.call_count == 2
+
+                # Modules that weren't found aren't tried again right away
+                req_mock.reset_mock()
+                manager.prefetch()
+                assert req_mock.call_count == 0
+            assert not os.path.exists(manager.get_sym_path(XUL))
+        finally:
+            manager.close()
+
+    def test_hot_modules_not_evicted(self, tmp_path):
+        manager = self.build_manager(tmp_path, hot_modules_count=1)
+        try:
+            hot_path = manager.get_sym_path(XUL)
+            cold_path = manager.get_sym_path(NTDLL)
+            for path in (hot_path, cold_path):
+                os.makedirs(os.path.dirname(path))
+                with open(path, "wb") as fp:
+                    fp.write(b"x" * 60)
+                manager._update_cache(path)
+            manager.process_events()
+
+            self.write_log(manager, f"{XUL}\n")
+            manager.update_hot_modules()
+
+            # xul.pdb is the least recently used, but it's hot, so ntdll.pdb is
+            # evicted instead
+            evicted = manager.evict()
+            assert evicted == [(cold_path, 60)]
+            assert os.path.exists(hot_path)
+            assert list(manager._lru.keys()) == [hot_path]
+        finally:
+            manager.close()
@@ -13,6 +13,7 @@ import logging
 import os
 import re
 import socket
+import tempfile
 
 from decouple import config, Csv
 import dj_database_url
@@ -569,7 +570,19 @@ SOCORRO_CONFIG = {
             "region": config("resource.boto.region", "us-west-2"),
             # S3 things
             "bucket_name": config("resource.boto.bucket_name", "crashstats"),
-            "resource_class": "socorro.external.boto.connection_context.S3Connection",
+            # Set to "socorro.external.boto.connection_context.CachingS3Connection"
+            # to cache crash data from S3 on disk
+            "resource_class": config(
+                "resource.boto.resource_class",
+                "socorro.external.boto.connection_context.S3Connection",
+            ),
+            "cache_path": config(
+                "resource.boto.cache_path",
+                os.path.join(tempfile.gettempdir(), "s3-cache"),
+            ),
+            "cache_max_size": config(
+                "resource.boto.cache_max_size", 1024 * 1024 * 1024, cast=int
+            ),
             "s3_endpoint_url": config("resource.boto.s3_endpoint_url", None),
             # SQS things
             "sqs_endpoint_url": config("resource.boto.sqs_endpoint_url", None),